@@ -0,0 +1,175 @@
+"""
+End-to-end crawl benchmarks against benchmarks.mock_server.
+
+The full Hello Fresh crawl, from the recipes landing page to validated
+Recipes, is run against a local mock of the site, once for every
+combination of `--scrapers` and `--parsers`..
+
+    python -m benchmarks.crawl --scrapers 4 8 16 --parsers 0 4 --latency 0.05 --error-rate 0.02 --throttle 100
+
+Each crawl runs in a fresh interpreter with an empty page cache, so
+that peak RSS belongs to that crawl alone. For each crawl we report
+recipes/sec, time to the first recipe, how many listed recipes never
+made it out of the crawl, what the server threw at it, and peak RSS of
+the crawl and of its largest parser process.
+"""
+from typing import List
+import itertools as it
+import subprocess
+import argparse
+import resource
+import tempfile
+import logging
+import json
+import time
+import sys
+import os
+
+from benchmarks.mock_server import MockHelloFresh
+
+
+class _Failures(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith('failed to scrape'):
+            self.count += 1
+
+
+def crawl(config: dict) -> dict:
+    """
+    Run one crawl, in this process, against whatever BASE_URL points to.
+    """
+    from scrapfishin.hello_fresh.unlisted_recipes import spices
+    from scrapfishin.hello_fresh import stream
+    from scrapfishin.cache import PageCache
+
+    failures = _Failures()
+    logging.getLogger('scrapfishin').addHandler(failures)
+    unlisted = {s.title for s in spices}
+    recipes, first = 0, None
+
+    with tempfile.TemporaryDirectory() as root, PageCache(root) as cache:
+        start = time.perf_counter()
+
+        for recipe in stream(
+            config['scrapers'],
+            discovery=config['discovery'],
+            detail='http',
+            parsers=config['parsers'] or None,
+            rate=config['rate'],
+            cache=cache
+        ):
+            if recipe.title in unlisted:
+                continue
+
+            recipes += 1
+
+            if first is None:
+                first = time.perf_counter() - start
+
+        elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on linux
+    return {
+        'recipes': recipes,
+        'seconds': elapsed,
+        'recipes_per_sec': recipes / elapsed,
+        'first_recipe_sec': first,
+        'failed': failures.count,
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'parser_rss_mib': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def _crawl_in_child(site: MockHelloFresh, config: dict) -> dict:
+    env = {**os.environ, 'SCRAPFISHIN_HELLO_FRESH_URL': site.url}
+    before = site.summary()['statuses']
+    run = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.crawl', '--child', json.dumps(config)],
+        env=env,
+        stdout=subprocess.PIPE,
+        check=True
+    )
+    after = site.summary()['statuses']
+    served = {status: after.get(status, 0) - before.get(status, 0) for status in after}
+
+    return {
+        **config,
+        **json.loads(run.stdout.decode().strip().splitlines()[-1]),
+        'listed': len(site.listed),
+        'throttled': served.get('429', 0),
+        'errors': served.get('503', 0)
+    }
+
+
+def report(results: List[dict]) -> str:
+    header = (
+        f'{"scrapers":>8}{"parsers":>8}{"recipes":>9}{"listed":>8}{"rec/s":>8}'
+        f'{"first s":>9}{"failed":>8}{"429s":>6}{"503s":>6}{"RSS MiB":>9}{"parser":>8}'
+    )
+    lines = [header, '-' * len(header)]
+
+    for r in results:
+        first = '-' if r['first_recipe_sec'] is None else f'{r["first_recipe_sec"]:.2f}'
+        lines.append(
+            f'{r["scrapers"]:>8}{r["parsers"]:>8}{r["recipes"]:>9}{r["listed"]:>8}{r["recipes_per_sec"]:>8.1f}'
+            f'{first:>9}{r["failed"]:>8}{r["throttled"]:>6}{r["errors"]:>6}'
+            f'{r["peak_rss_mib"]:>9.1f}{r["parser_rss_mib"]:>8.1f}'
+        )
+
+    return '\n'.join(lines)
+
+
+def main(argv: List[str]=None) -> None:
+    cli = argparse.ArgumentParser(prog='python -m benchmarks.crawl', description=__doc__.split('\n\n')[0])
+    cli.add_argument('--scrapers', type=int, nargs='+', default=[4, 8])
+    cli.add_argument('--parsers', type=int, nargs='+', default=[0], help='0 parses on the scraper threads')
+    cli.add_argument('--rate', type=float, default=None, help='pace the crawl with the asyncio Engine')
+    cli.add_argument('--discovery', default='http', help='"browser" needs Chrome and exercises LOAD MORE')
+    cli.add_argument('--cuisines', type=int, default=8)
+    cli.add_argument('--recipes', type=int, default=200)
+    cli.add_argument('--per-cuisine', type=int, default=40)
+    cli.add_argument('--page-size', type=int, default=None)
+    cli.add_argument('--latency', type=float, default=0.02)
+    cli.add_argument('--jitter', type=float, default=0.02)
+    cli.add_argument('--error-rate', type=float, default=0.0)
+    cli.add_argument('--throttle', type=float, default=None)
+    cli.add_argument('--seed', type=int, default=0)
+    cli.add_argument('--save', help='write the results to this JSON file')
+    cli.add_argument('--child', help=argparse.SUPPRESS)
+    args = cli.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(crawl(json.loads(args.child))))
+        return
+
+    site = MockHelloFresh(
+        cuisines=args.cuisines,
+        recipes=args.recipes,
+        per_cuisine=args.per_cuisine,
+        page_size=args.page_size,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle=args.throttle,
+        seed=args.seed
+    )
+    results = []
+
+    with site:
+        for scrapers, parsers in it.product(args.scrapers, args.parsers):
+            config = {'scrapers': scrapers, 'parsers': parsers, 'rate': args.rate, 'discovery': args.discovery}
+            results.append(_crawl_in_child(site, config))
+
+    print(report(results))
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+A local stand-in for hellofresh.com, serving pages built from the
+recorded corpus in tests/files.
+
+    python -m benchmarks.mock_server --port 8000 --latency 0.05 --error-rate 0.02 --throttle 50
+
+Point a crawl at it with..
+
+    SCRAPFISHIN_HELLO_FRESH_URL=http://127.0.0.1:8000
+
+The site has a recipes landing page listing `cuisines` world cuisines,
+each of which lists `per_cuisine` of the `recipes` recipe pages, so a
+recipe may be found under several cuisines. Archives are paginated by a
+"LOAD MORE" link, and every page may be overlaid by the promo popup,
+which is dismissed with ESCAPE.
+
+Every response waits `latency` seconds, plus up to `jitter` more. A
+fraction `error_rate` of requests fail with 503, and anything over
+`throttle` requests per second is answered with 429 and a Retry-After.
+
+GET /__stats returns what has been served so far as JSON, it's never
+delayed, failed or throttled.
+"""
+from collections import Counter
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+import http.server
+import threading
+import argparse
+import pathlib
+import random
+import json
+import time
+
+
+FILES = pathlib.Path(__file__).parent.parent / 'tests' / 'files' / 'hello_fresh'
+
+CUISINES = [
+    'american', 'asian', 'italian', 'mexican', 'mediterranean', 'indian',
+    'french', 'middle-eastern', 'thai', 'korean', 'greek', 'spanish'
+]
+
+_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title} | HelloFresh</title>
+</head>
+<body>
+<div id="root"><main class="fela-_main">{body}</main></div>
+{popup}
+</body>
+</html>
+"""
+
+# shows up a moment after the page does, like the real thing
+_POPUP = """<script>
+setTimeout(function () {
+    var popup = document.createElement('div');
+    popup.setAttribute('role', 'dialog');
+    popup.style = 'position:fixed;top:0;left:0;width:100%;height:100%;background:rgba(0,0,0,.5)';
+    popup.innerHTML = '<div><h2>Get 16 free meals!</h2></div>';
+    document.body.appendChild(popup);
+    document.addEventListener('keydown', function (e) {
+        if (e.key === 'Escape' && popup.parentNode) { popup.parentNode.removeChild(popup); }
+    });
+}, 250);
+</script>"""
+
+
+class MockHelloFresh:
+    """
+    Threaded HTTP server imitating the parts of Hello Fresh we crawl.
+
+    Attributes
+    ----------
+    cuisines : int, default 8
+        number of world cuisines on the landing page
+
+    recipes : int, default 200
+        number of distinct recipe pages
+
+    per_cuisine : int, default 40
+        number of recipes listed under each cuisine
+
+    page_size : int, default None
+        recipes shown per archive page before "LOAD MORE", if None an
+        archive lists everything at once
+
+    latency : float, default 0.0
+        seconds every response is delayed
+
+    jitter : float, default 0.0
+        up to this many more seconds of random delay
+
+    error_rate : float, default 0.0
+        fraction of requests answered with 503
+
+    throttle : float, default None
+        requests per second allowed before answering 429
+
+    popup : bool, default True
+        whether pages carry the promo popup
+
+    seed : int, default 0
+        makes which recipes are listed where, and which requests fail,
+        reproducible
+    """
+    def __init__(
+        self,
+        *,
+        cuisines: int=8,
+        recipes: int=200,
+        per_cuisine: int=40,
+        page_size: int=None,
+        latency: float=0.0,
+        jitter: float=0.0,
+        error_rate: float=0.0,
+        throttle: float=None,
+        popup: bool=True,
+        seed: int=0,
+        host: str='127.0.0.1',
+        port: int=0
+    ):
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self.popup = popup
+        self.stats = Counter()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0.0, 0)
+
+        names = [CUISINES[i % len(CUISINES)] + (f'-{i // len(CUISINES)}' if i >= len(CUISINES) else '') for i in range(cuisines)]
+        slugs = [f'mock-recipe-{i:04d}-{i:024x}' for i in range(recipes)]
+        self.archives = {
+            name: self._random.sample(slugs, min(per_cuisine, recipes))
+            for name in names
+        }
+        self.listed = {slug for listed in self.archives.values() for slug in listed}
+
+        self._recipe = (FILES / 'recipe.html').read_text(encoding='utf-8')
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    # --------------------------------------------------------------------------
+    # pages
+
+    def _card(self, slug: str) -> str:
+        name = _title(slug)
+        return (
+            f'<div class="fela-_card"><a href="/recipes/{slug}"><div>'
+            f'<img data-test-id="recipe-image" alt="{name}" src="{self.url}/images/{slug}.jpg">'
+            f'</div><div><h3>{name}</h3><span>30 min</span></div></a></div>'
+        )
+
+    def _page(self, title: str, body: str) -> str:
+        return _PAGE.format(title=title, body=body, popup=_POPUP if self.popup else '')
+
+    def landing(self) -> str:
+        popular = ''.join(self._card(slug) for slug in sorted(self.listed)[:4])
+        carousel = ''.join(
+            f'<a href="/recipes/{name}-cuisine"><span>{name.title()}</span></a>'
+            for name in self.archives
+        )
+        body = (
+            f'<section><h2>Popular recipes</h2><div>{popular}</div></section>'
+            f'<section><h2>World cuisines</h2><div>{carousel}</div></section>'
+        )
+        return self._page('Recipes', body)
+
+    def archive(self, name: str, page: int) -> Optional[str]:
+        try:
+            listed = self.archives[name]
+        except KeyError:
+            return None
+
+        shown = len(listed) if self.page_size is None else page * self.page_size
+        cards = ''.join(self._card(slug) for slug in listed[:shown])
+        more = f'<a href="/recipes/{name}-cuisine?page={page + 1}">LOAD MORE</a>' if shown < len(listed) else ''
+        return self._page(f'{name.title()} Recipes', f'<section><div>{cards}</div><div>{more}</div></section>')
+
+    def recipe(self, slug: str) -> Optional[str]:
+        if slug not in self.listed:
+            return None
+
+        html = self._recipe.replace('Tuscan Sausage Spaghetti', _title(slug))
+        return html.replace('</body>', f'{_POPUP if self.popup else ""}</body>')
+
+    # --------------------------------------------------------------------------
+    # serving
+
+    def _throttled(self) -> bool:
+        if self.throttle is None:
+            return False
+
+        now = time.monotonic()
+
+        with self._lock:
+            start, count = self._window
+
+            if now - start >= 1:
+                start, count = now, 0
+
+            self._window = (start, count + 1)
+            return count >= self.throttle
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _respond(self, path: str, query: dict) -> tuple:
+        if self._throttled():
+            return 429, None
+
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if self._fails():
+            return 503, None
+
+        parts = path.strip('/').split('/')
+        html = None
+
+        if parts == ['recipes']:
+            html = self.landing()
+        elif len(parts) == 2 and parts[0] == 'recipes' and parts[1].endswith('-cuisine'):
+            html = self.archive(parts[1][:-len('-cuisine')], int(query.get('page', ['1'])[0]))
+        elif len(parts) == 2 and parts[0] == 'recipes':
+            html = self.recipe(parts[1])
+
+        return (404, None) if html is None else (200, html)
+
+    def _handler(self):
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+
+                if url.path == '/__stats':
+                    self._send(200, json.dumps(site.summary()), 'application/json')
+                    return
+
+                status, html = site._respond(url.path, parse_qs(url.query))
+
+                with site._lock:
+                    site.stats[status] += 1
+
+                self._send(status, html or '', 'text/html; charset=utf-8')
+
+            def _send(self, status, body, content_type):
+                raw = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(raw)))
+
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'requests': sum(self.stats.values()),
+                'statuses': {str(k): v for k, v in self.stats.items()},
+                'recipes': len(self.listed)
+            }
+
+    def start(self) -> 'MockHelloFresh':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-hello-fresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def __repr__(self):
+        return f'<MockHelloFresh {self.url} recipes={len(self.listed)}>'
+
+
+def _title(slug: str) -> str:
+    # mock-recipe-0042-... -> Mock Recipe 0042
+    return ' '.join(slug.split('-')[:3]).title()
+
+
+def main(argv: List[str]=None) -> None:
+    cli = argparse.ArgumentParser(prog='python -m benchmarks.mock_server', description=__doc__.split('\n\n')[0])
+    cli.add_argument('--host', default='127.0.0.1')
+    cli.add_argument('--port', type=int, default=8000)
+    cli.add_argument('--cuisines', type=int, default=8)
+    cli.add_argument('--recipes', type=int, default=200)
+    cli.add_argument('--per-cuisine', type=int, default=40)
+    cli.add_argument('--page-size', type=int, default=None)
+    cli.add_argument('--latency', type=float, default=0.0)
+    cli.add_argument('--jitter', type=float, default=0.0)
+    cli.add_argument('--error-rate', type=float, default=0.0)
+    cli.add_argument('--throttle', type=float, default=None)
+    cli.add_argument('--no-popup', dest='popup', action='store_false')
+    cli.add_argument('--seed', type=int, default=0)
+    args = vars(cli.parse_args(argv))
+
+    site = MockHelloFresh(**args)
+    print(f'serving {site!r}', flush=True)
+
+    try:
+        site.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Parser benchmarks over the recorded Hello Fresh pages in tests/files.
+
+Every stage of turning a page into a Recipe is timed on its own, over
+and over, without touching the network..
+
+    python -m benchmarks.parse
+    python -m benchmarks.parse --save baseline.json
+    python -m benchmarks.parse --baseline baseline.json --tolerance 0.25
+
+Peak memory is what python allocates (tracemalloc), memory held by
+libxml2 while lxml builds its tree is not counted.
+
+Results are machine-dependent, so a baseline should be saved and
+compared on the same machine. When comparing, a stage whose median
+latency is more than `tolerance` slower than the baseline counts as a
+regression, and the run exits non-zero.
+"""
+from typing import Callable, Dict, List
+import statistics
+import tracemalloc
+import argparse
+import tempfile
+import pathlib
+import platform
+import json
+import time
+import sys
+
+from bs4 import BeautifulSoup
+
+from scrapfishin.hello_fresh import parser, structured
+from scrapfishin.hello_fresh.scraper import get_recipes, get_world_cuisines
+from scrapfishin.cache import PageCache
+from scrapfishin.schema import Recipe
+
+
+FILES = pathlib.Path(__file__).parent.parent / 'tests' / 'files' / 'hello_fresh'
+
+# slug -> recorded page
+RECIPES = {
+    'recipes/tuscan-sausage-spaghetti-5e1f0c2a7a2c3b1d': 'recipe.html',
+    'recipes/firecracker-meatballs-5b0f1c2d30006c2a1e4d5e12': 'recipe_meatballs.html',
+    'recipes/tuscan-sausage-spaghetti-structured': 'recipe_structured.html'
+}
+ARCHIVES = {
+    'recipes': 'recipes.html',
+    'recipes/italian-cuisine': 'italian-cuisine.html'
+}
+
+
+def _walk(soup: BeautifulSoup) -> None:
+    # the bs4 walkers on their own, over an already parsed page
+    find = soup.find
+    list(parser.parse_next_ingredient(find('span', {'data-translation-id': 'recipe-detail.ingredients'})))
+    list(parser.parse_next_nutrient_value(find('div', {'data-test-id': 'recipeDetailFragment.nutrition-values'})))
+
+    for section in ['tag', 'allergen', 'utensil']:
+        tag = find('span', {'data-translation-id': f'recipe-detail.{section}s'})
+        parser.extract_separated_tags(tag, section=section)
+
+
+def stages(cache: PageCache) -> Dict[str, List[Callable[[], object]]]:
+    """
+    Build the work to time, stage -> one call per page in the corpus.
+    """
+    pages = {slug: (FILES / name).read_text(encoding='utf-8') for slug, name in RECIPES.items()}
+    soups = {slug: BeautifulSoup(html, 'html.parser') for slug, html in pages.items()}
+    data = {slug: parser.parse_recipe(html, slug) for slug, html in pages.items()}
+
+    def each(fn, inputs):
+        return [(lambda v=v, s=s: fn(v, s)) for s, v in inputs.items()]
+
+    return {
+        'parse_recipe': each(parser.parse_recipe, pages),
+        'structured': each(structured.extract, pages),
+        'dom:lxml': each(parser.parse_recipe_lxml, pages),
+        'dom:soup': each(parser.parse_recipe_soup, pages),
+        'walkers': [(lambda s=s: _walk(s)) for s in soups.values()],
+        'validate': [(lambda d=d: Recipe.parse_obj(d)) for d in data.values()],
+        # never the browser, whatever the state of the cache
+        'archive': [
+            lambda: get_world_cuisines(backend='http', cache=cache),
+            *[(lambda s=s: get_recipes(s, backend='http', cache=cache)) for s in ARCHIVES if s != 'recipes']
+        ]
+    }
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(calls: List[Callable[[], object]], *, rounds: int) -> dict:
+    """
+    Time `calls` for a number of `rounds`, then trace their peak memory.
+    """
+    for call in calls:
+        call()
+
+    samples = []
+
+    for _ in range(rounds):
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+
+    # tracing slows everything down, so memory gets a pass of its own
+    tracemalloc.start()
+    peak = 0
+
+    for call in calls:
+        tracemalloc.reset_peak()
+        call()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+
+    tracemalloc.stop()
+
+    return {
+        'pages': len(samples),
+        'pages_per_sec': len(samples) / sum(samples),
+        'p50_ms': statistics.median(samples) * 1000,
+        'p90_ms': _percentile(samples, 0.90) * 1000,
+        'p99_ms': _percentile(samples, 0.99) * 1000,
+        'peak_kib': peak / 1024
+    }
+
+
+def run(*, rounds: int=50) -> dict:
+    with tempfile.TemporaryDirectory() as root, PageCache(root) as cache:
+        for slug, name in ARCHIVES.items():
+            cache.put(slug, (FILES / name).read_text(encoding='utf-8'))
+
+        results = {stage: measure(calls, rounds=rounds) for stage, calls in stages(cache).items()}
+
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'rounds': rounds,
+        'stages': results
+    }
+
+
+def compare(results: dict, baseline: dict, *, tolerance: float) -> List[str]:
+    """
+    Find the stages which got slower than `baseline` by more than `tolerance`.
+    """
+    regressions = []
+
+    for stage, now in results['stages'].items():
+        then = baseline['stages'].get(stage)
+
+        if then is None:
+            continue
+
+        change = now['p50_ms'] / then['p50_ms'] - 1
+        now['change'] = change
+
+        if change > tolerance:
+            regressions.append(stage)
+
+    return regressions
+
+
+def report(results: dict) -> str:
+    header = f'{"stage":<14}{"pages":>7}{"pages/s":>11}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"peak KiB":>10}{"vs base":>9}'
+    lines = [header, '-' * len(header)]
+
+    for stage, r in results['stages'].items():
+        change = f'{r["change"]:+.0%}' if 'change' in r else ''
+        lines.append(
+            f'{stage:<14}{r["pages"]:>7}{r["pages_per_sec"]:>11.1f}{r["p50_ms"]:>9.3f}'
+            f'{r["p90_ms"]:>9.3f}{r["p99_ms"]:>9.3f}{r["peak_kib"]:>10.1f}{change:>9}'
+        )
+
+    return '\n'.join(lines)
+
+
+def main(argv: List[str]=None) -> int:
+    cli = argparse.ArgumentParser(prog='python -m benchmarks.parse', description=__doc__.split('\n\n')[0])
+    cli.add_argument('--rounds', type=int, default=50, help='times each page goes through each stage')
+    cli.add_argument('--save', type=pathlib.Path, help='write the results to this JSON file')
+    cli.add_argument('--baseline', type=pathlib.Path, help='compare against results saved with --save')
+    cli.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown of a stage\'s median')
+    args = cli.parse_args(argv)
+
+    results = run(rounds=args.rounds)
+    regressions = []
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+
+    print(report(results))
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2))
+
+    if regressions:
+        print(f'\nslower than baseline by more than {args.tolerance:.0%}: {", ".join(regressions)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
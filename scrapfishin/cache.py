@@ -0,0 +1,230 @@
+from typing import NamedTuple, Optional
+import threading
+import tempfile
+import hashlib
+import logging
+import pathlib
+import sqlite3
+import time
+import zlib
+
+
+log = logging.getLogger(__name__)
+
+
+class CachedPage(NamedTuple):
+    slug: str
+    digest: str
+    html: str
+    fetched_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+class PageCache:
+    """
+    Content-addressed, compressed on-disk cache of page sources.
+
+    Page sources are zlib-compressed and stored once per unique content
+    under their sha256 digest, so two slugs serving the same page share
+    a blob. A small SQLite index maps each slug to its digest, along
+    with what's needed to expire and revalidate it.
+
+        <root>/index.sqlite3
+        <root>/blobs/3f/3fa9c1...
+
+    Entries older than `ttl` are stale. Stale entries are not thrown
+    away, since their ETag / Last-Modified can still save a download
+    when the server answers "304 Not Modified".
+
+    Attributes
+    ----------
+    root : str or pathlib.Path, default '{some_temp_dir}/scrapfishin/pages'
+        directory to store the cache in
+
+    ttl : float, default 86400
+        seconds a page is considered fresh
+
+    max_bytes : int, default 512 MiB
+        compressed size the cache may grow to before least-recently
+        used entries are evicted
+    """
+    def __init__(self, root=None, *, ttl: float=86400, max_bytes: int=512 * 1024 ** 2):
+        if root is None:
+            root = pathlib.Path(tempfile.gettempdir()) / 'scrapfishin' / 'pages'
+
+        self.root = pathlib.Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._blobs = self.root / 'blobs'
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / 'index.sqlite3'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS page (
+                slug          TEXT PRIMARY KEY,
+                digest        TEXT NOT NULL,
+                size          INTEGER NOT NULL,
+                fetched_at    REAL NOT NULL,
+                accessed_at   REAL NOT NULL,
+                etag          TEXT,
+                last_modified TEXT
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS ix_page_digest ON page (digest)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS ix_page_accessed_at ON page (accessed_at)')
+        self._db.commit()
+
+    def _blob(self, digest: str) -> pathlib.Path:
+        return self._blobs / digest[:2] / digest
+
+    def get(self, slug: str) -> Optional[CachedPage]:
+        """
+        Look up the page stored for `slug`, fresh or not.
+
+        Parameters
+        ----------
+        slug : str
+            resource the page was fetched from
+
+        Returns
+        -------
+        page : CachedPage or None
+            None if the page was never cached, or its blob has gone missing
+        """
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest, fetched_at, etag, last_modified FROM page WHERE slug = ?',
+                (slug,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            digest, fetched_at, etag, last_modified = row
+
+            try:
+                html = zlib.decompress(self._blob(digest).read_bytes()).decode('utf-8')
+            except (OSError, zlib.error):
+                log.warning(f'cached page for {slug} is unreadable, dropping it')
+                self._db.execute('DELETE FROM page WHERE slug = ?', (slug,))
+                self._db.commit()
+                return None
+
+            self._db.execute('UPDATE page SET accessed_at = ? WHERE slug = ?', (now, slug))
+            self._db.commit()
+
+        fresh = now - fetched_at < self.ttl
+        return CachedPage(slug, digest, html, fetched_at, etag, last_modified, fresh)
+
+    def put(self, slug: str, html: str, *, etag: str=None, last_modified: str=None) -> str:
+        """
+        Store the page source for `slug`.
+
+        Parameters
+        ----------
+        slug : str
+            resource the page was fetched from
+
+        html : str
+            page source
+
+        etag, last_modified : str, default None
+            validators sent by the server, if any
+
+        Returns
+        -------
+        digest : str
+            sha256 of the page source
+        """
+        raw = html.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        blob = self._blob(digest)
+        now = time.time()
+
+        with self._lock:
+            if not blob.exists():
+                blob.parent.mkdir(exist_ok=True)
+                staged = blob.with_suffix('.tmp')
+                staged.write_bytes(zlib.compress(raw))
+                staged.replace(blob)
+
+            previous = self._db.execute('SELECT digest FROM page WHERE slug = ?', (slug,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO page VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (slug, digest, blob.stat().st_size, now, now, etag, last_modified)
+            )
+
+            if previous is not None and previous[0] != digest:
+                self._drop_orphan(previous[0])
+
+            self._evict()
+            self._db.commit()
+
+        return digest
+
+    def refresh(self, slug: str) -> None:
+        """
+        Mark the page for `slug` as freshly fetched, e.g. after a 304.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                'UPDATE page SET fetched_at = ?, accessed_at = ? WHERE slug = ?',
+                (now, now, slug)
+            )
+            self._db.commit()
+
+    def size(self) -> int:
+        """
+        Compressed bytes currently on disk.
+        """
+        with self._lock:
+            return self._size()
+
+    def _size(self) -> int:
+        q = 'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM page)'
+        return self._db.execute(q).fetchone()[0]
+
+    def _drop_orphan(self, digest: str) -> None:
+        q = 'SELECT 1 FROM page WHERE digest = ? LIMIT 1'
+
+        if self._db.execute(q, (digest,)).fetchone() is None:
+            self._blob(digest).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        total = self._size()
+
+        if total <= self.max_bytes:
+            return
+
+        q = 'SELECT slug, digest, size FROM page ORDER BY accessed_at'
+
+        for slug, digest, size in self._db.execute(q).fetchall():
+            self._db.execute('DELETE FROM page WHERE slug = ?', (slug,))
+
+            if self._db.execute('SELECT 1 FROM page WHERE digest = ? LIMIT 1', (digest,)).fetchone() is None:
+                self._blob(digest).unlink(missing_ok=True)
+                total -= size
+
+            if total <= self.max_bytes:
+                break
+
+        log.debug(f'evicted pages from cache, now at {total} bytes')
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f'<PageCache {self.root}>'
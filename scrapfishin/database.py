@@ -1,5 +1,5 @@
 from contextlib import contextmanager
-from typing import Tuple
+from typing import Dict, Hashable, Iterable, Tuple
 import logging
 
 from sqlalchemy.ext.declarative import declarative_base
@@ -11,6 +11,15 @@ import sqlalchemy as sa
 Base = declarative_base()
 log = logging.getLogger(__name__)
 
+# key of the get_or_create_many lookup cache in Session.info
+_LOOKUP_CACHE = 'scrapfishin.lookup_cache'
+
+
+@sa.event.listens_for(Session, 'after_soft_rollback')
+def _forget_lookups(session, previous_transaction):
+    # rolled back rows no longer exist, anything we cached may be one of them
+    session.info.pop(_LOOKUP_CACHE, None)
+
 
 class Database:
     def __init__(self, conn_string: str):
@@ -37,6 +46,7 @@ class Database:
             log.exception(f'{type(e).__name__}: {e}')
             # raise e
         finally:
+            sess.info.pop(_LOOKUP_CACHE, None)
             sess.close()
             self._session = None
 
@@ -82,3 +92,81 @@ def get_or_create(
             return created, False
         except sa.exc.IntegrityError:
             return session.query(model).filter_by(**data).one(), True
+
+
+def get_or_create_many(
+    session: Session,
+    model: declarative_base,
+    rows: Iterable[dict],
+    *,
+    key: str,
+    _retry: bool=True
+) -> Dict[Hashable, declarative_base]:
+    """
+    Implementation of GET/CREATE for many <model(**row)> at once.
+
+    Rows are identified by the unique column `key`. All existing rows
+    are fetched with a single IN (...) query, and all missing rows are
+    created in a single flush. Every instance is then remembered for
+    the rest of the session, so asking for "teaspoon" a second time
+    doesn't touch the database at all.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.session.Session
+        sqlalchemy session to use for this transaction
+
+    model : sqlalchemy.ext.declarative.declarative_base
+        sqlalchemy model to fill with data
+
+    rows : [dict]
+        fields and values to feed into the model for each row
+
+    key : str
+        name of the unique column which identifies a row
+
+    Returns
+    -------
+    instances : dict
+        row[key] -> record retrieved from, or created in, the database
+
+    Raises
+    ------
+    sqlalchemy.exc.IntegrityError
+        if the missing rows can't be created, and that's not because
+        somebody else created some of them in the meantime
+    """
+    cache = session.info.setdefault(_LOOKUP_CACHE, {}).setdefault((model, key), {})
+    rows = {row[key]: row for row in rows}
+    found = {value: cache[value] for value in rows if value in cache}
+    missing = [value for value in rows if value not in found]
+    column = getattr(model, key)
+
+    # chunked to stay under the bound parameter limit of SQLite
+    for i in range(0, len(missing), 500):
+        for instance in session.query(model).filter(column.in_(missing[i:i + 500])):
+            found[getattr(instance, key)] = instance
+
+    new = [value for value in missing if value not in found]
+    created = [model(**rows[value]) for value in new]
+
+    if created:
+        try:
+            with session.begin_nested():
+                session.add_all(created)
+        except sa.exc.IntegrityError:
+            # somebody else may have created some of these in the meantime,
+            # then they exist now and one more try finds them. if none of
+            # them exist, the rows themselves are at fault
+            if not _retry or not any(
+                session.query(column).filter(column.in_(new[i:i + 500])).first()
+                for i in range(0, len(new), 500)
+            ):
+                raise
+
+            return get_or_create_many(session, model, rows.values(), key=key, _retry=False)
+
+        found.update({getattr(instance, key): instance for instance in created})
+
+    cache.update(found)
+    return found
@@ -0,0 +1,215 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+from urllib.parse import urlsplit
+import concurrent.futures as fs
+import functools as ft
+import asyncio
+import logging
+import random
+import time
+
+from scrapfishin.http import RetryableHTTPError
+
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Global requests-per-second limiter.
+
+    Tokens drip into the bucket at `rate` per second, up to `burst`
+    tokens. Every request takes one token, and waits for the next drip
+    if the bucket is empty.
+
+    Attributes
+    ----------
+    rate : float
+        tokens added per second
+
+    burst : int, default 1
+        maximum number of tokens the bucket holds
+    """
+    def __init__(self, rate: float, *, burst: int=1, clock: Callable[[], float]=time.monotonic):
+        if rate <= 0:
+            raise ValueError(f'rate must be positive, got: {rate}')
+
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = None
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available, then take it.
+        """
+        # created lazily, so the bucket may be built outside the event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # callers queue on the lock, which hands out tokens in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def __repr__(self):
+        return f'<TokenBucket rate={self.rate}/s burst={self.burst}>'
+
+
+class Engine:
+    """
+    asyncio driver for blocking page fetches.
+
+    Page fetches (requests, selenium) are blocking, so they run on a
+    thread pool. The event loop decides *when* each one is allowed to
+    start: no more than `per_host` at once against any host, no faster
+    than `rate` per second overall, and with jittered exponential
+    backoff when the server answers 429 or 5xx.
+
+    Attributes
+    ----------
+    rate : float, default 2.0
+        requests per second across all hosts
+
+    burst : int, default 1
+        number of requests allowed to go out back-to-back
+
+    per_host : int, default 4
+        maximum number of in-flight requests against a single host
+
+    retries : int, default 3
+        number of times to retry a request that was throttled or hit a
+        server error
+
+    backoff : float, default 1.0
+        base delay in seconds, doubled after each failed attempt
+
+    max_backoff : float, default 60.0
+        upper bound of any single delay
+
+    threads : int, default None
+        size of the thread pool running the fetches, defaults to `per_host`
+    """
+    def __init__(
+        self,
+        *,
+        rate: float=2.0,
+        burst: int=1,
+        per_host: int=4,
+        retries: int=3,
+        backoff: float=1.0,
+        max_backoff: float=60.0,
+        threads: int=None
+    ):
+        self.bucket = TokenBucket(rate, burst=burst)
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.threads = threads or per_host
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._executor = None
+
+    def delay(self, attempt: int, retry_after: float=None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (0-indexed).
+
+        Uses "full jitter", a uniform draw between 0 and the exponential
+        ceiling, so throttled workers don't all come back at once. A
+        server-provided Retry-After is honored as the lower bound.
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return max(retry_after or 0, random.uniform(0, ceiling))
+
+    async def run(self, fn: Callable[..., Any], *args, url: str, **kwargs) -> Any:
+        """
+        Run a blocking fetch under the engine's limits.
+
+        Parameters
+        ----------
+        fn : callable
+            blocking function which fetches `url`
+
+        *args, **kwargs
+            passed on to `fn`
+
+        url : str
+            location `fn` will hit, used to find its host
+
+        Returns
+        -------
+        result : Any
+            return value of `fn`
+        """
+        if self._executor is None:
+            raise RuntimeError('Engine must be used as an async context manager')
+
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).netloc
+        slots = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        call = ft.partial(fn, *args, **kwargs)
+
+        for attempt in range(self.retries + 1):
+            async with slots:
+                await self.bucket.acquire()
+
+                try:
+                    return await loop.run_in_executor(self._executor, call)
+                except RetryableHTTPError as e:
+                    if attempt == self.retries:
+                        raise
+
+                    error = e
+
+            # back off *outside* the host slot, so other requests may proceed
+            delay = self.delay(attempt, error.retry_after)
+            log.info(f'{error}, retrying in {delay:.1f}s ({attempt + 1}/{self.retries})')
+            await asyncio.sleep(delay)
+
+    async def gather(self, aws: Iterable[Awaitable]) -> List[Any]:
+        """
+        Await many fetches, keeping the failures alongside the results.
+
+        If this coroutine is cancelled, every fetch which has not started
+        yet is cancelled along with it.
+
+        Returns
+        -------
+        results : list
+            the result or exception of each awaitable, in order
+        """
+        tasks = [asyncio.ensure_future(aw) for aw in aws]
+
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def __aenter__(self):
+        self._executor = fs.ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='engine')
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # threads can't be interrupted, but we can drop everything queued
+        # behind them and stop waiting on the ones mid-fetch
+        self._executor.shutdown(wait=exc_info[0] is None, cancel_futures=True)
+        self._executor = None
+
+    def __repr__(self):
+        return f'<Engine {self.bucket!r} per_host={self.per_host}>'
@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from typing import Dict, Iterable, List
+import datetime as dt
+import logging
+
+import sqlalchemy as sa
+
+from scrapfishin.database import Database, get_or_create_many
+from scrapfishin.models import CrawlPage, Cuisine
+
+
+log = logging.getLogger(__name__)
+
+
+class Frontier:
+    """
+    Crawl state for a single source, persisted in the database.
+
+    Every recipe page a crawl discovers is recorded along with the
+    cuisines it was found under. As the crawl progresses, each page
+    moves through..
+
+        pending -> parsed -> stored
+                \\-> failed
+
+    A page is "parsed" once its source has been fetched and turned into
+    recipe data, and "stored" once that data is in the database. The
+    sha256 of the source is kept, so that a later crawl which fetches
+    the same content can skip it.
+
+    Attributes
+    ----------
+    db : Database
+        where to persist the crawl state
+
+    source : str
+        name of the site being crawled, e.g. "Hello Fresh"
+
+    refresh_after : datetime.timedelta, default 12 hours
+        stored pages fetched more recently than this are not revisited
+    """
+    def __init__(
+        self,
+        db: Database,
+        source: str,
+        *,
+        refresh_after: dt.timedelta=dt.timedelta(hours=12)
+    ):
+        self.db = db
+        self.source = source
+        self.refresh_after = refresh_after
+
+    @contextmanager
+    def _session(self) -> sa.orm.Session:
+        # unlike Database.session, errors are raised .. a crawl which can't
+        # tell what's left to do should stop where that went wrong
+        s = sa.orm.Session(bind=self.db.engine)
+
+        try:
+            yield s
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+
+    def discover(self, pages: Dict[str, List[str]]) -> None:
+        """
+        Record pages and the cuisines they were found under.
+
+        Parameters
+        ----------
+        pages : dict
+            slug -> regions of each cuisine the page is listed in
+        """
+        with self._session() as s:
+            known = {
+                p.slug: p
+                for p in s.query(CrawlPage).filter_by(source=self.source)
+            }
+            regions = get_or_create_many(
+                s,
+                Cuisine,
+                [{'region': region} for cuisines in pages.values() for region in cuisines],
+                key='region'
+            )
+
+            for slug, cuisines in pages.items():
+                try:
+                    page = known[slug]
+                except KeyError:
+                    page = known[slug] = CrawlPage(source=self.source, slug=slug, status='pending')
+                    s.add(page)
+
+                for region in cuisines:
+                    if regions[region] not in page.cuisines:
+                        page.cuisines.append(regions[region])
+
+        log.info(f'{len(pages)} pages discovered on {self.source}, {len(known)} known in total')
+
+    def todo(self) -> Dict[str, List[str]]:
+        """
+        Pages which should be fetched by this crawl.
+
+        That's everything not yet stored, which includes pages that
+        failed or were interrupted in a previous crawl, and any stored
+        page that hasn't been revisited in `refresh_after`.
+
+        Returns
+        -------
+        pages : dict
+            slug -> regions of each cuisine the page is listed in
+        """
+        stale = dt.datetime.utcnow() - self.refresh_after
+
+        with self._session() as s:
+            q = s.query(CrawlPage)\
+                 .options(sa.orm.selectinload(CrawlPage.cuisines))\
+                 .filter(CrawlPage.source == self.source)\
+                 .filter(sa.or_(
+                     CrawlPage.status != 'stored',
+                     CrawlPage.last_fetched.is_(None),
+                     CrawlPage.last_fetched < stale
+                 ))
+
+            return {p.slug: [c.region for c in p.cuisines] for p in q}
+
+    def unchanged(self, slug: str, digest: str) -> bool:
+        """
+        Determine if `slug` was already stored with content `digest`.
+        """
+        with self._session() as s:
+            q = s.query(CrawlPage.id)\
+                 .filter_by(source=self.source, slug=slug, status='stored', content_hash=digest)
+
+            return s.query(q.exists()).scalar()
+
+    def _update(self, slug: str, **values) -> None:
+        with self._session() as s:
+            s.query(CrawlPage)\
+             .filter_by(source=self.source, slug=slug)\
+             .update(values, synchronize_session=False)
+
+    def parsed(self, slug: str, digest: str, title: str) -> None:
+        """
+        Mark `slug` as fetched and turned into the recipe `title`.
+        """
+        now = dt.datetime.utcnow()
+        self._update(slug, status='parsed', content_hash=digest, title=title, last_fetched=now, error=None)
+
+    def revisited(self, slug: str) -> None:
+        """
+        Mark a stored `slug` as fetched again, with nothing new to store.
+        """
+        self._update(slug, last_fetched=dt.datetime.utcnow())
+
+    def failed(self, slug: str, error: Exception) -> None:
+        """
+        Mark `slug` as failed, it will be retried by the next crawl.
+        """
+        now = dt.datetime.utcnow()
+        self._update(slug, status='failed', error=f'{type(error).__name__}: {error}', last_fetched=now)
+
+    def stored(self, titles: Iterable[str]) -> None:
+        """
+        Mark the pages which produced the recipes `titles` as stored.
+        """
+        titles = list(titles)
+
+        with self._session() as s:
+            # chunked to stay under the bound parameter limit of SQLite
+            for i in range(0, len(titles), 500):
+                s.query(CrawlPage)\
+                 .filter(CrawlPage.source == self.source)\
+                 .filter(CrawlPage.status == 'parsed')\
+                 .filter(CrawlPage.title.in_(titles[i:i + 500]))\
+                 .update({'status': 'stored'}, synchronize_session=False)
+
+    def __repr__(self):
+        return f'<Frontier {self.source} @ {self.db}>'
@@ -0,0 +1,234 @@
+"""
+Ingredients which are recipes of their own, and what they're made of.
+
+A spice blend is both an ingredient of many recipes and a recipe, linked
+by the ingredient's parent recipe. IngredientGraph maps every such
+ingredient to the lines of its recipe, and expands it, however deeply
+blends are nested, into base ingredients only. Each blend is expanded
+once, and every use of it after that is a lookup scaled by its amount.
+
+All amounts are in canonical units (see scrapfishin.units), so that the
+lines of different recipes add up.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import sqlalchemy as sa
+
+from scrapfishin.queries import fingerprint
+from scrapfishin import models, schema, units
+
+
+class Line(NamedTuple):
+    food: str
+    unit: str
+    amount: Optional[float]
+
+
+def lines(recipe: Union[models.Recipe, schema.Recipe]) -> List[Line]:
+    """
+    Ingredient lines of a stored or a scraped recipe, in canonical units.
+    """
+    found = []
+
+    for ia in recipe.ingredient_amounts:
+        # scraped amounts are still as written, stored ones are numbers
+        if isinstance(ia.amount, str):
+            _, amount, unit = units.normalize(ia.amount, ia.measurement.unit)
+        else:
+            unit, factor = units.canonical_unit(ia.measurement.unit)
+            amount = None if ia.amount is None else ia.amount * factor
+
+        found.append(Line(ia.ingredient.food, unit, amount))
+
+    return found
+
+
+class IngredientGraph:
+    """
+    Ingredients which are made by a recipe -> that recipe's lines.
+
+    Attributes
+    ----------
+    fingerprint : str
+        state of the recipe table the graph was loaded from
+    """
+    def __init__(self, parents: Dict[str, List[Line]]=None, fingerprint: str=None):
+        self.fingerprint = fingerprint
+        self._parents = {food.lower(): list(found) for food, found in (parents or {}).items()}
+        self._bases: Dict[str, Tuple[Line, ...]] = {}
+
+    def __contains__(self, food: str) -> bool:
+        return food.lower() in self._parents
+
+    @classmethod
+    def load(cls, conn: sa.engine.Connectable) -> 'IngredientGraph':
+        """
+        Load every ingredient which has a parent recipe in the database.
+        """
+        state = fingerprint(conn)
+        ingredient = models.Ingredient.__table__
+        measurement = models.Measurement.__table__
+        ria = models.RecipeIngredientAmount.__table__
+        parent_of = dict(conn.execute(
+            sa.select([ingredient.c.parent_recipe_id, ingredient.c.food])
+              .where(ingredient.c.parent_recipe_id.isnot(None))
+        ).fetchall())
+
+        parents = {food: [] for food in parent_of.values()}
+        q = sa.select([ria.c.recipe_id, ingredient.c.food, measurement.c.unit, ria.c.amount])\
+              .select_from(
+                  ria.join(ingredient, ingredient.c.id == ria.c.ingredient_id)
+                     .join(measurement, measurement.c.id == ria.c.measurement_id)
+              )\
+              .where(ria.c.recipe_id.in_(list(parent_of)))
+
+        for recipe_id, food, unit, amount in conn.execute(q) if parent_of else ():
+            unit, factor = units.canonical_unit(unit)
+            parents[parent_of[recipe_id]].append(Line(food, unit, None if amount is None else amount * factor))
+
+        return cls(parents, state)
+
+    @classmethod
+    def cached(cls, engine: sa.engine.Engine, *, graph: 'IngredientGraph'=None) -> 'IngredientGraph':
+        """
+        Get a graph of the database as it is now.
+
+        `graph` is returned as is if no recipe changed since it was loaded,
+        along with everything it expanded so far.
+        """
+        if graph is not None and graph.fingerprint == fingerprint(engine):
+            return graph
+
+        return cls.load(engine)
+
+    def copy(self) -> 'IngredientGraph':
+        """
+        A graph of its own to add to, along with everything expanded so far.
+        """
+        graph = IngredientGraph(fingerprint=self.fingerprint)
+        graph._parents = {food: list(found) for food, found in self._parents.items()}
+        graph._bases = dict(self._bases)
+        return graph
+
+    def add(self, recipe: schema.Recipe) -> None:
+        """
+        Learn the parent recipes a scraped recipe's ingredients carry.
+
+        The graph then no longer matches the database, and won't be
+        returned by cached again.
+        """
+        for ia in recipe.ingredient_amounts:
+            parent = ia.ingredient.parent_recipe
+
+            if parent is None:
+                continue
+
+            food = ia.ingredient.food.lower()
+            found = lines(parent)
+
+            if self._parents.get(food) != found:
+                self._parents[food] = found
+                self._bases.clear()
+                self.fingerprint = None
+                self.add(parent)
+
+    def bases(self, food: str) -> Tuple[Line, ...]:
+        """
+        Base ingredients of one batch of an ingredient's parent recipe.
+
+        Raises
+        ------
+        ValueError
+            if recipes are, however indirectly, made of each other
+        """
+        return self._expand(food.lower(), ())
+
+    def _expand(self, food: str, path: Tuple[str, ...]) -> Tuple[Line, ...]:
+        if food in self._bases:
+            return self._bases[food]
+
+        if food in path:
+            cycle = ' -> '.join([*path[path.index(food):], food])
+            raise ValueError(f'recipes are made of each other: {cycle}')
+
+        found = []
+
+        for line in self._parents[food]:
+            if line.food.lower() in self._parents:
+                found += self.scale(line, path=(*path, food))
+            else:
+                found.append(line)
+
+        self._bases[food] = tuple(found)
+        return self._bases[food]
+
+    def scale(self, line: Line, *, path: Tuple[str, ...]=()) -> List[Line]:
+        """
+        Expand a line into base ingredients, in proportion to its amount.
+
+        An amount in the unit its parent recipe is measured in (e.g. 1
+        teaspoon of a blend of 12 teaspoons of spices) is that share of
+        a batch, any other amount (e.g. 2 units) is a number of batches.
+        A line with no amount is one batch.
+        """
+        food = line.food.lower()
+
+        if food not in self._parents:
+            return [line]
+
+        bases = self._expand(food, path)
+        batches = 1.0 if line.amount is None else line.amount
+        batch = self._parents[food]
+
+        if line.amount is not None and {b.unit for b in batch} == {line.unit} and all(b.amount for b in batch):
+            batches = line.amount / sum(b.amount for b in batch)
+
+        return [b._replace(amount=None if b.amount is None else b.amount * batches) for b in bases]
+
+
+def collect(
+    recipes: Iterable[Union[models.Recipe, schema.Recipe]],
+    *,
+    graph: IngredientGraph=None
+) -> List[Line]:
+    """
+    Total up the ingredients of many recipes, per food and unit.
+
+    Parameters
+    ----------
+    recipes : [models.Recipe or schema.Recipe]
+        recipes to total up, each of which counts once per time it's listed
+
+    graph : IngredientGraph, default None
+        expand ingredients with a parent recipe into their base
+        ingredients, ingredients are totaled as they are if None ..
+        parents carried by scraped recipes are added to a copy of it
+
+    Returns
+    -------
+    totals : [Line]
+        sorted by food and then unit, amounts are None if no line of
+        the food and unit had one
+    """
+    totals: Dict[Tuple[str, str], Optional[float]] = {}
+    shared = graph
+
+    for recipe in recipes:
+        if graph is not None and isinstance(recipe, schema.Recipe):
+            # what one scrape carries is nobody else's business
+            if graph is shared:
+                graph = graph.copy()
+
+            graph.add(recipe)
+
+        for line in lines(recipe):
+            for base in [line] if graph is None else graph.scale(line):
+                key = (base.food, base.unit)
+                total = totals.get(key)
+
+                if base.amount is not None:
+                    total = base.amount if total is None else total + base.amount
+
+                totals[key] = total
+
+    return [Line(food, unit, amount) for (food, unit), amount in sorted(totals.items())]
@@ -1 +1,2 @@
-from scrapfishin.hello_fresh.scraper import scrape
+from scrapfishin.hello_fresh.scraper import scrape, stream
+from scrapfishin.hello_fresh.const import SOURCE
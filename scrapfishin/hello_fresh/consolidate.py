@@ -0,0 +1,132 @@
+"""
+The last stage of a crawl: scraped recipe data -> Recipes.
+
+A recipe which is listed under more than one cuisine is scraped once per
+cuisine. merge folds the copies together by title, regardless of case,
+with the cuisines of all of them, in one pass over data in any order. validate turns each
+recipe into a Recipe, linking every ingredient which is a recipe of its
+own (e.g. a spice blend) to that recipe, through a ParentIndex.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional
+import logging
+
+from scrapfishin.schema import Recipe
+
+
+log = logging.getLogger(__name__)
+
+
+def title_key(title: str) -> str:
+    """
+    What two titles have in common if they name the same recipe.
+    """
+    return title.casefold()
+
+
+class ParentIndex:
+    """
+    Recipes which are ingredients of others, by title_key.
+
+    An ingredient is made by the recipe whose title is its food, e.g.
+    "tuscan heat spice" is made by the recipe "Tuscan Heat Spice".
+    """
+    def __init__(self, recipes: Iterable[Recipe]=()):
+        self._recipes: Dict[str, Recipe] = {}
+
+        for recipe in recipes:
+            self.add(recipe)
+
+    @classmethod
+    def unlisted(cls) -> 'ParentIndex':
+        """
+        Index the spice blends Hello Fresh uses, but doesn't list.
+        """
+        from scrapfishin.hello_fresh.unlisted_recipes import spices
+        return cls(spices)
+
+    def __iter__(self) -> Iterator[Recipe]:
+        return iter(self._recipes.values())
+
+    def __len__(self) -> int:
+        return len(self._recipes)
+
+    def __contains__(self, title: str) -> bool:
+        return title_key(title) in self._recipes
+
+    def add(self, recipe: Recipe) -> None:
+        self._recipes[title_key(recipe.title)] = recipe
+
+    def get(self, food: str) -> Optional[Recipe]:
+        return self._recipes.get(title_key(food))
+
+
+def merge(recipe_data: Iterable[dict]) -> List[dict]:
+    """
+    Fold together recipes which share a title_key, combining their cuisines.
+
+    Each recipe keeps the data (and title) it was first seen with, and its
+    place in the order recipes were first seen in.
+    """
+    merged: Dict[str, dict] = {}
+    regions: Dict[str, dict] = {}
+
+    for data in recipe_data:
+        key = title_key(data['title'])
+
+        if key not in merged:
+            merged[key] = data
+            regions[key] = {}
+
+        # a dict, rather than a set, keeps cuisines in the order they're seen
+        regions[key].update(dict.fromkeys(c['region'] for c in data['cuisines']))
+
+    return [
+        {**data, 'cuisines': [{'region': region} for region in regions[key]]}
+        for key, data in merged.items()
+    ]
+
+
+def validate(data: dict, parents: ParentIndex) -> Recipe:
+    """
+    Turn scraped recipe data into a Recipe, linking its parent recipes.
+    """
+    return Recipe.parse_obj({
+        **data,
+        'ingredient_amounts': [
+            {**i, 'ingredient': {**i['ingredient'], 'parent_recipe': parents.get(i['ingredient']['food'])}}
+            for i in data['ingredient_amounts']
+        ]
+    })
+
+
+def consolidate(recipe_data: Iterable[dict], parents: ParentIndex=None) -> List[Recipe]:
+    """
+    Merge and validate scraped recipe data.
+
+    Parameters
+    ----------
+    recipe_data : [dict]
+        recipes as scraped, in any order, duplicates and all
+
+    parents : ParentIndex, default ParentIndex.unlisted()
+        recipes ingredients may be made by
+
+    Returns
+    -------
+    recipes : [Recipe]
+        the parent recipes, then one Recipe per title scraped, scraped
+        recipes which share a title with a parent recipe are left out
+    """
+    parents = ParentIndex.unlisted() if parents is None else parents
+    recipes = list(parents)
+
+    log.info('deduplicating and validating recipe data')
+
+    for data in merge(recipe_data):
+        if data['title'] in parents:
+            log.info(f'skipping duplicate recipe "{data["title"]}"')
+            continue
+
+        recipes.append(validate(data, parents))
+
+    return recipes
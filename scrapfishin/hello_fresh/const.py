@@ -1 +1,24 @@
-BASE_URL = 'https://www.hellofresh.com'
+import os
+
+
+SOURCE = 'Hello Fresh'
+
+# may be pointed elsewhere, e.g. at benchmarks.mock_server
+BASE_URL = os.environ.get('SCRAPFISHIN_HELLO_FRESH_URL', 'https://www.hellofresh.com').rstrip('/')
+
+
+# CSS selectors used to decide when a page is ready to be read
+PROMO_POPUP = '[role="dialog"]'
+RECIPE_CARD = 'img[data-test-id="recipe-image"]'
+RECIPE_TITLE = 'h1[data-test-id="recipeDetailFragment.recipe-name"]'
+CUISINE_LINK = 'a[href*="-cuisine"]'
+
+
+# substrings which must be in a page's source for it to be parsed, if a
+# plain HTTP response is missing any of these we fall back to a browser
+RECIPE_MARKERS = (
+    'data-test-id="recipeDetailFragment.recipe-name"',
+    'data-translation-id="recipe-detail.preparation-time"',
+    'data-translation-id="recipe-detail.ingredients"'
+)
+ARCHIVE_MARKERS = ('data-test-id="recipe-image"',)
@@ -1,5 +1,28 @@
+from typing import Iterator, Optional, Tuple
+import itertools as it
+
+from bs4 import BeautifulSoup
+from lxml import etree
+import lxml.html
 import bs4
 
+from scrapfishin.hello_fresh.structured import FIELDS, extract
+from scrapfishin.hello_fresh.const import BASE_URL, SOURCE
+from scrapfishin.units import split_quantity
+
+
+PARSERS = ('lxml', 'soup')
+
+# maximum number of elements the lxml walkers step through looking for the
+# end of a section, a recipe page has nowhere near this many in any of them
+WALK_LIMIT = 2000
+
+
+def _amount(label: str) -> Tuple[str, str]:
+    # e.g. "1 1/2 cup" -> ("1 1/2", "cup"), a bare count like "2" is 2 units
+    amount, unit = split_quantity(label)
+    return amount, unit or 'unit'
+
 
 def parse_next_ingredient(tag: bs4.Tag) -> bs4.Tag:
     """
@@ -106,3 +129,254 @@ def extract_separated_tags(tag: bs4.element.Tag, *, section: str) -> list:
         tags = tag.find_next('span', text='•').parent.parent.text.split('•')[1:]
 
     return list(set(tags))
+
+
+def parse_recipe(html: str, slug: str, *, parser: str='lxml', structured: bool=True) -> dict:
+    """
+    Parse the Recipe page DOM into a JSON response.
+
+    Most pages embed the recipe as JSON for the frontend and for search
+    engines, which is read directly. The DOM is only walked when that
+    data is missing, or leaves out any of the fields we collect.
+
+    Parameters
+    ----------
+    html : str
+        source of the recipe page
+
+    slug : str
+        resource of the recipe page
+
+    parser : str, default 'lxml'
+        how to parse the page DOM, one of PARSERS, both produce the same data
+
+    structured : bool, default True
+        whether to read the recipe data embedded in the page, if False the
+        DOM is always walked
+
+    Returns
+    -------
+    recipe : dict
+        input data for a schema.Recipe
+    """
+    if parser not in PARSERS:
+        raise ValueError(f'"{parser}" is not a supported parser, expected one of {PARSERS}')
+
+    data = extract(html, slug) if structured else {}
+
+    if all(field in data for field in FIELDS):
+        return data
+
+    if parser == 'lxml':
+        dom = parse_recipe_lxml(html, slug)
+    else:
+        dom = parse_recipe_soup(html, slug)
+
+    return {**dom, **data}
+
+
+def parse_recipe_soup(html: str, slug: str) -> dict:
+    """
+    Parse the Recipe page with BeautifulSoup's pure-python html.parser.
+
+    See parse_recipe.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    title_tag   = soup.find('h1',   {'data-test-id': 'recipeDetailFragment.recipe-name'})
+    prep_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.preparation-time'})
+    diff_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.cooking-difficulty'})
+    tags_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.tags'})
+    allergy_tag = soup.find('span', {'data-translation-id': 'recipe-detail.allergens'})
+    ingredients_tag = soup.find('span', {'data-translation-id': 'recipe-detail.ingredients'})
+    utensil_tag = soup.find('span', {'data-translation-id': 'recipe-detail.utensils'})
+    steps_tag   = soup.find('a', {'data-test-id': 'recipeDetailFragment.instructions.downloadLink'})
+    nutrition_tag   = soup.find('div', {'data-test-id': 'recipeDetailFragment.nutrition-values'})
+
+    data = {
+        'source': SOURCE,
+        'glamor_shot_url': soup.find('img', {'alt': title_tag.text})['src'],
+        'title': f'{title_tag.text} {title_tag.find_next().text}',
+        'prep_time': f'{prep_tag.find_next().text}',
+        'difficulty': f'{diff_tag.find_next().text}',
+        'tags': [{'descriptor': t} for t in extract_separated_tags(tags_tag, section='tag')],
+        'allergies': [{'allergen': a} for a in extract_separated_tags(allergy_tag, section='allergen')],
+        'ingredient_amounts': [
+            {
+                'ingredient': {'food': tag.find_next().text},
+                'amount': amount,
+                'measurement': {'unit': unit}
+            }
+            for tag in parse_next_ingredient(ingredients_tag)
+            for amount, unit in [_amount(tag.text)]
+        ],
+        'utensils': [{'item': u} for u in extract_separated_tags(utensil_tag, section='utensil')],
+        'instructions_url': f'{BASE_URL}/{slug}' if steps_tag is None else steps_tag['href'],
+        'nutrition': {
+            tag.text.lower(): tag.find_next().text
+            for tag in parse_next_nutrient_value(nutrition_tag)
+        }
+    }
+
+    return data
+
+
+# ------------------------------------------------------------------------------
+# lxml
+#
+# The same walk as above, over a tree built by libxml2 rather than in python.
+# Each section is found directly by its data-test-id / data-translation-id
+# anchor with a compiled XPath, and walked no further than WALK_LIMIT elements.
+#
+
+def _anchor(element: str, attribute: str, value: str) -> etree.XPath:
+    return etree.XPath(f'(//{element}[@{attribute}="{value}"])[1]')
+
+
+_TITLE       = _anchor('h1',   'data-test-id', 'recipeDetailFragment.recipe-name')
+_PREP        = _anchor('span', 'data-translation-id', 'recipe-detail.preparation-time')
+_DIFFICULTY  = _anchor('span', 'data-translation-id', 'recipe-detail.cooking-difficulty')
+_TAGS        = _anchor('span', 'data-translation-id', 'recipe-detail.tags')
+_ALLERGENS   = _anchor('span', 'data-translation-id', 'recipe-detail.allergens')
+_INGREDIENTS = _anchor('span', 'data-translation-id', 'recipe-detail.ingredients')
+_UTENSILS    = _anchor('span', 'data-translation-id', 'recipe-detail.utensils')
+_STEPS       = _anchor('a',    'data-test-id', 'recipeDetailFragment.instructions.downloadLink')
+_NUTRITION   = _anchor('div',  'data-test-id', 'recipeDetailFragment.nutrition-values')
+_GLAMOR_SHOT = etree.XPath('(//img[@alt=$alt])[1]')
+
+
+def _first(xpath: etree.XPath, root: etree._Element, **variables) -> Optional[etree._Element]:
+    found = xpath(root, **variables)
+    return found[0] if found else None
+
+
+def _following(el: etree._Element, limit: int=WALK_LIMIT) -> Iterator[etree._Element]:
+    """
+    Elements after `el` in document order, like repeated bs4.Tag.find_next.
+    """
+    def walk():
+        yield from el.iterdescendants(etree.Element)
+        node = el
+
+        while node is not None:
+            for sibling in node.itersiblings(etree.Element):
+                yield sibling
+                yield from sibling.iterdescendants(etree.Element)
+
+            node = node.getparent()
+
+    return it.islice(walk(), limit)
+
+
+def _next(el: etree._Element) -> Optional[etree._Element]:
+    return next(_following(el, 1), None)
+
+
+def _text(el: etree._Element) -> str:
+    # bs4.Tag.text, all text within the element
+    return str(el.text_content())
+
+
+def _string(el: etree._Element) -> Optional[str]:
+    # bs4.Tag.string, the text of an element which holds nothing else
+    if len(el) == 0:
+        return el.text
+
+    if len(el) == 1 and not el.text and not el[0].tail:
+        return _string(el[0])
+
+    return None
+
+
+def _next_ingredients(tag: etree._Element) -> Iterator[etree._Element]:
+    # see parse_next_ingredient
+    for el in _following(tag):
+        if _text(el) == 'Not included in your delivery':
+            return
+
+        if el.tag != 'img':
+            continue
+
+        yield _next(_next(el))
+
+
+def _next_nutrients(tag: etree._Element) -> Iterator[etree._Element]:
+    # see parse_next_nutrient_value
+    walk = _following(tag)
+
+    for el in walk:
+        text = _text(el)
+
+        if text.startswith('Due to the different suppliers'):
+            return
+
+        if el.tag != 'span':
+            continue
+
+        if text.endswith('depending on your region.'):
+            continue
+
+        if any(_ in text.lower() for _ in ['nutri', 'serving', 'arrow']):
+            continue
+
+        yield el
+
+        # skip over the value
+        next(walk, None)
+
+
+def _separated(tag: Optional[etree._Element], *, section: str) -> list:
+    # see extract_separated_tags
+    tags = []
+
+    if tag is None:
+        return tags
+
+    if section in ['tag', 'allergen']:
+        tags = _text(_next(tag)).split('•')
+
+    if section == 'utensil':
+        bullet = next(el for el in _following(tag) if el.tag == 'span' and _string(el) == '•')
+        tags = _text(bullet.getparent().getparent()).split('•')[1:]
+
+    return list(set(tags))
+
+
+def parse_recipe_lxml(html: str, slug: str) -> dict:
+    """
+    Parse the Recipe page with lxml.
+
+    See parse_recipe.
+    """
+    root = lxml.html.document_fromstring(html)
+
+    title_tag = _first(_TITLE, root)
+    steps_tag = _first(_STEPS, root)
+    ingredient_tags = [(_text(tag), _text(_next(tag))) for tag in _next_ingredients(_first(_INGREDIENTS, root))]
+
+    data = {
+        'source': SOURCE,
+        'glamor_shot_url': _first(_GLAMOR_SHOT, root, alt=_text(title_tag)).get('src'),
+        'title': f'{_text(title_tag)} {_text(_next(title_tag))}',
+        'prep_time': f'{_text(_next(_first(_PREP, root)))}',
+        'difficulty': f'{_text(_next(_first(_DIFFICULTY, root)))}',
+        'tags': [{'descriptor': t} for t in _separated(_first(_TAGS, root), section='tag')],
+        'allergies': [{'allergen': a} for a in _separated(_first(_ALLERGENS, root), section='allergen')],
+        'ingredient_amounts': [
+            {
+                'ingredient': {'food': food},
+                'amount': amount,
+                'measurement': {'unit': unit}
+            }
+            for label, food in ingredient_tags
+            for amount, unit in [_amount(label)]
+        ],
+        'utensils': [{'item': u} for u in _separated(_first(_UTENSILS, root), section='utensil')],
+        'instructions_url': f'{BASE_URL}/{slug}' if steps_tag is None else steps_tag.get('href'),
+        'nutrition': {
+            _text(tag).lower(): _text(_next(tag))
+            for tag in _next_nutrients(_first(_NUTRITION, root))
+        }
+    }
+
+    return data
@@ -1,23 +1,36 @@
-from typing import List
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import concurrent.futures as fs
+import multiprocessing as mp
 import functools as ft
 import itertools as it
+import asyncio
+import hashlib
 import logging
-import time
 import re
 
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException
 from bs4 import BeautifulSoup
+import requests
 import pydantic
 
-from scrapfishin.hello_fresh.parser import (
-    extract_separated_tags, parse_next_ingredient, parse_next_nutrient_value
+from scrapfishin.hello_fresh.parser import PARSERS, parse_recipe
+from scrapfishin.hello_fresh.const import (
+    ARCHIVE_MARKERS, BASE_URL, CUISINE_LINK, PROMO_POPUP, RECIPE_CARD,
+    RECIPE_MARKERS, RECIPE_TITLE
+)
+from scrapfishin.hello_fresh.consolidate import ParentIndex, consolidate, title_key, validate
+from scrapfishin.schema import Recipe
+from scrapfishin.engine import Engine
+from scrapfishin.cache import PageCache
+from scrapfishin.frontier import Frontier
+from scrapfishin.http import (
+    BACKENDS, Chrome, ChromePool, HEADLESS_OPTIONS, http_get, http_session,
+    RetryableHTTPError, WaitTimings, wait_until
 )
-from scrapfishin.hello_fresh.const import BASE_URL
-from scrapfishin.schema import Recipe, IngredientAmount
-from scrapfishin.http import Chrome
 
 
 log = logging.getLogger(__name__)
@@ -25,18 +38,12 @@ log = logging.getLogger(__name__)
 
 # TODO
 #
-# Remove caching after we hit v1.0.0 - no need to cache in prod since each URL
-# is unlikely to be called multiple times within a single run.
-#
-# We could make this faster with asyncio/concurrent.futures.. let's consider
-# doing so and establishing a sane rate limit for the scraper.
-#
-# Finally, .datatize_recipe and .scrape should probably see some refactoring.
+# .datatize_recipe and .scrape should probably see some refactoring.
 # .scrape is an integration method, so it makes sense for it to do a lot, but
 # .datatize_recipe is a bit of scrape, a bit of parse.
 #
 
-def handle_promo_popup(actions: ActionChains) -> None:
+def handle_promo_popup(driver: Chrome, *, ready: str, timeout: float=10, timings: WaitTimings=None) -> None:
     """
     Ignores the Hello Fresh marketing bullshit. :)
 
@@ -44,20 +51,157 @@ def handle_promo_popup(actions: ActionChains) -> None:
     are not logged into the website, it will prompt the viewer with a
     promotional offer. We'll just send an ESCAPE and move along.
 
+    Rather than sleeping long enough for the popup to (maybe) show up,
+    we wait for whichever comes first: the popup, or the content we came
+    for. If the content wins, there's nothing to dismiss.
+
+    Parameters
+    ----------
+    driver : Chrome
+        browser which has just loaded a page
+
+    ready : str
+        CSS selector of the content which signals the page is loaded
+
+    timeout : float, default 10
+        maximum number of seconds to wait on each condition
+
+    timings : WaitTimings, default None
+        where to record how long each wait took
+    """
+    def popup_or_content(d):
+        if d.find_elements_by_css_selector(PROMO_POPUP):
+            return 'popup'
+
+        if d.find_elements_by_css_selector(ready):
+            return 'content'
+
+        return False
+
+    found = wait_until(driver, popup_or_content, timeout=timeout, label='promo popup or content', timings=timings)
+
+    if found == 'popup':
+        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+        wait_until(
+            driver,
+            lambda d: not d.find_elements_by_css_selector(PROMO_POPUP),
+            timeout=timeout,
+            label='promo popup dismissed',
+            timings=timings
+        )
+
+    if found != 'content':
+        wait_until(driver, element_count(ready), timeout=timeout, label='content ready', timings=timings)
+
+
+def element_count(selector: str) -> Callable[[Chrome], int]:
+    """
+    Build a wait condition which counts elements matching `selector`.
+    """
+    def count(driver: Chrome) -> int:
+        return len(driver.find_elements_by_css_selector(selector))
+
+    return count
+
+
+@contextmanager
+def browser(pool: ChromePool=None) -> Chrome:
+    """
+    Borrow a driver from `pool`, or start a throwaway one without it.
+
     Parameters
     ----------
-    actions : ActionChains
-        object used to automate low level interactions
+    pool : ChromePool, default None
+        long-lived drivers to borrow from
+    """
+    if pool is None:
+        with Chrome(*HEADLESS_OPTIONS) as driver:
+            yield driver
+    else:
+        with pool.driver() as driver:
+            yield driver
+
+
+def fetch_page(
+    slug: str,
+    *,
+    render: Callable[..., str],
+    markers: Iterable[str],
+    backend: str,
+    pool: ChromePool=None,
+    session: requests.Session=None,
+    cache: PageCache=None,
+    timings: WaitTimings=None,
+    paced: bool=False
+) -> str:
     """
-    # TODO: utilize explicit wait.until() to minimize of time spent here..
-    #   https://selenium-python.readthedocs.io/waits.html#explicit-waits
-    time.sleep(7)
-    actions.send_keys(Keys.ESCAPE).perform()
-    time.sleep(1)
+    Get the source of the page at <slug>, by whatever means necessary.
+
+    A fresh copy in `cache` is used as-is. Otherwise the page is fetched
+    over plain HTTP (revalidating a stale copy, if we have one) and, if
+    that doesn't produce a usable page, rendered in a browser.
+
+    Parameters
+    ----------
+    slug : str
+        resource of the page
+
+    render : callable
+        called as `render(slug, pool=pool, timings=timings)` to load the
+        page in a browser
+
+    markers : [str]
+        substrings a plain HTTP response must contain to be usable
+
+    backend : str
+        how to fetch the page, one of BACKENDS
 
+    pool, session, cache, timings, paced
+        see datatize_recipe
 
-@ft.lru_cache()
-def get_world_cuisines(slug: str='recipes') -> List[str]:
+    Returns
+    -------
+    html : str
+        source of the page
+    """
+    cached = None if cache is None else cache.get(slug)
+
+    if cached is not None and cached.fresh:
+        return cached.html
+
+    html = None
+
+    if backend == 'http':
+        try:
+            html = http_get(
+                f'{BASE_URL}/{slug}', session=session, markers=markers, cache=cache, key=slug, cached=cached
+            )
+        except RetryableHTTPError as e:
+            # the Engine backs off and tries again, nothing else does
+            if paced:
+                raise
+
+            log.info(f'{e}, rendering {slug} in the browser instead')
+
+    if html is None:
+        html = render(slug, pool=pool, timings=timings)
+
+        if cache is not None:
+            cache.put(slug, html)
+
+    return html
+
+
+def get_world_cuisines(
+    slug: str='recipes',
+    *,
+    backend: str='browser',
+    pool: ChromePool=None,
+    session: requests.Session=None,
+    cache: PageCache=None,
+    timings: WaitTimings=None,
+    paced: bool=False
+) -> List[str]:
     """
     Scrape all the links in the "world cuisines" category.
 
@@ -70,40 +214,70 @@ def get_world_cuisines(slug: str='recipes') -> List[str]:
     slug : str
         resource of the recipes archive
 
-    Returns
-    -------
-    cuisine_links : List[str]
-        a list of all world cuisines pages
-    """
-    opts = [
-        '--ignore-certificate-errors',
-        '--incognito',
-        '--headless',
-        'window-size=1920x1080'
-    ]
-    with Chrome(*opts) as driver:
-        driver.get(f'{BASE_URL}/{slug}')
+    backend : str, default 'browser'
+        how to fetch the page, one of BACKENDS
+
+    pool : ChromePool, default None
+        drivers to borrow from, if None a throwaway browser is started
 
-        with ActionChains(driver) as actions:
-            handle_promo_popup(actions)
+    session : requests.Session, default None
+        pooled HTTP client, if None a throwaway session is used
 
-            # scroll down, allowing the loading of Javascript which generates
-            # the "World cuisines" section
-            actions.send_keys(Keys.PAGE_DOWN).perform()
-            time.sleep(2)
+    cache : PageCache, default None
+        on-disk cache of page sources, if None every page is fetched
 
-            # hit the bottom of the page for good measure
-            driver.execute_script('window.scrollTo(0, document.body.scrollHeight);')
-            time.sleep(1)
+    timings : WaitTimings, default None
+        where to record how long the browser waited on the page
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+    paced : bool, default False
+        whether the fetch runs under the asyncio Engine, which retries a
+        throttled plain HTTP request itself, otherwise the page is
+        rendered in the browser
 
+    Returns
+    -------
+    cuisine_links : List[str]
+        a list of all world cuisines pages
+    """
+    html = fetch_page(
+        slug,
+        render=_render_world_cuisines,
+        markers=('-cuisine',),
+        backend=backend,
+        pool=pool,
+        session=session,
+        cache=cache,
+        timings=timings,
+        paced=paced
+    )
+
+    soup = BeautifulSoup(html, 'html.parser')
     links = soup.find_all('a', href=True)
     return [a['href'] for a in links if '-cuisine' in a['href']]
 
 
-@ft.lru_cache()
-def get_recipes(slug: str) -> List[str]:
+def _render_world_cuisines(slug: str, *, pool: ChromePool=None, timings: WaitTimings=None) -> str:
+    with browser(pool) as driver:
+        driver.get(f'{BASE_URL}/{slug}')
+        handle_promo_popup(driver, ready=RECIPE_CARD, timings=timings)
+
+        # hit the bottom of the page, allowing the loading of Javascript which
+        # generates the "World cuisines" section
+        driver.execute_script('window.scrollTo(0, document.body.scrollHeight);')
+        wait_until(driver, element_count(CUISINE_LINK), timeout=10, label='world cuisines', timings=timings)
+        return driver.page_source
+
+
+def get_recipes(
+    slug: str,
+    *,
+    backend: str='browser',
+    pool: ChromePool=None,
+    session: requests.Session=None,
+    cache: PageCache=None,
+    timings: WaitTimings=None,
+    paced: bool=False
+) -> List[str]:
     """
     Scrape all the links for recipes listed on <slug>.
 
@@ -116,129 +290,343 @@ def get_recipes(slug: str) -> List[str]:
     slug : str
         resource of the page aggregating recipes
 
+    backend : str, default 'browser'
+        how to fetch the page, one of BACKENDS
+
+    pool : ChromePool, default None
+        drivers to borrow from, if None a throwaway browser is started
+
+    session : requests.Session, default None
+        pooled HTTP client, if None a throwaway session is used
+
+    cache : PageCache, default None
+        on-disk cache of page sources, if None every page is fetched
+
+    timings : WaitTimings, default None
+        where to record how long the browser waited on the page
+
+    paced : bool, default False
+        whether the fetch runs under the asyncio Engine, which retries a
+        throttled plain HTTP request itself, otherwise the page is
+        rendered in the browser
+
     Returns
     -------
     recipe_links : List[str]
         a list of all recipes found on a page
     """
-    opts = [
-        '--ignore-certificate-errors',
-        '--incognito',
-        '--headless',
-        'window-size=1920x1080'
-    ]
-    with Chrome(*opts) as driver:
-        with ActionChains(driver) as actions:
-            driver.get(f'{BASE_URL}/{slug}')
-            handle_promo_popup(actions)
-
-            # continue loading recipes until they are no more to load
-            try:
-                while True:
-                    driver.find_element_by_partial_link_text('LOAD MORE').click()
-                    time.sleep(3)
-            except NoSuchElementException:
-                pass
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-
+    # there's no "LOAD MORE" button to click without a browser, so a plain
+    # HTTP fetch only sees the first page of the archive
+    html = fetch_page(
+        slug,
+        render=_render_recipes,
+        markers=ARCHIVE_MARKERS,
+        backend=backend,
+        pool=pool,
+        session=session,
+        cache=cache,
+        timings=timings,
+        paced=paced
+    )
+
+    soup = BeautifulSoup(html, 'html.parser')
     food_images = soup.find_all('img', {'data-test-id': 'recipe-image'})
     return list(set([img.find_previous('a')['href'] for img in food_images]))
 
 
-@ft.lru_cache()
-def datatize_recipe(slug: str) -> dict:
+def _render_recipes(slug: str, *, pool: ChromePool=None, timings: WaitTimings=None) -> str:
+    with browser(pool) as driver:
+        driver.get(f'{BASE_URL}/{slug}')
+        handle_promo_popup(driver, ready=RECIPE_CARD, timings=timings)
+        cards = element_count(RECIPE_CARD)
+        intercepted = 0
+
+        # continue loading recipes until they are no more to load, each click
+        # is done once the number of recipe cards on the page goes up
+        while True:
+            try:
+                button = driver.find_element_by_partial_link_text('LOAD MORE')
+            except NoSuchElementException:
+                break
+
+            loaded = cards(driver)
+
+            try:
+                button.click()
+            except ElementClickInterceptedException:
+                # the promo popup is late to the party
+                intercepted += 1
+
+                if intercepted > 3:
+                    log.warning(f'"LOAD MORE" on {slug} is stuck behind an overlay')
+                    break
+
+                handle_promo_popup(driver, ready=RECIPE_CARD, timings=timings)
+                continue
+
+            if not wait_until(driver, lambda d: cards(d) > loaded, timeout=15, label='load more', timings=timings):
+                log.warning(f'"LOAD MORE" on {slug} stopped producing recipes')
+                break
+
+        return driver.page_source
+
+
+def datatize_recipe(
+    slug: str,
+    *,
+    backend: str='http',
+    parser: str='lxml',
+    pool: ChromePool=None,
+    session: requests.Session=None,
+    cache: PageCache=None,
+    timings: WaitTimings=None,
+    paced: bool=False
+) -> dict:
     """
     Parse the Recipe page DOM into a JSON response.
 
+    Recipe pages are rendered server-side, so the plain HTTP backend
+    usually gets everything we need without starting a browser. If the
+    response is missing any of the RECIPE_MARKERS (e.g. we were served a
+    bot check or a client-rendered shell), we fall back to the browser.
+
     Parameters
     ----------
     slug : str
         resource of the recipe page
 
+    backend : str, default 'http'
+        how to fetch the page, one of BACKENDS
+
+    parser : str, default 'lxml'
+        how to parse the page, one of PARSERS
+
+    pool : ChromePool, default None
+        drivers to borrow from, if None a throwaway browser is started
+
+    session : requests.Session, default None
+        pooled HTTP client, if None a throwaway session is used
+
+    cache : PageCache, default None
+        on-disk cache of page sources, if None every page is fetched
+
+    timings : WaitTimings, default None
+        where to record how long the browser waited on the page
+
+    paced : bool, default False
+        whether the fetch runs under the asyncio Engine, which retries a
+        throttled plain HTTP request itself, otherwise the page is
+        rendered in the browser
+
     Returns
     -------
     recipe : Recipe
     """
-    opts = [
-        '--ignore-certificate-errors',
-        '--incognito',
-        '--headless',
-        'window-size=1920x1080'
-    ]
-    with Chrome(*opts) as driver:
-        with ActionChains(driver) as actions:
-            driver.get(f'{BASE_URL}/{slug}')
-            handle_promo_popup(actions)
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-
-    title_tag   = soup.find('h1',   {'data-test-id': 'recipeDetailFragment.recipe-name'})
-    prep_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.preparation-time'})
-    diff_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.cooking-difficulty'})
-    tags_tag    = soup.find('span', {'data-translation-id': 'recipe-detail.tags'})
-    allergy_tag = soup.find('span', {'data-translation-id': 'recipe-detail.allergens'})
-    ingredients_tag = soup.find('span', {'data-translation-id': 'recipe-detail.ingredients'})
-    utensil_tag = soup.find('span', {'data-translation-id': 'recipe-detail.utensils'})
-    steps_tag   = soup.find('a', {'data-test-id': 'recipeDetailFragment.instructions.downloadLink'})
-    nutrition_tag   = soup.find('div', {'data-test-id': 'recipeDetailFragment.nutrition-values'})
-
-    # TODO consider adding a unit converter .. examples like below will cause
-    # a lot of irregularities in the database, especially when combining
-    # recipes into other forms (e.g. like a shopping list)
-    #
-    # 1 can of tomato sauce = 1 box = 13.76 ounce
-    # 1 sprig of <herb> = 0.25 ounce
-    # 1 bunch of <herb> = 2.00 ounce
-    # 1 tablespoon = 3 teaspoon
-    #
-    data = {
-        'source': 'Hello Fresh',
-        'glamor_shot_url': soup.find('img', {'alt': title_tag.text})['src'],
-        'title': f'{title_tag.text} {title_tag.find_next().text}',
-        'prep_time': f'{prep_tag.find_next().text}',
-        'difficulty': f'{diff_tag.find_next().text}',
-        'tags': [{'descriptor': t} for t in extract_separated_tags(tags_tag, section='tag')],
-        'allergies': [{'allergen': a} for a in extract_separated_tags(allergy_tag, section='allergen')],
-        'ingredient_amounts': [
-            {
-                'ingredient': {'food': tag.find_next().text},
-                'amount': tag.text.split(' ')[0],
-                'measurement': {'unit': tag.text.split(' ')[1]}
-            }
-            for tag in parse_next_ingredient(ingredients_tag)
-        ],
-        'utensils': [{'item': u} for u in extract_separated_tags(utensil_tag, section='utensil')],
-        'instructions_url': f'{BASE_URL}/{slug}' if steps_tag is None else steps_tag['href'],
-        'nutrition': {
-            tag.text.lower(): tag.find_next().text
-            for tag in parse_next_nutrient_value(nutrition_tag)
-        }
-    }
-
-    return data
+    html = fetch_page(
+        slug,
+        render=_render_recipe,
+        markers=RECIPE_MARKERS,
+        backend=backend,
+        pool=pool,
+        session=session,
+        cache=cache,
+        timings=timings,
+        paced=paced
+    )
+
+    return parse_recipe(html, slug, parser=parser)
+
+
+def _render_recipe(slug: str, *, pool: ChromePool=None, timings: WaitTimings=None) -> str:
+    with browser(pool) as driver:
+        driver.get(f'{BASE_URL}/{slug}')
+        handle_promo_popup(driver, ready=RECIPE_TITLE, timings=timings)
+        return driver.page_source
 
 
-def scrape(scrapers: int=10) -> List[Recipe]:
+def scrape(scrapers: int=10, **options) -> List[Recipe]:
     """
     Run through Hello Fresh collecting Recipes.
 
     This method will take a considerable amount of time to run as it is
-    scraping almost every recipe listed on Hello Fresh.
+    scraping almost every recipe listed on Hello Fresh. See `stream` to
+    work with each recipe as soon as it is scraped.
 
     Parameters
     ----------
     scrapers : int, default 10
         number of workers concurrently scraping
 
+    **options
+        see `stream`
+
     Returns
     -------
     recipes : list
         all known recipes on Hello Fresh
     """
-    from scrapfishin.hello_fresh.unlisted_recipes import spices
+    return consolidate(_recipe_data(scrapers, **options))
+
+
+def stream(scrapers: int=10, **options) -> Iterator[Recipe]:
+    """
+    Run through Hello Fresh, yielding Recipes as they are scraped.
+
+    Recipes come out in the order their pages finish, not the order they
+    are listed in. Only a handful of pages are held in memory at once,
+    no matter how large the site is.
+
+    Unlike `scrape`, recipes can't be merged after they've been handed
+    out, so if two pages share a title only the first one is yielded.
+
+    Parameters
+    ----------
+    scrapers : int, default 10
+        number of workers concurrently scraping, each worker borrows
+        one long-lived browser from a pool of the same size
+
+    recycle_after : int, default 50
+        number of pages a browser may serve before it is restarted
+
+    discovery : str, default 'browser'
+        how to fetch the cuisine and archive pages, one of BACKENDS, only
+        a browser is able to page through "LOAD MORE"
+
+    detail : str, default 'http'
+        how to fetch the recipe pages, one of BACKENDS, the browser is
+        still used for any page a plain HTTP fetch can't parse
+
+    parser : str, default 'lxml'
+        how to parse the recipe pages, one of PARSERS
+
+    parsers : int, default None
+        number of processes parsing recipe pages, if None each page is
+        parsed on the worker that fetched it, which holds the GIL while
+        it does so. Parser processes are spawned, so a script which sets
+        this must guard its entry point with `if __name__ == '__main__'`
+
+    backlog : int, default 2 * parsers
+        number of fetched pages allowed to wait on the parsers, fetching
+        pauses while the backlog is full
+
+    rate : float, default None
+        requests per second, if set the crawl is paced by the asyncio
+        Engine, which also retries throttled requests with backoff
+
+    cache : PageCache, default None
+        on-disk cache of page sources, if None one is created in the temp
+        directory so that a restarted crawl doesn't fetch pages again
+
+    frontier : Frontier, default None
+        persisted crawl state, if given only pages which are new, failed
+        or changed since they were stored are scraped and returned
 
-    recipes  = [*spices]
+    Yields
+    ------
+    recipe : Recipe
+    """
+    return _stream(_recipe_data(scrapers, **options))
+
+
+def _stream(recipe_data: Iterator[dict]) -> Iterator[Recipe]:
+    parents = ParentIndex.unlisted()
+
+    yield from parents
+    # the same key consolidate folds recipes together by
+    seen = {title_key(p.title) for p in parents}
+
+    for data in recipe_data:
+        if title_key(data['title']) in seen:
+            log.info(f'skipping duplicate recipe "{data["title"]}"')
+            continue
+
+        try:
+            recipe = validate(data, parents)
+        except pydantic.ValidationError as e:
+            log.warning(f'invalid recipe "{data["title"]}": {e}')
+            continue
+
+        seen.add(title_key(recipe.title))
+        yield recipe
+
+
+def _recipe_data(
+    scrapers: int=10,
+    *,
+    recycle_after: int=50,
+    discovery: str='browser',
+    detail: str='http',
+    parser: str='lxml',
+    parsers: int=None,
+    backlog: int=None,
+    rate: float=None,
+    cache: PageCache=None,
+    frontier: Frontier=None
+) -> Iterator[dict]:
+    for backend in (discovery, detail):
+        if backend not in BACKENDS:
+            raise ValueError(f'"{backend}" is not a supported backend, expected one of {BACKENDS}')
+
+    if parser not in PARSERS:
+        raise ValueError(f'"{parser}" is not a supported parser, expected one of {PARSERS}')
+
+    session = http_session(scrapers)
+    # each crawl reports its own waits, not those of every crawl before it
+    timings = WaitTimings()
+    common = {'session': session, 'cache': cache, 'timings': timings, 'paced': rate is not None}
+    fetch = {
+        'discovery': {'backend': discovery, **common},
+        'detail': {'backend': detail, **common},
+        'parse': {'parser': parser}
+    }
+    stages = {'parsers': parsers, 'backlog': backlog or 2 * (parsers or 0)}
+
+    # everything else happens lazily, once the first recipe is asked for
+    return _crawl_data(scrapers, recycle_after, rate, fetch, frontier, stages)
+
+
+def _crawl_data(
+    scrapers: int,
+    recycle_after: int,
+    rate: Optional[float],
+    fetch: dict,
+    frontier: Optional[Frontier],
+    stages: dict
+) -> Iterator[dict]:
+    if stages['parsers'] is None:
+        parsers = nullcontext()
+    else:
+        # forking a process which is running threads (and a browser pool) is
+        # asking for trouble, the parsers start from a clean interpreter
+        parsers = fs.ProcessPoolExecutor(stages['parsers'], mp_context=mp.get_context('spawn'))
+
+    # a cache made here is the crawl's own, and is closed along with it ..
+    # not before the first recipe is asked for, so that a crawl which is
+    # never started has nothing to close
+    if fetch['detail']['cache'] is None:
+        owned = fetch['discovery']['cache'] = fetch['detail']['cache'] = PageCache()
+    else:
+        owned = nullcontext()
+
+    with fetch['detail']['session'], owned, ChromePool(scrapers, recycle_after=recycle_after) as pool, parsers as px:
+        if rate is None:
+            yield from _scrape(pool, fetch, frontier, px, stages['backlog'])
+        else:
+            engine = Engine(rate=rate, per_host=scrapers, threads=scrapers)
+            yield from _drive(_crawl(engine, pool, fetch, frontier, px, stages['backlog']))
+
+    timings = fetch['detail']['timings']
+    log.info(f'time spent waiting on page readiness: {timings.summary()}')
+
+
+def _scrape(
+    pool: ChromePool,
+    fetch: dict,
+    frontier: Frontier=None,
+    parsers: fs.ProcessPoolExecutor=None,
+    backlog: int=0
+) -> Iterator[dict]:
+    scrapers = pool.size
     cuisines = {}
 
     # Aggregate all cuisine slugs into a single dict with the form..
@@ -253,9 +641,9 @@ def scrape(scrapers: int=10) -> List[Recipe]:
     # }
     #
     with fs.ThreadPoolExecutor(max_workers=scrapers) as ex:
-        for slug in get_world_cuisines():
+        for slug in get_world_cuisines(pool=pool, **fetch['discovery']):
             cuisine = re.search(r'.*\/(.*)-.*', slug).group(1)
-            cuisines[cuisine] = ex.submit(get_recipes, slug[1:])
+            cuisines[cuisine] = ex.submit(get_recipes, slug[1:], pool=pool, **fetch['discovery'])
 
         log.info(f'scraping {len(cuisines)} cuisines for recipe locations')
         fs.wait(cuisines.values())
@@ -263,94 +651,284 @@ def scrape(scrapers: int=10) -> List[Recipe]:
     cuisines = {
         cuisine: future.result()
         for cuisine, future in cuisines.copy().items()
-        if future.done() and not future.cancelled()
+        if future.done() and not future.cancelled() and future.exception() is None
     }
 
-    # Aggregate all Recipes into a single list with the form..
+    pages = _plan(cuisines, frontier)
+    todo = iter(pages.items())
+    running = {}
+
+    # Yield each Recipe as soon as its page is done, in the form..
     #
     # e.g.
-    # [
-    #     {
-    #         'source': 'Hello Fresh',
-    #         ...
-    #         'cuisines': [
-    #             {'region': 'italian'},
-    #         ]
-    #     },
+    # {
+    #     'source': 'Hello Fresh',
     #     ...
-    # ]
+    #     'cuisines': [
+    #         {'region': 'italian'},
+    #     ]
+    # }
+    #
+    # Pages are submitted a few at a time rather than all at once, so that
+    # finished pages don't pile up in memory while we wait on the rest.
     #
+    # With parser processes, the threads only fetch. Each fetched page is
+    # handed to a parser, and no new fetches start while `backlog` pages
+    # are waiting on (or in) the parsers.
+    log.info(f'scraping {len(pages)} recipe pages for data')
+    parsing = {}
+
     with fs.ThreadPoolExecutor(max_workers=scrapers) as ex:
-        for cuisine, slugs in cuisines.copy().items():
-            futures = [ex.submit(datatize_recipe, slug[1:]) for slug in slugs]
-            cuisines[cuisine] = futures
+        try:
+            while True:
+                if parsers is None or len(parsing) < backlog:
+                    for slug, regions in it.islice(todo, 2 * scrapers - len(running)):
+                        if parsers is None:
+                            future = ex.submit(
+                                _datatize, slug, frontier=frontier, pool=pool, **fetch['detail'], **fetch['parse']
+                            )
+                        else:
+                            future = ex.submit(_fetch, slug, frontier=frontier, pool=pool, **fetch['detail'])
+
+                        running[future] = (slug, regions)
+
+                if not running and not parsing:
+                    break
+
+                done, _ = fs.wait([*running, *parsing], return_when=fs.FIRST_COMPLETED)
+
+                for future in done:
+                    if future in running:
+                        slug, regions = running.pop(future)
+                        digest = None
+                    else:
+                        slug, regions, digest = parsing.pop(future)
+
+                    try:
+                        if digest is None:
+                            data = future.result()
+                        else:
+                            data = _parsed(slug, digest, frontier, future.result)
+                    except Exception as e:
+                        log.warning(f'failed to scrape {slug}: {type(e).__name__}: {e}')
+                        continue
+
+                    if data is None:
+                        continue
+
+                    if parsers is not None and digest is None:
+                        html, digest = data
+                        parsing[parsers.submit(_parse, html, slug, **fetch['parse'])] = (slug, regions, digest)
+                        continue
+
+                    yield {**data, **{'cuisines': [{'region': region} for region in regions]}}
+        finally:
+            # the consumer may walk away early, don't start anything new
+            for future in [*running, *parsing]:
+                future.cancel()
+
+
+async def _crawl(
+    engine: Engine,
+    pool: ChromePool,
+    fetch: dict,
+    frontier: Frontier=None,
+    parsers: fs.ProcessPoolExecutor=None,
+    backlog: int=0
+) -> AsyncIterator[dict]:
+    """
+    The same crawl as _scrape, paced by the asyncio Engine.
+    """
+    loop = asyncio.get_running_loop()
+    waiting = asyncio.Semaphore(max(backlog, 1))
+
+    async with engine:
+        slugs = await engine.run(get_world_cuisines, url=BASE_URL, pool=pool, **fetch['discovery'])
+        regions = [re.search(r'.*\/(.*)-.*', slug).group(1) for slug in slugs]
+
+        log.info(f'scraping {len(regions)} cuisines for recipe locations')
+        results = await engine.gather(
+            engine.run(get_recipes, slug[1:], url=BASE_URL, pool=pool, **fetch['discovery'])
+            for slug in slugs
+        )
+        cuisines = {
+            cuisine: result
+            for cuisine, result in zip(regions, results)
+            if not isinstance(result, Exception)
+        }
 
-        log.info(f'scraping {len(futures)} recipe pages for data')
-        fs.wait([fut for futures in cuisines.values() for fut in futures])
+        pages = _plan(cuisines, frontier)
+        log.info(f'scraping {len(pages)} recipe pages for data')
 
-    recipe_data = [
-        {**future.result(), **{'cuisines': [{'region': cuisine}]}}
-        for cuisine, futures in cuisines.items()
-        for future in futures
-        if future.done() and not future.cancelled() and future.exception() is None
-    ]
+        async def parse(slug, html, digest):
+            future = loop.run_in_executor(parsers, ft.partial(_parse, html, slug, **fetch['parse']))
+            await asyncio.wait([future])
+            return _parsed(slug, digest, frontier, future.result)
 
-    # TODO
-    #  in order to get useful information out of our errors, we need to wrap
-    #  .datatize_recipe() with something that will catch and push the errors
-    #  up in a ScrapError.
-    #
-    #  TBD..
-    #
-    #  class ScrapError(Exception):
-    #      def __init__(self, e, slug):
-    #          self.e = e
-    #          self.slug = slug
-    #
-    #      # AttributeError - missing data on page
-    #      # IndexError - malformed ingredient on page
-    #      # pydantic.ValidationError - data doesn't pass validation
-    #
-    # errors = [
-    #     for cuisine, futures in cuisines.items()
-    #     for future in futures
-    #     if future.exception() is not None
-    # ]
-
-    # Now, if recipes appear in multiple cuisine regions, we'll have duplicates
-    # which will scare the database. Let's eliminate those dupes and append
-    # recipe schema objects for return.
-    #
-    # Note: We'll also handle the Parent recipe relationship here.
-    log.info(f'deduplicating and validating recipe data')
-    for title, group in it.groupby(recipe_data, key=lambda r: r['title']):
-        group = list(group)
-        regions = {c['region'] for recipe in group for c in recipe['cuisines']}
-
-        data = {
-            **group[0],
-            **{'cuisines': [{'region': region} for region in regions]},
-            # OK YEAH I KNOW IT'S UGLY.
-            #
-            #   We essentially redefine the Ingredient in IngredientAmount if
-            #   and only if a spice exists with the same name as the
-            #   ingredient.
-            #
-            #   next(..., None) acts like dict().get('key', None)
-            #
-            **{
-                'ingredient_amounts': [
-                    IngredientAmount.parse_obj({
-                        **i,
-                        'ingredient': {
-                            **i['ingredient'],
-                            'parent_recipe': next(filter(lambda s: s.title.lower() == i['ingredient']['food'].lower(), spices), None)
-                        }
-                    })
-                    for i in group[0]['ingredient_amounts']
-                ]
-            }
-        }
-        recipes.append(Recipe.parse_obj(data))
+        async def datatize(slug, regions):
+            try:
+                if parsers is None:
+                    data = await engine.run(
+                        _datatize, slug, url=BASE_URL, frontier=frontier, pool=pool, **fetch['detail'], **fetch['parse']
+                    )
+                else:
+                    # a slot is held from fetch to parsed, so at most `backlog`
+                    # pages are ever waiting on the parsers
+                    async with waiting:
+                        fetched = await engine.run(
+                            _fetch, slug, url=BASE_URL, frontier=frontier, pool=pool, **fetch['detail']
+                        )
+                        data = None if fetched is None else await parse(slug, *fetched)
+            except Exception as e:
+                log.warning(f'failed to scrape {slug}: {type(e).__name__}: {e}')
+                return None
+
+            if data is not None:
+                return {**data, **{'cuisines': [{'region': region} for region in regions]}}
+
+        # Pages are started a few at a time, as in _scrape, rather than as
+        # one task each up front. A page waiting on the parsers holds its
+        # task, so those get room on top of the fetches.
+        todo = iter(pages.items())
+        window = 2 * pool.size + backlog
+        running = set()
+
+        try:
+            while True:
+                for page in it.islice(todo, window - len(running)):
+                    running.add(asyncio.ensure_future(datatize(*page)))
+
+                if not running:
+                    break
+
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    data = task.result()
+
+                    if data is not None:
+                        yield data
+        finally:
+            for task in running:
+                task.cancel()
+
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+def _drive(aiterator: AsyncIterator) -> Iterator:
+    """
+    Step through an async iterator from synchronous code.
+    """
+    loop = asyncio.new_event_loop()
+
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(aiterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(aiterator.aclose())
+        loop.close()
+
+
+def _plan(cuisines: Dict[str, List[str]], frontier: Frontier=None) -> Dict[str, List[str]]:
+    """
+    Turn cuisine -> recipe links into recipe slug -> cuisines to scrape.
+
+    A recipe listed under several cuisines is only scraped once. With a
+    frontier, newly discovered pages are recorded and the crawl covers
+    whatever the frontier has left to do, which includes pages left over
+    from an earlier, interrupted crawl.
+    """
+    pages = defaultdict(list)
+
+    for cuisine, links in cuisines.items():
+        for link in links:
+            pages[link[1:]].append(cuisine)
+
+    if frontier is None:
+        return dict(pages)
+
+    frontier.discover(pages)
+    return frontier.todo()
 
-    return recipes
+
+def _datatize(
+    slug: str,
+    *,
+    frontier: Frontier=None,
+    parser: str='lxml',
+    **fetch
+) -> Optional[dict]:
+    """
+    datatize_recipe, keeping the frontier up to date.
+
+    Returns
+    -------
+    recipe : dict or None
+        None if the page is unchanged since it was last stored
+    """
+    fetched = _fetch(slug, frontier=frontier, **fetch)
+
+    if fetched is None:
+        return None
+
+    html, digest = fetched
+    return _parsed(slug, digest, frontier, lambda: _parse(html, slug, parser))
+
+
+def _fetch(slug: str, *, frontier: Frontier=None, **fetch) -> Optional[Tuple[str, str]]:
+    """
+    Fetch stage of _datatize.
+
+    Returns
+    -------
+    page : (str, str) or None
+        source of the page and its sha256, None if the page is unchanged
+        since it was last stored
+    """
+    try:
+        html = fetch_page(slug, render=_render_recipe, markers=RECIPE_MARKERS, **fetch)
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+        if frontier is not None and frontier.unchanged(slug, digest):
+            frontier.revisited(slug)
+            return None
+    except Exception as e:
+        if frontier is not None:
+            frontier.failed(slug, e)
+
+        raise
+
+    return html, digest
+
+
+def _parse(html: str, slug: str, parser: str='lxml') -> dict:
+    """
+    Parse stage of _datatize, which may run in a parser process.
+
+    The data is validated here, so that a page which can't become a
+    Recipe fails along with the page, rather than after the fact.
+    """
+    data = parse_recipe(html, slug, parser=parser)
+    Recipe.parse_obj(data)
+    return data
+
+
+def _parsed(slug: str, digest: str, frontier: Optional[Frontier], result: Callable[[], dict]) -> dict:
+    """
+    Collect the `result` of the parse stage, keeping the frontier up to date.
+    """
+    try:
+        data = result()
+    except Exception as e:
+        if frontier is not None:
+            frontier.failed(slug, e)
+
+        raise
+
+    if frontier is not None:
+        frontier.parsed(slug, digest, data['title'])
+
+    return data
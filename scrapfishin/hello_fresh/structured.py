@@ -0,0 +1,260 @@
+from typing import Iterator, Optional
+import logging
+import json
+import re
+
+from scrapfishin.hello_fresh.const import BASE_URL, SOURCE
+from scrapfishin.units import split_quantity
+
+
+log = logging.getLogger(__name__)
+
+
+# Recipe pages carry the recipe as data twice over, besides the rendered DOM..
+#
+#   <script id="__NEXT_DATA__" type="application/json">
+#       the page state the frontend hydrates from, which has everything
+#
+#   <script type="application/ld+json">
+#       a schema.org Recipe for search engines, which has no difficulty,
+#       allergens, utensils or recipe card
+#
+_SCRIPT = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.S | re.I)
+_HYDRATION = re.compile(r'\bid\s*=\s*["\']__NEXT_DATA__["\']', re.I)
+_JSON_LD = re.compile(r'\btype\s*=\s*["\']application/ld\+json["\']', re.I)
+_DURATION = re.compile(r'^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:\d+S)?)?$')
+
+DIFFICULTY = {1: 'Easy', 2: 'Medium', 3: 'Hard'}
+
+# schema.org NutritionInformation -> the label shown on the page
+NUTRIENTS = {
+    'calories': 'calories',
+    'fatContent': 'fat',
+    'saturatedFatContent': 'saturated fat',
+    'carbohydrateContent': 'carbohydrate',
+    'sugarContent': 'sugar',
+    'fiberContent': 'dietary fiber',
+    'proteinContent': 'protein',
+    'cholesterolContent': 'cholesterol',
+    'sodiumContent': 'sodium'
+}
+
+# everything the DOM walkers produce for a recipe
+FIELDS = (
+    'source', 'glamor_shot_url', 'title', 'prep_time', 'difficulty', 'tags',
+    'allergies', 'ingredient_amounts', 'utensils', 'instructions_url', 'nutrition'
+)
+
+
+def _scripts(html: str, kind: re.Pattern) -> Iterator[object]:
+    for match in _SCRIPT.finditer(html):
+        if not kind.search(match.group(1)):
+            continue
+
+        try:
+            yield json.loads(match.group(2))
+        except ValueError:
+            log.debug('skipping a structured data block which is not valid JSON')
+
+
+def _find(data: object, is_recipe, depth: int=12) -> Optional[dict]:
+    # depth-first search for the first recipe-like object in a JSON document
+    if depth < 0:
+        return None
+
+    if isinstance(data, dict):
+        if is_recipe(data):
+            return data
+
+        children = data.values()
+    elif isinstance(data, list):
+        children = data
+    else:
+        return None
+
+    for child in children:
+        found = _find(child, is_recipe, depth - 1)
+
+        if found is not None:
+            return found
+
+    return None
+
+
+def _minutes(duration: Optional[str]) -> Optional[str]:
+    # ISO 8601 duration, e.g. PT1H10M, -> the "70 minutes" shown on the page
+    match = _DURATION.match(duration or '')
+
+    if match is None or not any(match.groups()):
+        return None
+
+    days, hours, minutes = (int(v or 0) for v in match.group('days', 'hours', 'minutes'))
+    return f'{(days * 24 + hours) * 60 + minutes} minutes'
+
+
+def _number(value) -> str:
+    if value is None:
+        return ''
+
+    return f'{value:g}' if isinstance(value, (int, float)) else str(value)
+
+
+def _names(values: Optional[list]) -> list:
+    return list({v['name'] for v in values or [] if v.get('name')})
+
+
+def from_hydration(html: str, slug: str) -> Optional[dict]:
+    """
+    Read the recipe from the page state embedded for the frontend.
+
+    Parameters
+    ----------
+    html : str
+        source of the recipe page
+
+    slug : str
+        resource of the recipe page
+
+    Returns
+    -------
+    recipe : dict or None
+        input data for a schema.Recipe, None if the page has no such state
+    """
+    def is_recipe(d):
+        return 'name' in d and isinstance(d.get('ingredients'), list) and isinstance(d.get('yields'), list)
+
+    recipe = next(filter(None, (_find(doc, is_recipe) for doc in _scripts(html, _HYDRATION))), None)
+
+    if recipe is None or not recipe['yields']:
+        return None
+
+    # the page shows the smallest box, and leaves out what's in your pantry
+    foods = {i['id']: i for i in recipe['ingredients']}
+    box = min(recipe['yields'], key=lambda y: y.get('yields') or 0)
+    amounts = [
+        (foods[a['id']], a)
+        for a in box.get('ingredients', [])
+        if a.get('id') in foods and foods[a['id']].get('shipped', True)
+    ]
+
+    title = ' '.join(filter(None, [recipe['name'], recipe.get('headline')]))
+
+    data = {
+        'source': SOURCE,
+        'glamor_shot_url': recipe.get('imageLink'),
+        'title': title,
+        'prep_time': _minutes(recipe.get('prepTime') or recipe.get('totalTime')),
+        'difficulty': DIFFICULTY.get(recipe.get('difficulty')),
+        'tags': [{'descriptor': t} for t in _names(recipe.get('tags'))],
+        'allergies': [{'allergen': a} for a in _names(recipe.get('allergens'))],
+        'ingredient_amounts': [
+            {
+                'ingredient': {'food': food['name']},
+                'amount': _number(amount.get('amount')),
+                'measurement': {'unit': amount.get('unit') or 'unit'}
+            }
+            for food, amount in amounts
+        ],
+        'utensils': [{'item': u} for u in _names(recipe.get('utensils'))],
+        'instructions_url': recipe.get('cardLink') or f'{BASE_URL}/{slug}',
+        'nutrition': {
+            n['name'].lower(): f'{_number(n.get("amount"))} {n.get("unit", "")}'.strip()
+            for n in recipe.get('nutrition') or []
+            if n.get('name')
+        }
+    }
+
+    return {k: v for k, v in data.items() if v is not None}
+
+
+def from_json_ld(html: str, slug: str) -> Optional[dict]:
+    """
+    Read the recipe from its schema.org JSON-LD block.
+
+    JSON-LD has no notion of difficulty, allergens, utensils or a recipe
+    card, so the result is only ever a partial recipe.
+
+    Parameters
+    ----------
+    html : str
+        source of the recipe page
+
+    slug : str
+        resource of the recipe page
+
+    Returns
+    -------
+    recipe : dict or None
+        partial input data for a schema.Recipe, None if the page has no
+        Recipe block
+    """
+    def is_recipe(d):
+        kind = d.get('@type')
+        return kind == 'Recipe' or (isinstance(kind, list) and 'Recipe' in kind)
+
+    recipe = next(filter(None, (_find(doc, is_recipe) for doc in _scripts(html, _JSON_LD))), None)
+
+    if recipe is None:
+        return None
+
+    image = recipe.get('image')
+
+    if isinstance(image, list):
+        image = image[0] if image else None
+
+    if isinstance(image, dict):
+        image = image.get('url')
+
+    keywords = recipe.get('keywords') or []
+
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+
+    data = {
+        'source': SOURCE,
+        'glamor_shot_url': image,
+        'title': recipe.get('name'),
+        'prep_time': _minutes(recipe.get('prepTime') or recipe.get('totalTime')),
+        'tags': [{'descriptor': k} for k in {k.strip() for k in keywords if k.strip()}],
+        'nutrition': {
+            label: str(recipe['nutrition'][key])
+            for key, label in NUTRIENTS.items()
+            if isinstance(recipe.get('nutrition'), dict) and key in recipe['nutrition']
+        }
+    }
+
+    # e.g. "6 ounce Spaghetti", anything less than amount, unit and food is
+    # left for the DOM to sort out
+    ingredients = [split_quantity(str(i)) for i in recipe.get('recipeIngredient') or []]
+    ingredients = [(amount, *rest.split(' ', 1)) for amount, rest in ingredients]
+
+    if ingredients and all(len(i) == 3 and i[0] for i in ingredients):
+        data['ingredient_amounts'] = [
+            {
+                'ingredient': {'food': food},
+                'amount': amount,
+                'measurement': {'unit': unit}
+            }
+            for amount, unit, food in ingredients
+        ]
+
+    return {k: v for k, v in data.items() if v}
+
+
+def extract(html: str, slug: str) -> dict:
+    """
+    Read whatever recipe data the page embeds, without touching the DOM.
+
+    The frontend's page state is preferred, JSON-LD fills in after it.
+
+    Returns
+    -------
+    recipe : dict
+        partial input data for a schema.Recipe, possibly empty
+    """
+    data = from_hydration(html, slug) or {}
+
+    if all(field in data for field in FIELDS):
+        return data
+
+    return {**(from_json_ld(html, slug) or {}), **data}
@@ -124,8 +124,8 @@ zaatar_spice_blend = Recipe.parse_obj({
     'ingredient_amounts': [
         {'ingredient': {'food': 'toasted sesame seeds'}, 'amount': '3', 'measurement': {'unit': 'teaspoon'}},
         {'ingredient': {'food': 'salt'}, 'amount': '0.5', 'measurement': {'unit': 'teaspoon'}},
-        {'ingredient': {'food': 'ground'}, 'amount': 'cumin 0.5', 'measurement': {'unit': 'teaspoon'}},
-        {'ingredient': {'food': 'dried'}, 'amount': 'thyme 3', 'measurement': {'unit': 'teaspoon'}},
+        {'ingredient': {'food': 'ground cumin'}, 'amount': '0.5', 'measurement': {'unit': 'teaspoon'}},
+        {'ingredient': {'food': 'dried thyme'}, 'amount': '3', 'measurement': {'unit': 'teaspoon'}},
         {'ingredient': {'food': 'oregano'}, 'amount': '3', 'measurement': {'unit': 'teaspoon'}},
         {'ingredient': {'food': 'marjoram'}, 'amount': '3', 'measurement': {'unit': 'teaspoon'}},
         {'ingredient': {'food': 'sumac'}, 'amount': '9', 'measurement': {'unit': 'teaspoon'}}
@@ -146,9 +146,7 @@ mediterranean_spice_blend = Recipe.parse_obj({
 # TODO: further reading:
 # https://www.reddit.com/r/hellofresh/comments/bawnby/hello_fresh_diy_spice_blends/
 #
-# SELECT i.ingredient
-#   FROM ingredient AS i
-#  WHERE i.ingredient LIKE '%spice%'
+# Scrap().search('spice')
 #
 # ranch spice
 # fajita spice blend
@@ -1,6 +1,51 @@
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable
+import threading
+import logging
 import pathlib
+import queue
+import time
 
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium import webdriver
+from requests.adapters import HTTPAdapter
+import requests
+
+from scrapfishin.cache import CachedPage, PageCache
+
+
+log = logging.getLogger(__name__)
+
+
+BACKENDS = ('browser', 'http')
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36'
+)
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryableHTTPError(Exception):
+    """
+    The server asked us to slow down, or had a transient failure.
+    """
+    def __init__(self, url: str, status: int, retry_after: float=None):
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+        super().__init__(f'{status} from {url}')
+
+
+HEADLESS_OPTIONS = (
+    '--ignore-certificate-errors',
+    '--incognito',
+    '--headless',
+    'window-size=1920x1080'
+)
 
 
 class Chrome(webdriver.Chrome):
@@ -9,3 +54,386 @@ class Chrome(webdriver.Chrome):
         [opts.add_argument(option) for option in options]
         exe = pathlib.Path(__file__).parent / 'vendor' / 'chromedriver.exe'
         super().__init__(str(exe), options=opts)
+        self.pages_served = 0
+
+
+class ChromePool:
+    """
+    A bounded pool of long-lived Chrome drivers.
+
+    Starting a browser costs seconds, while loading a page in one that
+    is already running costs far less. Workers check a driver out of the
+    pool, use it for a single page, and hand it back. Drivers are
+    started lazily, so the pool never holds more than it has been asked
+    for, and never more than `size`.
+
+    A driver is thrown away and replaced when..
+      - it fails a health check on checkout
+      - the worker using it raises a WebDriverException
+      - it has served `recycle_after` pages, which keeps long crawls
+        from accumulating browser memory leaks
+
+    Attributes
+    ----------
+    size : int, default 1
+        maximum number of drivers alive at once
+
+    *options
+        arguments passed to each Chrome driver, default HEADLESS_OPTIONS
+
+    recycle_after : int, default 50
+        number of pages a driver may serve before it is replaced
+    """
+    def __init__(self, size: int=1, *options, recycle_after: int=50):
+        if size < 1:
+            raise ValueError(f'pool size must be at least 1, got: {size}')
+
+        self.size = size
+        self.options = options or HEADLESS_OPTIONS
+        self.recycle_after = recycle_after
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._drivers = set()
+        self._closed = False
+
+    @staticmethod
+    def is_healthy(driver: Chrome) -> bool:
+        """
+        Determine if the browser behind `driver` is still responsive.
+        """
+        try:
+            driver.current_url
+        except WebDriverException:
+            return False
+        return True
+
+    def _spawn(self) -> Chrome:
+        driver = Chrome(*self.options)
+
+        with self._lock:
+            self._drivers.add(driver)
+
+        log.debug(f'started chrome driver ({len(self._drivers)}/{self.size})')
+        return driver
+
+    def _retire(self, driver: Chrome) -> None:
+        with self._lock:
+            self._drivers.discard(driver)
+
+        try:
+            driver.quit()
+        except WebDriverException:
+            # the browser crashed out from under us, there's nothing to quit
+            pass
+
+    def _checkout(self) -> Chrome:
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+
+            if self.is_healthy(driver):
+                return driver
+
+            log.info('retiring unresponsive chrome driver')
+            self._retire(driver)
+
+    @contextmanager
+    def driver(self) -> Chrome:
+        """
+        Check out a driver for the duration of the context.
+
+        Blocks until a driver is available if all `size` drivers are
+        currently checked out.
+        """
+        if self._closed:
+            raise RuntimeError('cannot check out a driver from a closed pool')
+
+        self._slots.acquire()
+
+        try:
+            driver = self._checkout()
+
+            try:
+                yield driver
+            except WebDriverException:
+                self._retire(driver)
+                raise
+            except BaseException:
+                self._checkin(driver)
+                raise
+            else:
+                driver.pages_served += 1
+                self._checkin(driver)
+        finally:
+            self._slots.release()
+
+    def _checkin(self, driver: Chrome) -> None:
+        if self._closed or driver.pages_served >= self.recycle_after:
+            self._retire(driver)
+        else:
+            self._idle.put(driver)
+
+    def close(self) -> None:
+        """
+        Shut down every driver the pool has started.
+        """
+        self._closed = True
+
+        with self._lock:
+            drivers = list(self._drivers)
+
+        for driver in drivers:
+            self._retire(driver)
+
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f'<ChromePool size={self.size} alive={len(self._drivers)}>'
+
+
+class WaitTimings:
+    """
+    Records how long each kind of explicit wait actually took.
+
+    Waits are grouped by label, so a crawl can report e.g. how long the
+    promo popup held us up on average, or how often "LOAD MORE" timed out.
+    Each crawl keeps its own, and hands it down to every wait_until.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = defaultdict(list)
+
+    def record(self, label: str, elapsed: float, *, satisfied: bool) -> None:
+        with self._lock:
+            self._timings[label].append((elapsed, satisfied))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregate statistics for each label.
+
+        Returns
+        -------
+        summary : dict
+            label -> {count, timeouts, total, mean, max} in seconds
+        """
+        with self._lock:
+            timings = {label: list(waits) for label, waits in self._timings.items()}
+
+        summary = {}
+
+        for label, waits in timings.items():
+            elapsed = [e for e, _ in waits]
+            summary[label] = {
+                'count': len(waits),
+                'timeouts': sum(1 for _, satisfied in waits if not satisfied),
+                'total': sum(elapsed),
+                'mean': sum(elapsed) / len(elapsed),
+                'max': max(elapsed)
+            }
+
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._timings.clear()
+
+
+
+def wait_until(
+    driver: webdriver.Remote,
+    condition: Callable[[webdriver.Remote], Any],
+    *,
+    timeout: float,
+    label: str,
+    poll: float=0.1,
+    timings: WaitTimings=None
+) -> Any:
+    """
+    Block until `condition` holds, or give up after `timeout` seconds.
+
+    Unlike a bare WebDriverWait, a timeout is not an error here. Most
+    of our waits are for things that may never happen, like a promo
+    popup that only shows for some visitors.
+
+    Parameters
+    ----------
+    driver : selenium.webdriver.Remote
+        browser to poll
+
+    condition : callable
+        called with `driver`, the wait ends once it returns truthy
+
+    timeout : float
+        maximum number of seconds to wait
+
+    label : str
+        name to record the elapsed time under in `timings`
+
+    poll : float, default 0.1
+        seconds between checks of `condition`
+
+    timings : WaitTimings, default None
+        where to record how long the wait took, if None it isn't
+
+    Returns
+    -------
+    result : Any
+        the truthy value returned by `condition`, or None on timeout
+    """
+    start = time.perf_counter()
+
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        result = None
+
+    elapsed = time.perf_counter() - start
+
+    if timings is not None:
+        timings.record(label, elapsed, satisfied=result is not None)
+
+    log.debug(f'waited {elapsed:.2f}s for {label} ({"ok" if result is not None else "timeout"})')
+    return result
+
+
+def http_session(size: int=10) -> requests.Session:
+    """
+    Build an HTTP client which keeps up to `size` connections alive.
+
+    Parameters
+    ----------
+    size : int, default 10
+        number of keep-alive connections held per host, this should
+        match the number of threads sharing the session
+
+    Returns
+    -------
+    session : requests.Session
+    """
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def http_get(
+    url: str,
+    *,
+    session: requests.Session=None,
+    markers: Iterable[str]=(),
+    timeout: float=30,
+    cache: PageCache=None,
+    key: str=None,
+    cached: CachedPage=None
+) -> str:
+    """
+    Fetch a page without a browser.
+
+    Parameters
+    ----------
+    url : str
+        location of the page
+
+    session : requests.Session, default None
+        pooled client to send the request through
+
+    markers : [str], default ()
+        substrings which must all be present in the page source for it
+        to be considered usable
+
+    timeout : float, default 30
+        seconds to wait on the server
+
+    cache : PageCache, default None
+        if the page is already cached, the request is made conditional
+        on its ETag / Last-Modified and a "304 Not Modified" is served
+        from the cache, a successful response is stored in the cache
+
+    key : str, default `url`
+        name the page is stored under in `cache`
+
+    cached : CachedPage, default None
+        the page as already read from `cache`, so that it isn't read
+        (and decompressed) a second time
+
+    Returns
+    -------
+    html : str or None
+        page source, or None if the request failed or markers are missing
+
+    Raises
+    ------
+    RetryableHTTPError
+        if the server responds with 429 or a transient 5xx, falling back
+        to a browser would only hit the same wall
+    """
+    client = session or requests
+    key = key or url
+
+    if cached is None and cache is not None:
+        cached = cache.get(key)
+
+    headers = {}
+
+    if cached is not None and cached.etag:
+        headers['If-None-Match'] = cached.etag
+
+    if cached is not None and cached.last_modified:
+        headers['If-Modified-Since'] = cached.last_modified
+
+    try:
+        r = client.get(url, timeout=timeout, headers=headers)
+    except requests.RequestException as e:
+        log.debug(f'plain HTTP fetch of {url} failed: {e}')
+        return None
+
+    if r.status_code == 304 and cached is not None:
+        if cache is not None:
+            cache.refresh(key)
+
+        return cached.html
+
+    if r.status_code in RETRYABLE_STATUS:
+        raise RetryableHTTPError(url, r.status_code, retry_after=_retry_after(r))
+
+    try:
+        r.raise_for_status()
+    except requests.RequestException as e:
+        log.debug(f'plain HTTP fetch of {url} failed: {e}')
+        return None
+
+    missing = [m for m in markers if m not in r.text]
+
+    if missing:
+        log.debug(f'plain HTTP fetch of {url} is missing {missing}')
+        return None
+
+    if cache is not None:
+        cache.put(
+            key,
+            r.text,
+            etag=r.headers.get('ETag'),
+            last_modified=r.headers.get('Last-Modified')
+        )
+
+    return r.text
+
+
+def _retry_after(r: requests.Response) -> float:
+    # Retry-After may also be an HTTP-date, which we don't bother with
+    try:
+        return float(r.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
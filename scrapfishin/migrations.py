@@ -0,0 +1,142 @@
+"""
+Bring an existing database up to date with scrapfishin.models.
+
+create_all only ever creates what's missing outright, so a database made
+by an older scrapfishin keeps its old tables as they were. migrate also
+adds the columns and indexes those tables are missing, and fills in the
+new columns of rows which were stored before they existed.
+
+Every step looks at the database before it changes anything, so migrate
+is safe to run every time the database is opened.
+"""
+from typing import List
+import logging
+
+import sqlalchemy as sa
+
+from scrapfishin.database import Base
+from scrapfishin.persist import upsert
+from scrapfishin import models, queries, search, units
+
+
+log = logging.getLogger(__name__)
+
+
+def migrate(engine: sa.engine.Engine) -> List[str]:
+    """
+    Create, alter and backfill tables to match the models.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        database to migrate
+
+    Returns
+    -------
+    changes : [str]
+        what was done, empty if the database was already up to date
+    """
+    Base.metadata.create_all(engine)
+    changes = []
+
+    with engine.begin() as conn:
+        changes += _add_columns(conn)
+        changes += _add_indexes(conn)
+        changes += _backfill_shuffle(conn)
+        changes += _backfill_canonical_amounts(conn)
+        changes += _backfill_search(conn)
+
+    for change in changes:
+        log.info(f'migrated: {change}')
+
+    return changes
+
+
+def _add_columns(conn: sa.engine.Connection) -> List[str]:
+    inspector = sa.inspect(conn)
+    changes = []
+
+    for table in Base.metadata.sorted_tables:
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name in existing:
+                continue
+
+            # only ever nullable columns are added, so no default is needed
+            ddl = sa.schema.CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+            changes.append(f'added column {table.name}.{column.name}')
+
+    return changes
+
+
+def _add_indexes(conn: sa.engine.Connection) -> List[str]:
+    inspector = sa.inspect(conn)
+    changes = []
+
+    for table in Base.metadata.sorted_tables:
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                changes.append(f'added index {index.name}')
+
+    return changes
+
+
+def _backfill_shuffle(conn: sa.engine.Connection) -> List[str]:
+    recipe = models.Recipe.__table__
+    missing = conn.execute(sa.select([sa.func.count()]).where(recipe.c.shuffle.is_(None))).scalar()
+
+    if not missing:
+        return []
+
+    conn.execute(
+        recipe.update()
+              .where(recipe.c.shuffle.is_(None))
+              .values(shuffle=queries.random_position(conn.dialect))
+    )
+    return [f'gave {missing} recipes a shuffled position']
+
+
+def _backfill_canonical_amounts(conn: sa.engine.Connection) -> List[str]:
+    ria = models.RecipeIngredientAmount.__table__
+    measurement = models.Measurement.__table__
+    q = sa.select([measurement.c.id, measurement.c.unit])\
+          .where(measurement.c.id.in_(
+              sa.select([ria.c.measurement_id]).where(ria.c.canonical_measurement_id.is_(None))
+          ))
+    stale = dict(conn.execute(q).fetchall())
+
+    if not stale:
+        return []
+
+    canonical = {id_: units.canonical_unit(unit) for id_, unit in stale.items()}
+    upsert(conn, measurement, [{'unit': unit} for unit in {c for c, _ in canonical.values()}], keys=['unit'])
+    ids = {unit: id_ for id_, unit in conn.execute(sa.select([measurement.c.id, measurement.c.unit]))}
+
+    # the raw amount of these rows wasn't kept, so it stays empty
+    for measurement_id, (unit, factor) in canonical.items():
+        conn.execute(
+            ria.update()
+               .where(ria.c.measurement_id == measurement_id)
+               .where(ria.c.canonical_measurement_id.is_(None))
+               .values(canonical_measurement_id=ids[unit], canonical_amount=ria.c.amount * factor)
+        )
+
+    return [f'converted amounts of {len(canonical)} measurements to canonical units']
+
+
+def _backfill_search(conn: sa.engine.Connection) -> List[str]:
+    if not search.supported(conn):
+        return []
+
+    missing = search.unindexed(conn)
+
+    if not missing:
+        return []
+
+    search.index(conn, missing)
+    return [f'indexed {len(missing)} recipes for search']
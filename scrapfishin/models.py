@@ -1,5 +1,7 @@
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, ForeignKey, Integer, Numeric, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, Numeric, String, UniqueConstraint
+import datetime as dt
+import random
 
 from scrapfishin.database import Base
 
@@ -24,6 +26,7 @@ class PrettyModelMixin:
 
 class Recipe(Base, PrettyModelMixin):
     __tablename__ = 'recipe'
+    __table_args__ = (Index('ix_recipe_source_shuffle', 'source', 'shuffle'),)
 
     id = Column(Integer, primary_key=True)
     title = Column(String, unique=True)
@@ -32,6 +35,8 @@ class Recipe(Base, PrettyModelMixin):
     source = Column(String, comment='source can be a website, friend, etc')
     glamor_shot_url = Column(String)
     instructions_url = Column(String)
+    shuffle = Column(Float, default=random.random, index=True, comment='random position in [0, 1), for sampling')
+    updated_at = Column(DateTime, default=dt.datetime.utcnow, onupdate=dt.datetime.utcnow)
 
     allergies = relationship('Allergy', secondary='recipe_allergy', backref='recipes', **_rel_kw)
     cuisines = relationship('Cuisine', secondary='recipe_cuisine', backref='recipes', **_rel_kw)
@@ -78,7 +83,7 @@ class Ingredient(Base, PrettyModelMixin):
 
     id = Column(Integer, primary_key=True)
     food = Column(String, unique=True)
-    parent_recipe_id = Column(Integer, ForeignKey('recipe.id'), nullable=True)
+    parent_recipe_id = Column(Integer, ForeignKey('recipe.id'), nullable=True, index=True)
 
     recipes = relationship('RecipeIngredientAmount', back_populates='ingredient', **_rel_kw)
 
@@ -93,22 +98,31 @@ class Measurement(Base, PrettyModelMixin):
 #
 # Associations / Bridge Tables / XREF
 #
+# Primary keys lead with recipe_id, so each bridge also has the reverse index
+# for going from e.g. an ingredient to its recipes.
+#
 
 class RecipeIngredientAmount(Base, PrettyModelMixin):
     __tablename__ = 'recipe_ingredient_amount'
+    __table_args__ = (Index('ix_recipe_ingredient_amount_ingredient_id', 'ingredient_id', 'recipe_id'),)
 
     recipe_id = Column(Integer, ForeignKey('recipe.id', **_fk_kw), primary_key=True)
     ingredient_id = Column(Integer, ForeignKey('ingredient.id', **_fk_kw), primary_key=True)
     measurement_id = Column(Integer, ForeignKey('measurement.id', **_fk_kw))
-    amount = Column(Numeric(10, 2, asdecimal=False))
+    amount = Column(Numeric(10, 2, asdecimal=False), comment='amount as a number, the highest amount of a range')
+    raw_amount = Column(String, comment='amount as written in the recipe, e.g. 1 1/2')
+    canonical_measurement_id = Column(Integer, ForeignKey('measurement.id', **_fk_kw))
+    canonical_amount = Column(Numeric(14, 4, asdecimal=False), comment='amount in the canonical measurement')
 
     ingredient = relationship('Ingredient', back_populates='recipes')
     recipe = relationship('Recipe', back_populates='ingredient_amounts')
-    measurement = relationship('Measurement', backref='recipe_ingredients')
+    measurement = relationship('Measurement', foreign_keys=[measurement_id], backref='recipe_ingredients')
+    canonical_measurement = relationship('Measurement', foreign_keys=[canonical_measurement_id])
 
 
 class RecipeAllergy(Base, PrettyModelMixin):
     __tablename__ = 'recipe_allergy'
+    __table_args__ = (Index('ix_recipe_allergy_allergy_id', 'allergy_id', 'recipe_id'),)
 
     recipe_id = Column(Integer, ForeignKey('recipe.id', **_fk_kw), primary_key=True)
     allergy_id = Column(Integer, ForeignKey('allergy.id', **_fk_kw), primary_key=True)
@@ -116,6 +130,7 @@ class RecipeAllergy(Base, PrettyModelMixin):
 
 class RecipeCuisine(Base, PrettyModelMixin):
     __tablename__ = 'recipe_cuisine'
+    __table_args__ = (Index('ix_recipe_cuisine_cuisine_id', 'cuisine_id', 'recipe_id'),)
 
     recipe_id = Column(Integer, ForeignKey('recipe.id', **_fk_kw), primary_key=True)
     cuisine_id = Column(Integer, ForeignKey('cuisine.id', **_fk_kw), primary_key=True)
@@ -123,6 +138,7 @@ class RecipeCuisine(Base, PrettyModelMixin):
 
 class RecipeTag(Base, PrettyModelMixin):
     __tablename__ = 'recipe_tag'
+    __table_args__ = (Index('ix_recipe_tag_tag_id', 'tag_id', 'recipe_id'),)
 
     recipe_id = Column(Integer, ForeignKey('recipe.id', **_fk_kw), primary_key=True)
     tag_id = Column(Integer, ForeignKey('tag.id', **_fk_kw), primary_key=True)
@@ -130,6 +146,37 @@ class RecipeTag(Base, PrettyModelMixin):
 
 class RecipeUtensil(Base, PrettyModelMixin):
     __tablename__ = 'recipe_utensil'
+    __table_args__ = (Index('ix_recipe_utensil_utensil_id', 'utensil_id', 'recipe_id'),)
 
     recipe_id = Column(Integer, ForeignKey('recipe.id', **_fk_kw), primary_key=True)
     utensil_id = Column(Integer, ForeignKey('utensil.id', **_fk_kw), primary_key=True)
+
+
+#
+# Crawl State
+#
+
+class CrawlPage(Base, PrettyModelMixin):
+    __tablename__ = 'crawl_page'
+    __table_args__ = (UniqueConstraint('source', 'slug'),)
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False)
+    slug = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending', comment='pending, parsed, stored or failed')
+    content_hash = Column(String, comment='sha256 of the page source')
+    title = Column(String, comment='title of the recipe parsed from this page')
+    last_fetched = Column(DateTime)
+    error = Column(String)
+
+    cuisines = relationship('Cuisine', secondary='crawl_page_cuisine')
+
+    def __repr__(self):
+        return f'<[dbo.{self.__tablename__} {self.status} {self.slug}]>'
+
+
+class CrawlPageCuisine(Base, PrettyModelMixin):
+    __tablename__ = 'crawl_page_cuisine'
+
+    crawl_page_id = Column(Integer, ForeignKey('crawl_page.id', **_fk_kw), primary_key=True)
+    cuisine_id = Column(Integer, ForeignKey('cuisine.id', **_fk_kw), primary_key=True)
@@ -0,0 +1,205 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Tuple
+import bisect
+import heapq
+
+import sqlalchemy as sa
+
+from scrapfishin import models
+
+
+# stay well under the bound parameter limit of older SQLite builds
+_CHUNK = 500
+
+
+class Cookable(NamedTuple):
+    recipe_id: int
+    title: str
+    have: int
+    need: int
+    missing: Tuple[str, ...]
+    substituted: Tuple[str, ...]
+
+    @property
+    def coverage(self) -> float:
+        return self.have / self.need if self.need else 1.0
+
+
+class PantryIndex:
+    """
+    In-memory inverted index of which recipes use which ingredients.
+
+    Each ingredient and allergen id maps to a sorted list of the recipes
+    which use it, and each recipe maps to its ingredients. Ranking
+    recipes by what's in the pantry then only walks the recipe lists of
+    the pantry's ingredients, instead of checking every recipe in SQL.
+
+    The index is loaded from the database once, and refreshed one batch
+    of recipes at a time as they're stored.
+    """
+    def __init__(self):
+        self.foods: Dict[str, int] = {}
+        self.allergens: Dict[str, int] = {}
+        self.titles: Dict[int, str] = {}
+        self._names: Dict[int, str] = {}
+        self._ingredients: Dict[int, List[int]] = {}
+        self._allergies: Dict[int, List[int]] = {}
+        self._by_ingredient: Dict[int, List[int]] = defaultdict(list)
+        self._by_allergy: Dict[int, List[int]] = defaultdict(list)
+
+    @classmethod
+    def load(cls, engine: sa.engine.Engine) -> 'PantryIndex':
+        """
+        Build the index from every recipe in the database.
+        """
+        index = cls()
+
+        with engine.connect() as conn:
+            index._load(conn, None)
+
+        return index
+
+    def refresh(self, engine: sa.engine.Engine, recipe_ids: Iterable[int]) -> None:
+        """
+        Reload recipes which were just stored, or stored again.
+        """
+        recipe_ids = sorted(set(recipe_ids))
+
+        for recipe_id in recipe_ids:
+            self._forget(recipe_id)
+
+        with engine.connect() as conn:
+            for i in range(0, len(recipe_ids), _CHUNK):
+                self._load(conn, recipe_ids[i:i + _CHUNK])
+
+    def _forget(self, recipe_id: int) -> None:
+        for ingredient_id in self._ingredients.pop(recipe_id, []):
+            _discard(self._by_ingredient[ingredient_id], recipe_id)
+
+        for allergy_id in self._allergies.pop(recipe_id, []):
+            _discard(self._by_allergy[allergy_id], recipe_id)
+
+        self.titles.pop(recipe_id, None)
+
+    def _load(self, conn: sa.engine.Connection, recipe_ids: List[int]=None) -> None:
+        recipe = models.Recipe.__table__
+        ingredient = models.Ingredient.__table__
+        allergy = models.Allergy.__table__
+        ria = models.RecipeIngredientAmount.__table__
+        ra = models.RecipeAllergy.__table__
+
+        def only(q, column):
+            return q if recipe_ids is None else q.where(column.in_(recipe_ids))
+
+        # only ingredients and allergens the new recipes use could be new
+        q = only(
+            sa.select([ingredient.c.id, ingredient.c.food])
+              .select_from(ingredient.join(ria, ria.c.ingredient_id == ingredient.c.id))
+              .distinct(),
+            ria.c.recipe_id
+        )
+        self._names.update(conn.execute(q).fetchall())
+        self.foods.update({food: id_ for id_, food in self._names.items()})
+
+        q = only(
+            sa.select([allergy.c.id, allergy.c.allergen])
+              .select_from(allergy.join(ra, ra.c.allergy_id == allergy.c.id))
+              .distinct(),
+            ra.c.recipe_id
+        )
+        self.allergens.update({allergen: id_ for id_, allergen in conn.execute(q)})
+
+        q = only(sa.select([recipe.c.id, recipe.c.title]), recipe.c.id)
+        self.titles.update(conn.execute(q).fetchall())
+
+        for forward, inverted, table, column in [
+            (self._ingredients, self._by_ingredient, ria, ria.c.ingredient_id),
+            (self._allergies, self._by_allergy, ra, ra.c.allergy_id)
+        ]:
+            # in recipe order, so that insort is an append
+            q = only(sa.select([table.c.recipe_id, column]), table.c.recipe_id).order_by(table.c.recipe_id)
+
+            for recipe_id, value_id in conn.execute(q):
+                forward.setdefault(recipe_id, []).append(value_id)
+                bisect.insort(inverted[value_id], recipe_id)
+
+    def cookable(
+        self,
+        pantry: Iterable[str],
+        *,
+        substitutions: Mapping[str, Iterable[str]]=None,
+        allergens: Iterable[str]=(),
+        n: int=10
+    ) -> List[Cookable]:
+        """
+        Rank recipes by how many of their ingredients are in the pantry.
+
+        Parameters
+        ----------
+        pantry : [str]
+            foods on hand, e.g. ["garlic", "onion"]
+
+        substitutions : {str: [str]}, default None
+            foods a recipe calls for -> foods which may stand in for
+            them, e.g. {"shallot": ["onion"]}
+
+        allergens : [str], default ()
+            leave out recipes with any of these allergens
+
+        n : int, default 10
+            number of recipes to return
+
+        Returns
+        -------
+        recipes : [Cookable]
+            the best covered recipes first, then those which need the
+            fewest ingredients
+        """
+        have = {self.foods[f] for f in {f.lower() for f in pantry} if f in self.foods}
+        stand_ins = {}
+
+        def on_hand(food: str) -> bool:
+            return self.foods.get(food.lower()) in have
+
+        for food, alternatives in (substitutions or {}).items():
+            food_id = self.foods.get(food.lower())
+
+            if food_id is not None and food_id not in have and any(map(on_hand, alternatives)):
+                stand_ins[food_id] = food.lower()
+
+        excluded = set()
+
+        for allergen in {a.lower() for a in allergens}:
+            excluded.update(self._by_allergy.get(self.allergens.get(allergen), ()))
+
+        counts = Counter()
+
+        for ingredient_id in have | set(stand_ins):
+            counts.update(self._by_ingredient.get(ingredient_id, ()))
+
+        ranked = heapq.nsmallest(
+            n,
+            (recipe_id for recipe_id in counts if recipe_id not in excluded),
+            key=lambda r: (-counts[r] / len(self._ingredients[r]), len(self._ingredients[r]), r)
+        )
+
+        return [self._cookable(recipe_id, counts[recipe_id], have, stand_ins) for recipe_id in ranked]
+
+    def _cookable(self, recipe_id: int, count: int, have: set, stand_ins: dict) -> Cookable:
+        ingredients = self._ingredients[recipe_id]
+
+        return Cookable(
+            recipe_id,
+            self.titles[recipe_id],
+            count,
+            len(ingredients),
+            tuple(sorted(self._names[i] for i in ingredients if i not in have and i not in stand_ins)),
+            tuple(sorted(stand_ins[i] for i in ingredients if i in stand_ins))
+        )
+
+
+def _discard(values: List[int], value: int) -> None:
+    i = bisect.bisect_left(values, value)
+
+    if i < len(values) and values[i] == value:
+        del values[i]
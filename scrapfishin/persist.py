@@ -0,0 +1,348 @@
+from collections import ChainMap
+from typing import Dict, Hashable, Iterable, List, Sequence
+import datetime as dt
+import logging
+
+from sqlalchemy.dialects import postgresql, sqlite
+import sqlalchemy as sa
+
+from scrapfishin import models, schema, search, units
+
+
+log = logging.getLogger(__name__)
+
+
+# values of a lookup table -> the column which holds them
+LOOKUPS = {
+    models.Allergy: 'allergen',
+    models.Cuisine: 'region',
+    models.Tag: 'descriptor',
+    models.Utensil: 'item',
+    models.Measurement: 'unit',
+    models.Ingredient: 'food'
+}
+
+# SQLAlchemy only learned INSERT .. ON CONFLICT for SQLite in 1.4
+_SQLITE_UPSERT = hasattr(sqlite, 'insert')
+
+# stay well under the bound parameter limit of older SQLite builds
+_CHUNK = 500
+
+
+def _chunks(values: Sequence, size: int=_CHUNK) -> Iterable[Sequence]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def upsert(
+    conn: sa.engine.Connection,
+    table: sa.Table,
+    rows: List[dict],
+    *,
+    keys: Sequence[str],
+    update: Sequence[str]=()
+) -> None:
+    """
+    Insert many rows, skipping or updating those which already exist.
+
+    Uses the dialect's native INSERT .. ON CONFLICT where available, so
+    that each batch is a single executemany.
+
+    Parameters
+    ----------
+    conn : sqlalchemy.engine.Connection
+        connection to write through
+
+    table : sqlalchemy.Table
+        table to write to
+
+    rows : [dict]
+        column -> value for each row
+
+    keys : [str]
+        columns of the unique constraint which identifies a row
+
+    update : [str], default ()
+        columns to overwrite when a row already exists, if empty then
+        existing rows are left untouched
+    """
+    if not rows:
+        return
+
+    dialect = conn.dialect.name
+
+    if dialect == 'postgresql' or (dialect == 'sqlite' and _SQLITE_UPSERT):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+
+        if update:
+            stmt = insert.on_conflict_do_update(
+                index_elements=keys,
+                set_={c: insert.excluded[c] for c in update}
+            )
+        else:
+            stmt = insert.on_conflict_do_nothing(index_elements=keys)
+
+        conn.execute(stmt, rows)
+        return
+
+    if dialect == 'sqlite':
+        conn.execute(table.insert().prefix_with('OR IGNORE'), rows)
+    else:
+        existing = set()
+
+        for chunk in _chunks(rows):
+            key_values = [tuple(r[k] for k in keys) for r in chunk]
+            q = sa.select([table.c[k] for k in keys])\
+                  .where(sa.tuple_(*[table.c[k] for k in keys]).in_(key_values))
+            existing.update(tuple(r) for r in conn.execute(q))
+
+        missing = [r for r in rows if tuple(r[k] for k in keys) not in existing]
+
+        if missing:
+            conn.execute(table.insert(), missing)
+
+    if update:
+        stmt = table.update()\
+                    .where(sa.and_(*[table.c[k] == sa.bindparam(f'key_{k}') for k in keys]))\
+                    .values({c: sa.bindparam(f'new_{c}') for c in update})
+        conn.execute(stmt, [
+            {
+                **{f'key_{k}': r[k] for k in keys},
+                **{f'new_{c}': r[c] for c in update}
+            }
+            for r in rows
+        ])
+
+
+class RecipeWriter:
+    """
+    Bulk persistence of Recipe schema objects to the database.
+
+    A batch of recipes is written with a handful of statements per
+    table, rather than a few round trips per row. Lookup tables (e.g.
+    Ingredient, Tag, Measurement) are resolved through an in-memory
+    identity map which lives as long as the writer, so a value like
+    "teaspoon" is only ever looked up in the database once.
+
+    Recipes are keyed on their title. Writing a recipe which already
+    exists updates its columns and replaces its bridge table rows.
+
+    Attributes
+    ----------
+    engine : sqlalchemy.engine.Engine
+        database to write to
+    """
+    def __init__(self, engine: sa.engine.Engine):
+        self.engine = engine
+        self._ids: Dict[str, Dict[Hashable, int]] = {}
+
+    def write(self, recipes: Iterable[schema.Recipe]) -> Dict[str, int]:
+        """
+        Store recipes, their parent recipes, and everything they refer to.
+
+        Parameters
+        ----------
+        recipes : [schema.Recipe]
+            recipes to store
+
+        Returns
+        -------
+        recipe_ids : dict
+            title -> id of each recipe written
+        """
+        recipes = {r.title: r for r in recipes}
+
+        if not recipes:
+            return {}
+
+        # parents, and their parents, must exist before the ingredients which
+        # point at them. they only need to be written once per writer, not
+        # each time they're used
+        parents = {}
+        unvisited = list(recipes.values())
+
+        while unvisited:
+            for ia in unvisited.pop().ingredient_amounts:
+                parent = ia.ingredient.parent_recipe
+
+                if (
+                    parent is not None
+                    and parent.title not in recipes
+                    and parent.title not in parents
+                    and parent.title not in self._ids.get('recipe', {})
+                ):
+                    parents[parent.title] = parent
+                    unvisited.append(parent)
+
+        # ids are only remembered once the transaction has committed
+        names = ['recipe', *(model.__tablename__ for model in LOOKUPS)]
+        staged = {name: ChainMap({}, self._ids.setdefault(name, {})) for name in names}
+
+        with self.engine.begin() as conn:
+            if parents:
+                self._write(conn, list(parents.values()), staged)
+
+            self._write(conn, list(recipes.values()), staged)
+
+        for name, ids in staged.items():
+            self._ids[name].update(ids.maps[0])
+
+        log.info(f'stored {len(recipes)} recipes and {len(parents)} parent recipes')
+        return {title: staged['recipe'][title] for title in recipes}
+
+    def _resolve(
+        self,
+        conn: sa.engine.Connection,
+        model: models.Base,
+        values: Iterable[Hashable],
+        staged: Dict[str, ChainMap]
+    ) -> ChainMap:
+        table = model.__table__
+        column = LOOKUPS[model]
+        known = staged[table.name]
+        missing = list({v for v in values if v not in known})
+
+        if missing:
+            upsert(conn, table, [{column: v} for v in missing], keys=[column])
+
+            for chunk in _chunks(missing):
+                q = sa.select([table.c.id, table.c[column]]).where(table.c[column].in_(chunk))
+                known.update({value: id_ for id_, value in conn.execute(q)})
+
+        return known
+
+    def _write(
+        self,
+        conn: sa.engine.Connection,
+        recipes: List[schema.Recipe],
+        staged: Dict[str, ChainMap]
+    ) -> None:
+        recipe_table = models.Recipe.__table__
+        columns = ['prep_time', 'difficulty', 'source', 'glamor_shot_url', 'instructions_url', 'updated_at']
+        now = dt.datetime.utcnow()
+
+        upsert(
+            conn,
+            recipe_table,
+            [
+                {
+                    'title': r.title,
+                    'prep_time': r.prep_time,
+                    'difficulty': r.difficulty,
+                    'source': r.source,
+                    'glamor_shot_url': None if r.glamor_shot_url is None else str(r.glamor_shot_url),
+                    'instructions_url': None if r.instructions_url is None else str(r.instructions_url),
+                    'updated_at': now
+                }
+                for r in recipes
+            ],
+            keys=['title'],
+            update=columns
+        )
+
+        recipe_ids = staged['recipe']
+        titles = [r.title for r in recipes]
+
+        for chunk in _chunks(titles):
+            q = sa.select([recipe_table.c.id, recipe_table.c.title]).where(recipe_table.c.title.in_(chunk))
+            recipe_ids.update({title: id_ for id_, title in conn.execute(q)})
+
+        # ingredients which are themselves recipes point at their parent
+        ingredient_table = models.Ingredient.__table__
+        amounts = [ia for r in recipes for ia in r.ingredient_amounts]
+        foods = {ia.ingredient.food for ia in amounts}
+        linked = {
+            ia.ingredient.food: recipe_ids[ia.ingredient.parent_recipe.title]
+            for ia in amounts
+            if ia.ingredient.parent_recipe is not None
+        }
+
+        ingredients = self._resolve(conn, models.Ingredient, foods, staged)
+        upsert(
+            conn,
+            ingredient_table,
+            [{'food': food, 'parent_recipe_id': parent_id} for food, parent_id in linked.items()],
+            keys=['food'],
+            update=['parent_recipe_id']
+        )
+
+        lookups = {
+            'allergy': self._resolve(conn, models.Allergy, {a.allergen for r in recipes for a in r.allergies}, staged),
+            'cuisine': self._resolve(conn, models.Cuisine, {c.region for r in recipes for c in r.cuisines}, staged),
+            'tag': self._resolve(conn, models.Tag, {t.descriptor for r in recipes for t in r.tags}, staged),
+            'utensil': self._resolve(conn, models.Utensil, {u.item for r in recipes for u in r.utensils}, staged)
+        }
+        normalized = {(ia.amount, ia.measurement.unit): _normalize(ia.amount, ia.measurement.unit) for ia in amounts}
+        measurements = self._resolve(
+            conn,
+            models.Measurement,
+            {ia.measurement.unit for ia in amounts} | {n.canonical_unit for n in normalized.values()},
+            staged
+        )
+
+        # rewritten recipes get a fresh set of bridge rows
+        ids = [recipe_ids[title] for title in titles]
+        bridges = [
+            (models.RecipeAllergy, 'allergy_id', 'allergy', lambda r: [a.allergen for a in r.allergies]),
+            (models.RecipeCuisine, 'cuisine_id', 'cuisine', lambda r: [c.region for c in r.cuisines]),
+            (models.RecipeTag, 'tag_id', 'tag', lambda r: [t.descriptor for t in r.tags]),
+            (models.RecipeUtensil, 'utensil_id', 'utensil', lambda r: [u.item for u in r.utensils])
+        ]
+
+        for model in [models.RecipeIngredientAmount, *[b[0] for b in bridges]]:
+            table = model.__table__
+
+            for chunk in _chunks(ids):
+                conn.execute(table.delete().where(table.c.recipe_id.in_(chunk)))
+
+        for model, fk, lookup, values in bridges:
+            rows = {
+                (recipe_ids[r.title], lookups[lookup][value])
+                for r in recipes
+                for value in values(r)
+            }
+
+            if rows:
+                conn.execute(
+                    model.__table__.insert(),
+                    [{'recipe_id': recipe_id, fk: value_id} for recipe_id, value_id in rows]
+                )
+
+        rows = {}
+
+        for r in recipes:
+            for ia in r.ingredient_amounts:
+                key = (recipe_ids[r.title], ingredients[ia.ingredient.food])
+                n = normalized[(ia.amount, ia.measurement.unit)]
+                row = {
+                    'recipe_id': key[0],
+                    'ingredient_id': key[1],
+                    'measurement_id': measurements[ia.measurement.unit],
+                    'amount': n.amount,
+                    'raw_amount': ia.amount,
+                    'canonical_measurement_id': measurements[n.canonical_unit],
+                    'canonical_amount': n.canonical_amount
+                }
+
+                if key not in rows:
+                    rows[key] = row
+                elif rows[key]['measurement_id'] == row['measurement_id'] and None not in (rows[key]['amount'], row['amount']):
+                    rows[key]['amount'] += row['amount']
+                    rows[key]['canonical_amount'] += row['canonical_amount']
+                    rows[key]['raw_amount'] += f' + {row["raw_amount"]}'
+                else:
+                    log.warning(f'"{r.title}" lists {ia.ingredient.food} twice in different units, keeping the first')
+
+        if rows:
+            conn.execute(models.RecipeIngredientAmount.__table__.insert(), list(rows.values()))
+
+        search.index(conn, ids)
+
+
+def _normalize(amount: str, unit: str) -> units.Normalized:
+    normalized = units.normalize(amount, unit)
+
+    if normalized.amount is None:
+        log.warning(f'"{amount}" is not a number, storing no amount')
+
+    return normalized
@@ -0,0 +1,313 @@
+"""
+Weekly menus which share as many ingredients as they can.
+
+A menu costs one for every line on its grocery list, plus whatever is
+left over of ingredients which are bought whole (e.g. half an onion, or
+a third of a can of tomatoes). Candidate recipes are rows of two
+matrices..
+
+    incidence   recipes x ingredients, 1 where a recipe uses an ingredient
+
+    counted     recipes x countable ingredients, the amount a recipe uses
+                of an ingredient bought by the unit, can, box, bunch or
+                sprig
+
+both sparse, so that the cost of adding, or swapping in, every candidate
+at once is a couple of operations over their nonzero entries. Menus are
+grown greedily from a few random first recipes, then improved by
+swapping recipes in and out for as long as that makes them cheaper.
+"""
+from typing import List, NamedTuple
+import random
+
+from scipy import sparse
+import sqlalchemy as sa
+import numpy as np
+
+from scrapfishin.queries import filter_recipes
+from scrapfishin import models
+
+
+# ingredients bought in these units are bought whole
+COUNTABLE = {
+    spelling
+    for unit in ['unit', 'can', 'box', 'bunch', 'sprig']
+    for spelling in [unit, f'{unit}s', f'{unit}es']
+}
+
+
+class Menu(NamedTuple):
+    recipe_ids: List[int]
+    ingredients: int
+    leftover: float
+    prep_time: int
+
+
+class Candidates:
+    """
+    Recipes which may go on a menu, as incidence and amount matrices.
+    """
+    def __init__(
+        self,
+        recipe_ids: np.ndarray,
+        prep_times: np.ndarray,
+        incidence: sparse.csr_matrix,
+        counted: sparse.csr_matrix
+    ):
+        self.recipe_ids = recipe_ids
+        self.prep_times = prep_times
+        self.incidence = incidence
+        self.counted = counted
+        # the candidate each amount in counted belongs to
+        self._counted_rows = np.repeat(np.arange(len(recipe_ids)), np.diff(counted.indptr))
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    @classmethod
+    def load(cls, s: sa.orm.Session, **filters) -> 'Candidates':
+        """
+        Load every recipe matching the filters of queries.filter_recipes.
+        """
+        q = filter_recipes(s.query(models.Recipe.id, models.Recipe.prep_time), **filters)
+        recipes = q.order_by(models.Recipe.id).all()
+        recipe_ids = np.array([id_ for id_, _ in recipes], dtype=np.int64)
+        prep_times = np.array([prep_time or 0 for _, prep_time in recipes], dtype=np.int64)
+
+        ria = models.RecipeIngredientAmount.__table__
+        measurement = models.Measurement.__table__
+        rows = s.execute(
+            sa.select([ria.c.recipe_id, ria.c.ingredient_id, measurement.c.unit, ria.c.amount])
+              .select_from(ria.outerjoin(measurement, measurement.c.id == ria.c.measurement_id))
+              .where(ria.c.recipe_id.in_(q.with_entities(models.Recipe.id).subquery()))
+        ).fetchall()
+
+        positions = np.searchsorted(recipe_ids, np.array([r[0] for r in rows], dtype=np.int64))
+        ingredients, countable = {}, {}
+        columns, counted = [], []
+
+        for position, (_, ingredient_id, unit, amount) in zip(positions.tolist(), rows):
+            columns.append(ingredients.setdefault(ingredient_id, len(ingredients)))
+            unit = (unit or '').lower()
+
+            if unit in COUNTABLE and amount:
+                counted.append((position, countable.setdefault((ingredient_id, unit), len(countable)), amount))
+
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (positions, columns)),
+            shape=(len(recipe_ids), len(ingredients))
+        )
+        # a recipe may list an ingredient more than once, it's still one line
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+
+        counted = sparse.csr_matrix(
+            (
+                np.array([amount for *_, amount in counted], dtype=np.float64),
+                ([position for position, *_ in counted], [column for _, column, _ in counted])
+            ),
+            shape=(len(recipe_ids), len(countable))
+        )
+        counted.sum_duplicates()
+
+        return cls(recipe_ids, prep_times, incidence, counted)
+
+
+def _waste(totals: np.ndarray) -> np.ndarray:
+    # what's left of the last of each whole thing bought
+    return (np.ceil(totals - 1e-9) - totals).clip(min=0)
+
+
+class _State:
+    """
+    Running totals of a menu, and the cost of adding any candidate to it.
+    """
+    def __init__(self, candidates: Candidates):
+        self.candidates = candidates
+        self.uses = np.zeros(candidates.incidence.shape[1], dtype=np.int64)
+        self.totals = np.zeros(candidates.counted.shape[1], dtype=np.float64)
+
+    def add(self, i: int, sign: int=1) -> None:
+        row = self.candidates.incidence[i]
+        self.uses[row.indices] += sign
+        row = self.candidates.counted[i]
+        self.totals[row.indices] += sign * row.data
+
+    @property
+    def leftover(self) -> float:
+        return float(_waste(self.totals).sum())
+
+    def cost(self, leftover_weight: float) -> float:
+        return float((self.uses > 0).sum()) + leftover_weight * self.leftover
+
+    def costs(self, leftover_weight: float) -> np.ndarray:
+        # cost of the menu with each candidate added to it, only what each
+        # candidate uses can change
+        counted = self.candidates.counted
+        new = self.candidates.incidence @ (self.uses == 0).astype(np.float32)
+        before = self.totals[counted.indices]
+        change = np.bincount(
+            self.candidates._counted_rows,
+            weights=_waste(before + counted.data) - _waste(before),
+            minlength=len(self.candidates)
+        )
+        return self.cost(leftover_weight) + new + leftover_weight * change
+
+
+def plan(
+    candidates: Candidates,
+    n: int,
+    *,
+    prep_time_budget: int=None,
+    leftover_weight: float=1.0,
+    starts: int=8,
+    rng: random.Random=None
+) -> Menu:
+    """
+    Pick `n` recipes which make for the shortest grocery list.
+
+    Parameters
+    ----------
+    candidates : Candidates
+        recipes to choose from
+
+    n : int
+        number of recipes on the menu
+
+    prep_time_budget : int, default None
+        most minutes all recipes on the menu may take together
+
+    leftover_weight : float, default 1.0
+        cost of a whole leftover can, bunch, etc. next to that of one more
+        line on the grocery list
+
+    starts : int, default 8
+        number of random first recipes to grow menus from, the cheapest
+        menu wins
+
+    rng : random.Random, default None
+        picks the first recipes, for reproducible menus
+
+    Returns
+    -------
+    menu : Menu
+        fewer than `n` recipes if not enough fit the budget
+    """
+    rng = rng or random.Random()
+    budget = np.inf if prep_time_budget is None else prep_time_budget
+    fits = np.flatnonzero(candidates.prep_times <= budget)
+
+    if not len(fits) or n <= 0:
+        return Menu([], 0, 0.0, 0)
+
+    best = None
+
+    for first in rng.sample(fits.tolist(), min(starts, len(fits))):
+        chosen = _grow(candidates, first, n, budget, leftover_weight)
+        chosen = _improve(candidates, chosen, budget, leftover_weight)
+        state = _State(candidates)
+
+        for i in chosen:
+            state.add(i)
+
+        cost = state.cost(leftover_weight)
+
+        if best is None or (len(chosen), -cost) > (len(best[0]), -best[1]):
+            best = (chosen, cost, state)
+
+    chosen, _, state = best
+    return Menu(
+        [int(candidates.recipe_ids[i]) for i in chosen],
+        int((state.uses > 0).sum()),
+        state.leftover,
+        int(candidates.prep_times[chosen].sum())
+    )
+
+
+def _grow(candidates: Candidates, first: int, n: int, budget: float, leftover_weight: float) -> List[int]:
+    state = _State(candidates)
+    chosen = [first]
+    state.add(first)
+    spent = candidates.prep_times[first]
+
+    while len(chosen) < n:
+        costs = state.costs(leftover_weight)
+        costs[chosen] = np.inf
+        costs[candidates.prep_times > budget - spent] = np.inf
+        i = int(np.argmin(costs))
+
+        if not np.isfinite(costs[i]):
+            break
+
+        chosen.append(i)
+        state.add(i)
+        spent += candidates.prep_times[i]
+
+    return chosen
+
+
+def _improve(candidates: Candidates, chosen: List[int], budget: float, leftover_weight: float, rounds: int=10) -> List[int]:
+    chosen = list(chosen)
+    state = _State(candidates)
+
+    for i in chosen:
+        state.add(i)
+
+    for _ in range(rounds):
+        improved = False
+
+        for slot, out in enumerate(chosen):
+            current = state.cost(leftover_weight)
+            state.add(out, -1)
+            spent = candidates.prep_times[chosen].sum() - candidates.prep_times[out]
+            costs = state.costs(leftover_weight)
+            costs[chosen] = np.inf
+            costs[candidates.prep_times > budget - spent] = np.inf
+            i = int(np.argmin(costs))
+
+            if costs[i] < current - 1e-9:
+                chosen[slot] = i
+                state.add(i)
+                improved = True
+            else:
+                state.add(out)
+
+        if not improved:
+            break
+
+    return chosen
+
+
+def plan_menu(
+    s: sa.orm.Session,
+    n: int=7,
+    *,
+    prep_time_budget: int=None,
+    leftover_weight: float=1.0,
+    rng: random.Random=None,
+    **filters
+) -> Menu:
+    """
+    Plan a menu of `n` recipes out of those matching filters.
+
+    Parameters
+    ----------
+    s : sqlalchemy.orm.Session
+        database session to query through
+
+    n : int, default 7
+        number of recipes on the menu
+
+    prep_time_budget, leftover_weight, rng
+        see plan
+
+    **filters
+        see queries.filter_recipes, e.g. cuisine, allergens and
+        max_prep_time
+
+    Returns
+    -------
+    menu : Menu
+    """
+    candidates = Candidates.load(s, **filters)
+    return plan(candidates, n, prep_time_budget=prep_time_budget, leftover_weight=leftover_weight, rng=rng)
@@ -1,13 +1,114 @@
-from typing import Iterable
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+import random
 
 import sqlalchemy as sa
 
-from scrapfishin.models import Recipe
+from scrapfishin.models import (
+    Allergy, Cuisine, Ingredient, Measurement, Recipe, RecipeAllergy, RecipeCuisine, RecipeIngredientAmount
+)
+
+
+class GroceryItem(NamedTuple):
+    ingredient_id: int
+    food: str
+    measurement_id: int
+    unit: str
+    amount: Optional[float]
+    recipes: int
+
+
+def grocery_items(
+    s: sa.orm.Session,
+    recipe_ids: Iterable[int],
+    *,
+    canonical: bool=False
+) -> List[GroceryItem]:
+    """
+    Total up the ingredients of many recipes, in a single query.
+
+    Amounts are summed per ingredient and unit of measurement, so two
+    different units of the same ingredient (e.g. "clove" and "teaspoon"
+    of garlic) are two separate items. A recipe id which is listed more
+    than once (e.g. the same dinner twice in a week) is counted as many
+    times as it's listed.
+
+    Parameters
+    ----------
+    s : sqlalchemy.orm.Session
+        database session to query through
+
+    recipe_ids : [int]
+        recipes to shop for
+
+    canonical : bool, default False
+        sum amounts in their canonical unit (see scrapfishin.units), so
+        that e.g. a tablespoon and a teaspoon of cumin are 4 teaspoons
+
+    Returns
+    -------
+    items : [GroceryItem]
+        ingredient totals, sorted by food and then unit
+    """
+    servings = Counter(recipe_ids)
+
+    if not servings:
+        return []
+
+    ria = RecipeIngredientAmount.__table__
+
+    if canonical:
+        amount, measurement_id = ria.c.canonical_amount, ria.c.canonical_measurement_id
+    else:
+        amount, measurement_id = ria.c.amount, ria.c.measurement_id
+
+    if any(n > 1 for n in servings.values()):
+        amount = amount * sa.case(servings, value=ria.c.recipe_id, else_=1)
+
+    q = s.query(
+              Ingredient.id,
+              Ingredient.food,
+              Measurement.id,
+              Measurement.unit,
+              sa.func.sum(amount),
+              sa.func.count(ria.c.recipe_id)
+          )\
+         .select_from(ria)\
+         .join(Ingredient, Ingredient.id == ria.c.ingredient_id)\
+         .join(Measurement, Measurement.id == measurement_id)\
+         .filter(ria.c.recipe_id.in_(list(servings)))\
+         .group_by(Ingredient.id, Ingredient.food, Measurement.id, Measurement.unit)\
+         .order_by(Ingredient.food, Measurement.unit)
+
+    # SQLite sums whole numbers into an integer
+    return [
+        GroceryItem(ingredient_id, food, measurement_id, unit, None if total is None else float(total), n)
+        for ingredient_id, food, measurement_id, unit, total, n in q
+    ]
+
+
+def format_grocery_list(items: Iterable[GroceryItem]) -> str:
+    """
+    Format grocery items as a page, one "<amount> <unit> of <food>" per line.
+
+    Amounts are right-aligned, and an item with no known amount is shown
+    without one.
+    """
+    items = list(items)
+    amounts = ['' if i.amount is None else f'{round(i.amount, 2)}' for i in items]
+    width = max(map(len, amounts), default=0)
+
+    return '\n'.join(
+        f'{amount:>{width}} {item.unit} of {item.food}'
+        for amount, item in zip(amounts, items)
+    )
 
 
 def grocery_list(
     s: sa.orm.Session,
-    recipes: Iterable[Recipe]
+    recipes: Iterable[Recipe],
+    *,
+    canonical: bool=False
 ) -> str:
     """
     Format an iterable of Recipes into a Grocery List.
@@ -20,32 +121,184 @@ def grocery_list(
     recipes : [Recipe]
         list of recipes to shop for
 
+    canonical : bool, default False
+        total amounts in their canonical unit
+
     Returns
     -------
     grocery_page : str
         page of sorted ingredients
     """
-    seen = []
+    return format_grocery_list(grocery_items(s, [r.id for r in recipes], canonical=canonical))
+
+
+def filter_recipes(
+    q: sa.orm.Query,
+    *,
+    title: str=None,
+    cuisine: str=None,
+    ingredients: Iterable[str]=(),
+    source: str=None,
+    allergens: Iterable[str]=(),
+    max_prep_time: int=None
+) -> sa.orm.Query:
+    """
+    Narrow a query of Recipes down to those matching every filter given.
+
+    Cuisine, ingredients and allergens are tested with EXISTS against
+    their bridge tables, one probe of the bridge table's primary key per recipe
+    considered, so candidates are never gathered up front.
 
-    for r in recipes:
-        for i in r.ingredient_amounts:
-            unit = f'{i.measurement.unit} of {i.ingredient.food}'
-            amount = i.amount
+    Parameters
+    ----------
+    q : sqlalchemy.orm.Query
+        query which selects from Recipe
+
+    title : str, default None
+        exact title of the recipe
 
-            try:
-                existing = next(s for s in seen if unit in s)
-            except StopIteration:
-                pass
-            else:
-                amount += float(existing.split(' ')[0])
-                seen.remove(existing)
+    cuisine : str, default None
+        recipes must be of this cuisine, e.g. "italian"
 
-            seen.append(f'{amount} {unit}')
+    ingredients : [str], default ()
+        recipes must include all of these foods, e.g. ["garlic", "onion"]
 
-    return '\n'.join(sorted(seen, key=lambda i: i.split(' of ')[-1]))
+    source : str, default None
+        recipes must come from this source, e.g. "Hello Fresh"
 
+    allergens : [str], default ()
+        recipes must have none of these allergens, e.g. ["soy"]
 
-def random_recipe(s: sa.orm.Session, *, n: int=1) -> Iterable(Recipe):
+    max_prep_time : int, default None
+        recipes must take at most this many minutes
+
+    Returns
+    -------
+    q : sqlalchemy.orm.Query
+    """
+    if title is not None:
+        q = q.filter(Recipe.title == title)
+
+    if source is not None:
+        q = q.filter(Recipe.source == source)
+
+    if cuisine is not None:
+        rc = RecipeCuisine.__table__
+        q = q.filter(
+            sa.exists()
+              .where(rc.c.recipe_id == Recipe.id)
+              .where(rc.c.cuisine_id == Cuisine.id)
+              .where(Cuisine.region == cuisine.lower())
+        )
+
+    if max_prep_time is not None:
+        q = q.filter(Recipe.prep_time <= max_prep_time)
+
+    allergens = {a.lower() for a in allergens}
+
+    if allergens:
+        ra = RecipeAllergy.__table__
+        q = q.filter(
+            ~sa.exists()
+               .where(ra.c.recipe_id == Recipe.id)
+               .where(ra.c.allergy_id == Allergy.id)
+               .where(Allergy.allergen.in_(allergens))
+        )
+
+    ria = RecipeIngredientAmount.__table__
+
+    for food in {f.lower() for f in ingredients}:
+        q = q.filter(
+            sa.exists()
+              .where(ria.c.recipe_id == Recipe.id)
+              .where(ria.c.ingredient_id == Ingredient.id)
+              .where(Ingredient.food == food)
+        )
+
+    return q
+
+
+def sample_recipes(
+    s: sa.orm.Session,
+    *,
+    n: int=1,
+    rng: random.Random=None,
+    query: sa.orm.Query=None,
+    **filters
+) -> List[Recipe]:
+    """
+    Get up to `n` random recipes, optionally matching filters.
+
+    Every recipe holds a random position in [0, 1) in the indexed
+    `shuffle` column. A sample is the `n` recipes at or after a random
+    pivot, wrapping around to the start if need be. That's a walk of the
+    shuffle index from the pivot, and one from the start, each of which
+    stops as soon as `n` recipes have matched the filters, rather than a
+    sort of the whole table. Both walks are subqueries of the one query
+    which loads the recipes.
+
+    A sample is a run of neighbours in the shuffled order, run reshuffle
+    now and then to change who the neighbours are.
+
+    Parameters
+    ----------
+    s : sqlalchemy.orm.Session
+        database session to bind objects
+
+    n : int, default 1
+        number of recipes to return
+
+    rng : random.Random, default None
+        picks the pivot, for reproducible samples
+
+    query : sqlalchemy.orm.Query, default None
+        query of Recipes to sample from, e.g. to eager load relationships
+
+    **filters
+        see filter_recipes
+
+    Returns
+    -------
+    recipes : [Recipe]
+        fewer than `n` if not enough recipes match
+    """
+    pivot = (rng or random).random()
+    candidates = filter_recipes(s.query(Recipe.id, Recipe.shuffle), **filters)
+    after = candidates.filter(Recipe.shuffle >= pivot).order_by(Recipe.shuffle).limit(n).subquery()
+    before = candidates.filter(Recipe.shuffle < pivot).order_by(Recipe.shuffle).limit(n).subquery()
+    sample = sa.union_all(sa.select([after]), sa.select([before])).alias('sample')
+
+    q = (s.query(Recipe) if query is None else query)\
+         .join(sample, Recipe.id == sample.c.id)\
+         .order_by(sa.case([(sample.c.shuffle < pivot, 1)], else_=0), sample.c.shuffle)\
+         .limit(n)
+
+    return q.all()
+
+
+def random_position(dialect: sa.engine.Dialect) -> sa.sql.ColumnElement:
+    """
+    SQL for a random number in [0, 1), like a Recipe's shuffle.
+    """
+    if dialect.name == 'sqlite':
+        # SQLite's random() is a signed 64-bit integer
+        return sa.func.random() / 18446744073709551616.0 + 0.5
+
+    return sa.func.random()
+
+
+def reshuffle(s: sa.orm.Session) -> None:
+    """
+    Give every recipe a new random position to be sampled from.
+
+    Committing is up to the caller.
+    """
+    s.execute(Recipe.__table__.update().values(shuffle=random_position(s.get_bind().dialect)))
+    # recipes already loaded would still hold their old position
+    s.expire_all()
+
+
+def random_recipe(s: sa.orm.Session, *, n: int=1) -> Iterator[Recipe]:
     """
     Get `n` random recipes.
 
@@ -57,8 +310,13 @@ def random_recipe(s: sa.orm.Session, *, n: int=1) -> Iterable(Recipe):
     n : int = [default: 1]
         number of recipes to return
     """
-    q = s.query(Recipe)\
-         .order_by(sa.func.random())\
-         .limit(n)
+    return iter(sample_recipes(s, n=n))
+
 
-    return iter(q.all())
+def fingerprint(conn: sa.engine.Connectable) -> str:
+    """
+    Cheaply tell whether any recipe was stored, rewritten or deleted.
+    """
+    recipe = Recipe.__table__
+    q = sa.select([sa.func.count(recipe.c.id), sa.func.max(recipe.c.id), sa.func.max(recipe.c.updated_at)])
+    return '|'.join(map(str, conn.execute(q).fetchone()))
@@ -65,29 +65,16 @@ class Measurement(Base):
 class IngredientAmount(Base):
     ingredient: Ingredient
     measurement: Measurement
-    amount: str  # but really, this is a float
+    amount: str  # as written, see scrapfishin.units for the number
 
     @validator('amount', pre=True)
-    def unicode_replace(cls, v) -> str:
+    def collapse_whitespace(cls, v) -> str:
         """
-        Replaces unicode reprs with their float amount.
-
-            ¼ = 0.25
-            ⅓ = 0.33
-            ½ = 0.50
-            ¾ = 0.75
+        Amounts are kept as written (e.g. "1½", "1 1/2", "1-2"), which
+        float() won't always read, see scrapfishin.units.parse_quantity.
+        A range is stored as its highest amount.
         """
-        mapping = {
-            '\u00bc': '.25',
-            '\u2153': '.33',
-            '\u00bd': '.50',
-            '\u00be': '.75'
-        }
-
-        for unicode_, fraction in mapping.items():
-            v = v.replace(unicode_, fraction)
-
-        return v
+        return ' '.join(str(v).split())
 
 
 class Recipe(Base):
@@ -1,10 +1,36 @@
-from typing import List
+from typing import Iterable, Iterator, List, Mapping, Optional, Union
 import tempfile
+import hashlib
 import pathlib
 
-from scrapfishin.database import Database, Base
-from scrapfishin.schema import Recipe, Ingredient
-from scrapfishin import hello_fresh
+from sqlalchemy.orm import joinedload, selectinload
+
+from scrapfishin.database import Database
+from scrapfishin.frontier import Frontier
+from scrapfishin.graph import IngredientGraph, Line, collect
+from scrapfishin.migrations import migrate
+from scrapfishin.pantry import Cookable, PantryIndex
+from scrapfishin.persist import RecipeWriter
+from scrapfishin.schema import Recipe
+from scrapfishin import hello_fresh, models, queries, search
+
+
+SITES = {
+    'hello fresh': hello_fresh,
+    # 'blue apron': blue_apron,
+    # 'home chef': home_chef
+}
+
+# everything collect and grocery_list touch, loaded along with the recipes ..
+# cuisines are joined into the query of the recipes themselves, a recipe has
+# one or two of them. the rest is one query each for all recipes at once,
+# ingredient amounts bring their ingredient and measurement along
+_PREPARED = [
+    joinedload(models.Recipe.cuisines),
+    selectinload(models.Recipe.ingredient_amounts).joinedload(models.RecipeIngredientAmount.ingredient),
+    selectinload(models.Recipe.ingredient_amounts).joinedload(models.RecipeIngredientAmount.measurement),
+    selectinload(models.Recipe.tags)
+]
 
 
 class Scrap:
@@ -26,54 +52,385 @@ class Scrap:
             conn_str = f'sqlite:///{temp_dir}/scrapfishin.db'
 
         self.db = Database(conn_str)
-        Base.metadata.create_all(self.db.engine)
+        self.writer = RecipeWriter(self.db.engine)
+        self._pantry = None
+        self._similarity = None
+        self._graph = None
+        migrate(self.db.engine)
 
-    def fish(self, site: str, *, persist: bool=True) -> List[Recipe]:
+    def fish(
+        self,
+        site: str,
+        *,
+        persist: bool=True,
+        stream: bool=False,
+        **options
+    ) -> Union[List[Recipe], Iterator[Recipe]]:
         """
-        TODO
+        Scrape all recipes from a supported site.
+
+        Parameters
+        ----------
+        site : str
+            name of the website to scrape, e.g. "Hello Fresh"
+
+        persist : bool, default True
+            whether or not to store the recipes in the database, when
+            storing, the crawl is incremental: its progress is kept in
+            the database, and recipes which were already stored and
+            haven't changed are not scraped again
+
+        stream : bool, default False
+            whether to return an iterator which yields each recipe (and
+            stores it, if persisting) as soon as it's scraped, rather
+            than a list once the whole site is done
+
+        **options
+            passed to the site's scraper, e.g. `scrapers` for the number
+            of concurrent workers, or `rate` to pace the crawl at a fixed
+            number of requests per second with the asyncio engine
+
+        Returns
+        -------
+        recipes : List[Recipe] or Iterator[Recipe]
         """
-        supported = {
-            'hello fresh': hello_fresh,
-            # 'blue apron': blue_apron,
-            # 'home chef': home_chef
-        }
+        lib = _site(site)
 
-        try:
-            lib = supported[site.lower()]
-        except KeyError:
-            raise ValueError(f'"{site}" is not a supported')
+        frontier = None
+
+        if persist:
+            frontier = options.setdefault('frontier', Frontier(self.db, lib.SOURCE))
+
+        if stream:
+            return self._fish_stream(lib.stream(**options), frontier=frontier, persist=persist)
 
-        recipes = lib.scrape()
+        recipes = lib.scrape(**options)
 
         if persist:
-            raise NotImplementedError('TODO: persist relational structure to database')
+            self._persist(recipes, frontier=frontier)
+
+        return recipes
+
+    def _fish_stream(
+        self,
+        recipes: Iterator[Recipe],
+        *,
+        frontier: Frontier=None,
+        persist: bool
+    ) -> Iterator[Recipe]:
+        for recipe in recipes:
+            if persist:
+                self._persist([recipe], frontier=frontier)
+
+            yield recipe
+
+    def _persist(self, recipes: List[Recipe], *, frontier: Frontier=None) -> None:
+        recipe_ids = self.writer.write(recipes)
+
+        if self._pantry is not None:
+            self._pantry.refresh(self.db.engine, recipe_ids.values())
+
+        if frontier is not None:
+            frontier.stored(recipe_ids)
+
+    def prepare(
+        self,
+        *,
+        title: str=None,
+        cuisine: str=None,
+        ingredients: Iterable[str]=(),
+        website: str=None,
+        n: int=1
+    ) -> List[models.Recipe]:
+        """
+        Pick random recipes out of the database.
+
+        Recipes come with their ingredient amounts (and those amounts'
+        ingredient and measurement), tags and cuisines already loaded,
+        so they can be used once the session is gone. However many
+        recipes are asked for, that takes three queries: the sample along
+        with its cuisines, and one each for the ingredient amounts and
+        tags of everything in it.
+
+        Parameters
+        ----------
+        title : str, default None
+            a specific recipe to return
+
+        cuisine : str, default None
+            all recipes must be of this cuisine, e.g. "italian"
+
+        ingredients : [str], default ()
+            all recipes must include these ingredients
+
+        website : str, default None
+            return recipes from this site only, e.g. "Hello Fresh"
+
+        n : int, default 1
+            number of recipes to return
+
+        Returns
+        -------
+        recipes : List[models.Recipe]
+            fewer than `n` if not enough recipes match
+        """
+        source = None if website is None else _site(website).SOURCE
+        recipes = []
+
+        with self.db.session() as s:
+            recipes = queries.sample_recipes(
+                s,
+                n=n,
+                query=s.query(models.Recipe).options(*_PREPARED),
+                title=title,
+                cuisine=cuisine,
+                ingredients=ingredients,
+                source=source
+            )
+
+            # detached before the commit, so that they aren't expired by it
+            s.expunge_all()
 
         return recipes
 
-    def prepare(self, *, cuisine=None, n=1):
+    def search(self, text: str, *, n: int=10) -> List[models.Recipe]:
+        """
+        Find recipes by words in their title, ingredients, tags or cuisines.
+
+        Every word has to match. Titles count for more than ingredients,
+        and ingredients for more than tags and cuisines. Recipes come
+        loaded like those from prepare.
+
+        Parameters
+        ----------
+        text : str
+            words to look for, e.g. "chicken garlic"
+
+        n : int, default 10
+            number of recipes to return
+
+        Returns
+        -------
+        recipes : List[models.Recipe]
+            best matches first
+        """
+        return self._ranked([id_ for id_, _ in search.search(self.db.engine, text, n=n)])
+
+    def similar(self, recipe: Union[models.Recipe, int, str], *, n: int=10) -> List[models.Recipe]:
+        """
+        Find the recipes most like one, by ingredients, tags and cuisines.
+
+        Backed by a TF-IDF index of every recipe which is saved to the temp
+        directory (or only kept in memory, for an in-memory database), and
+        only rebuilt once recipes have been stored, stored again or deleted.
+        Needs numpy and scipy.
+
+        Parameters
+        ----------
+        recipe : models.Recipe, int or str
+            the recipe, its id, or its title
+
+        n : int, default 10
+            number of recipes to return
+
+        Returns
+        -------
+        recipes : List[models.Recipe]
+            most similar first, loaded like those from prepare
+        """
+        # numpy and scipy are only needed here
+        from scrapfishin.similarity import SimilarityIndex
+
+        if isinstance(recipe, str):
+            found = self.prepare(title=recipe)
+
+            if not found:
+                raise ValueError(f'there is no recipe titled "{recipe}"')
+
+            recipe = found[0]
+
+        recipe_id = getattr(recipe, 'id', recipe)
+        self._similarity = SimilarityIndex.cached(self.db.engine, self._similarity_path(), index=self._similarity)
+
+        try:
+            similar = self._similarity.similar(recipe_id, n=n)
+        except KeyError:
+            raise ValueError(f'there is no recipe with id {recipe_id}')
+
+        return self._ranked([id_ for id_, _ in similar])
+
+    def _similarity_path(self) -> Optional[pathlib.Path]:
+        # one file per database .. an in-memory database is gone with its
+        # engine, and another one may look just the same, so it gets none
+        url = self.db.engine.url
+
+        if url.get_backend_name() != 'sqlite':
+            identity = str(url)
+        elif url.database in (None, '', ':memory:'):
+            return None
+        else:
+            identity = f'sqlite:///{pathlib.Path(url.database).resolve().as_posix()}'
+
+        digest = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+        return pathlib.Path(tempfile.gettempdir()) / 'scrapfishin' / f'similarity-{digest}.npz'
+
+    def _ranked(self, recipe_ids: List[int]) -> List[models.Recipe]:
+        # loaded like prepare's, in the order of `recipe_ids`
+        ranks = {id_: i for i, id_ in enumerate(recipe_ids)}
+        recipes = []
+
+        if not ranks:
+            return recipes
+
+        with self.db.session() as s:
+            recipes = s.query(models.Recipe).options(*_PREPARED).filter(models.Recipe.id.in_(ranks)).all()
+            s.expunge_all()
+
+        return sorted(recipes, key=lambda r: ranks[r.id])
+
+    def plan(
+        self,
+        n: int=7,
+        *,
+        cuisine: str=None,
+        allergens: Iterable[str]=(),
+        max_prep_time: int=None,
+        prep_time_budget: int=None,
+        website: str=None
+    ) -> List[models.Recipe]:
+        """
+        Plan a menu of recipes which share as many ingredients as they can.
+
+        The menu is picked to make the grocery list (see collect) as
+        short as it can be, with as little left over of cans, bunches and
+        whole vegetables as it can. Needs numpy and scipy.
+
+        Parameters
+        ----------
+        n : int, default 7
+            number of recipes on the menu
+
+        cuisine : str, default None
+            all recipes must be of this cuisine, e.g. "italian"
+
+        allergens : [str], default ()
+            no recipe may have any of these allergens
+
+        max_prep_time : int, default None
+            most minutes any one recipe may take
+
+        prep_time_budget : int, default None
+            most minutes all recipes may take together
+
+        website : str, default None
+            plan from this site's recipes only, e.g. "Hello Fresh"
+
+        Returns
+        -------
+        recipes : List[models.Recipe]
+            fewer than `n` if not enough recipes match
         """
+        # numpy and scipy are only needed here
+        from scrapfishin.planner import plan_menu
+
+        source = None if website is None else _site(website).SOURCE
+        recipe_ids = []
+
+        with self.db.session() as s:
+            recipe_ids = plan_menu(
+                s,
+                n,
+                prep_time_budget=prep_time_budget,
+                cuisine=cuisine,
+                allergens=allergens,
+                max_prep_time=max_prep_time,
+                source=source
+            ).recipe_ids
+
+        return self._ranked(recipe_ids)
+
+    def cookable(
+        self,
+        pantry: Iterable[str],
+        *,
+        substitutions: Mapping[str, Iterable[str]]=None,
+        allergens: Iterable[str]=(),
+        n: int=10
+    ) -> List[Cookable]:
+        """
+        Find what you can cook with what you have.
+
+        Recipes are ranked by the share of their ingredients which are in
+        the pantry, through an index of every recipe's ingredients which
+        is loaded on first use and kept up to date as recipes are fished.
+
+        Parameters
+        ----------
+        pantry : [str]
+            foods on hand, e.g. ["garlic", "onion"]
+
+        substitutions : {str: [str]}, default None
+            foods a recipe calls for -> foods which may stand in for
+            them, e.g. {"shallot": ["onion"]}
+
+        allergens : [str], default ()
+            leave out recipes with any of these allergens
+
+        n : int, default 10
+            number of recipes to return
+
+        Returns
+        -------
+        recipes : List[Cookable]
+            best covered recipes first, with what's still missing
         """
-        NotImplementedError('TODO: tons of options on this one...')
+        if self._pantry is None:
+            self._pantry = PantryIndex.load(self.db.engine)
+
+        return self._pantry.cookable(pantry, substitutions=substitutions, allergens=allergens, n=n)
 
-    def collect(self, recipes: List[Recipe], follow_parents: bool=False) -> List[Ingredient]:
+    def collect(
+        self,
+        recipes: Iterable[Union[models.Recipe, Recipe]],
+        follow_parents: bool=False
+    ) -> List[Line]:
         """
         Reduce a list of recipes to their ingredients.
 
+        Ingredients are totaled per food and canonical unit. Parent
+        recipes are expanded through a graph of every ingredient with a
+        parent recipe, which is loaded on first use, and again only once
+        recipes have been stored, stored again or deleted. Each parent
+        recipe is expanded once for as long as the graph is kept.
+
         Parameters
         ----------
-        recipes : List[Recipe]
-            recipe objects to consolidate
+        recipes : List[models.Recipe or Recipe]
+            stored (e.g. from prepare) or scraped recipes to consolidate
 
         follow_parents : bool, default False
-            whether or not to reduce Ingredients if they have a parent recipe
+            whether or not to reduce Ingredients if they have a parent
+            recipe (e.g. a spice blend) into what the parent is made of,
+            scaled by how much of it is used
 
         Returns
         -------
-        ingredients : List[Ingredient]
-        """
-        ingredients = [i for r in recipes for i in r.ingredients]
+        ingredients : List[Line]
+            food, unit and total amount, sorted by food and then unit
 
+        Raises
+        ------
+        ValueError
+            if following parents and recipes are made of each other
+        """
         if follow_parents:
-            raise NotImplementedError('TODO: add logic to find parent recipes')
+            self._graph = IngredientGraph.cached(self.db.engine, graph=self._graph)
+
+        return collect(recipes, graph=self._graph if follow_parents else None)
+
 
-        return ingredients
+def _site(name: str):
+    try:
+        return SITES[name.lower()]
+    except KeyError:
+        raise ValueError(f'"{name}" is not a supported')
@@ -0,0 +1,260 @@
+"""
+Full-text search over recipes.
+
+Each recipe has a search document of its title, ingredients, tags and
+cuisines, which lives in the table `recipe_search`..
+
+    SQLite      an FTS5 virtual table, keyed on the recipe's rowid, and
+                ranked with bm25
+
+    PostgreSQL  a table of the same text columns, plus a weighted tsvector
+                generated from them behind a GIN index, ranked with
+                ts_rank
+
+The table is created along with the models by create_all. RecipeWriter
+indexes the recipes it writes in the same transaction, as does every
+Session when it flushes recipes (or their ingredients, tags or cuisines).
+Triggers on `recipe` follow titles which are changed, and recipes which
+are deleted, any other way.
+
+Other databases have no search.
+"""
+from typing import Dict, Iterable, List, Tuple
+import re
+
+import sqlalchemy as sa
+
+from scrapfishin.database import Base
+from scrapfishin import models
+
+
+DIALECTS = ('sqlite', 'postgresql')
+
+# stay well under the bound parameter limit of older SQLite builds
+_CHUNK = 500
+
+_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipe_search
+    USING fts5(title, ingredients, tags, cuisines, tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipe_search_delete AFTER DELETE ON recipe BEGIN
+        DELETE FROM recipe_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipe_search_title AFTER UPDATE OF title ON recipe BEGIN
+        UPDATE recipe_search SET title = new.title WHERE rowid = new.id;
+    END
+    """
+]
+
+_POSTGRESQL = [
+    """
+    CREATE TABLE IF NOT EXISTS recipe_search (
+        recipe_id INTEGER PRIMARY KEY REFERENCES recipe (id) ON DELETE CASCADE,
+        title TEXT,
+        ingredients TEXT,
+        tags TEXT,
+        cuisines TEXT,
+        document TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(tags, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(cuisines, '')), 'C')
+        ) STORED
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_recipe_search_document ON recipe_search USING GIN (document)',
+    """
+    CREATE OR REPLACE FUNCTION recipe_search_title() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE recipe_search SET title = NEW.title WHERE recipe_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS recipe_search_title ON recipe',
+    """
+    CREATE TRIGGER recipe_search_title AFTER UPDATE OF title ON recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipe_search_title()
+    """
+]
+
+# rows which are part of a recipe's search document, each keyed on recipe_id first
+_DOCUMENT_ROWS = (models.RecipeIngredientAmount, models.RecipeTag, models.RecipeCuisine)
+
+# bm25 weights of title, ingredients, tags and cuisines
+_SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+
+def supported(conn: sa.engine.Connectable) -> bool:
+    return conn.dialect.name in DIALECTS
+
+
+@sa.event.listens_for(Base.metadata, 'after_create')
+def create(target, conn: sa.engine.Connection, **kw) -> None:
+    """
+    Create the search table and its triggers, if they don't exist yet.
+    """
+    if not supported(conn):
+        return
+
+    for statement in _SQLITE if conn.dialect.name == 'sqlite' else _POSTGRESQL:
+        conn.execute(sa.text(statement))
+
+
+@sa.event.listens_for(sa.orm.Session, 'after_flush')
+def _follow_flush(session: sa.orm.Session, flush_context) -> None:
+    """
+    Index the recipes a flush wrote, in the same transaction.
+    """
+    changed = set()
+    deleted = set()
+
+    for instances, into in [(session.new, changed), (session.dirty, changed), (session.deleted, deleted)]:
+        for instance in instances:
+            # read what the flush left behind, rather than load anything
+            if isinstance(instance, models.Recipe):
+                into.add(instance.__dict__.get('id'))
+            elif isinstance(instance, _DOCUMENT_ROWS):
+                changed.add(instance.__dict__.get('recipe_id'))
+
+    # deleted recipes are taken care of by the delete trigger
+    changed -= deleted | {None}
+
+    if changed:
+        conn = session.connection()
+
+        if supported(conn):
+            index(conn, sorted(changed))
+
+
+def _documents(conn: sa.engine.Connection, recipe_ids: List[int]) -> Dict[int, dict]:
+    recipe = models.Recipe.__table__
+    ria = models.RecipeIngredientAmount.__table__
+    rt = models.RecipeTag.__table__
+    rc = models.RecipeCuisine.__table__
+
+    documents = {
+        id_: {'id': id_, 'title': title, 'ingredients': [], 'tags': [], 'cuisines': []}
+        for id_, title in conn.execute(sa.select([recipe.c.id, recipe.c.title]).where(recipe.c.id.in_(recipe_ids)))
+    }
+    sections = [
+        ('ingredients', ria, models.Ingredient.__table__, ria.c.ingredient_id, 'food'),
+        ('tags', rt, models.Tag.__table__, rt.c.tag_id, 'descriptor'),
+        ('cuisines', rc, models.Cuisine.__table__, rc.c.cuisine_id, 'region')
+    ]
+
+    for section, bridge, lookup, fk, column in sections:
+        q = sa.select([bridge.c.recipe_id, lookup.c[column]])\
+              .select_from(bridge.join(lookup, lookup.c.id == fk))\
+              .where(bridge.c.recipe_id.in_(recipe_ids))
+
+        for recipe_id, value in conn.execute(q):
+            documents[recipe_id][section].append(value)
+
+    for document in documents.values():
+        for section, *_ in sections:
+            document[section] = ' '.join(sorted(document[section]))
+
+    return documents
+
+
+def index(conn: sa.engine.Connection, recipe_ids: Iterable[int]) -> None:
+    """
+    Write the search documents of recipes, replacing any they had.
+    """
+    if not supported(conn):
+        return
+
+    recipe_ids = list(recipe_ids)
+
+    for i in range(0, len(recipe_ids), _CHUNK):
+        chunk = recipe_ids[i:i + _CHUNK]
+        documents = list(_documents(conn, chunk).values())
+
+        if conn.dialect.name == 'sqlite':
+            conn.execute(
+                sa.text('DELETE FROM recipe_search WHERE rowid IN :ids').bindparams(sa.bindparam('ids', expanding=True)),
+                ids=chunk
+            )
+            statement = """
+                INSERT INTO recipe_search (rowid, title, ingredients, tags, cuisines)
+                VALUES (:id, :title, :ingredients, :tags, :cuisines)
+            """
+        else:
+            statement = """
+                INSERT INTO recipe_search (recipe_id, title, ingredients, tags, cuisines)
+                VALUES (:id, :title, :ingredients, :tags, :cuisines)
+                ON CONFLICT (recipe_id) DO UPDATE
+                SET title = excluded.title,
+                    ingredients = excluded.ingredients,
+                    tags = excluded.tags,
+                    cuisines = excluded.cuisines
+            """
+
+        if documents:
+            conn.execute(sa.text(statement), documents)
+
+
+def unindexed(conn: sa.engine.Connection) -> List[int]:
+    """
+    Find recipes which have no search document, e.g. in an older database.
+    """
+    key = 'rowid' if conn.dialect.name == 'sqlite' else 'recipe_id'
+    q = f'SELECT id FROM recipe WHERE id NOT IN (SELECT {key} FROM recipe_search)'
+    return [id_ for id_, in conn.execute(sa.text(q))]
+
+
+def search(conn: sa.engine.Connectable, text: str, *, n: int=10) -> List[Tuple[int, float]]:
+    """
+    Find recipes whose title, ingredients, tags or cuisines have every word in `text`.
+
+    Parameters
+    ----------
+    conn : sqlalchemy.engine.Connectable
+        database to search
+
+    text : str
+        words to look for, e.g. "chicken garlic"
+
+    n : int, default 10
+        number of recipes to return
+
+    Returns
+    -------
+    matches : [(int, float)]
+        id and rank of each recipe, best first, where higher is better
+    """
+    if not supported(conn):
+        raise NotImplementedError(f'full-text search needs one of {DIALECTS}, not {conn.dialect.name}')
+
+    words = re.findall(r'\w+', text.lower())
+
+    if not words:
+        return []
+
+    if conn.dialect.name == 'sqlite':
+        # every word quoted, so that it can't be taken for FTS5 syntax
+        weights = ', '.join(map(str, _SQLITE_WEIGHTS))
+        q = sa.text(f"""
+            SELECT rowid, -bm25(recipe_search, {weights}) AS rank
+              FROM recipe_search
+             WHERE recipe_search MATCH :query
+             ORDER BY rank DESC
+             LIMIT :n
+        """)
+        query = ' '.join(f'"{word}"' for word in words)
+    else:
+        q = sa.text("""
+            SELECT recipe_id, ts_rank(document, query) AS rank
+              FROM recipe_search, plainto_tsquery('english', :query) AS query
+             WHERE document @@ query
+             ORDER BY rank DESC
+             LIMIT :n
+        """)
+        query = ' '.join(words)
+
+    return [(id_, rank) for id_, rank in conn.execute(q, query=query, n=n)]
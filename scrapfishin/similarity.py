@@ -0,0 +1,198 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import pathlib
+import logging
+
+from scipy import sparse
+import sqlalchemy as sa
+import numpy as np
+
+from scrapfishin.queries import fingerprint
+from scrapfishin import models
+
+
+log = logging.getLogger(__name__)
+
+
+# bridge table, column of the feature, and how much it counts for next to
+# the others .. sharing an ingredient says more than sharing a tag
+SECTIONS = [
+    (models.RecipeIngredientAmount.__table__, 'ingredient_id', 1.0),
+    (models.RecipeTag.__table__, 'tag_id', 0.5),
+    (models.RecipeCuisine.__table__, 'cuisine_id', 0.5)
+]
+
+
+class SimilarityIndex:
+    """
+    TF-IDF vectors of every recipe's ingredients, tags and cuisines.
+
+    Each recipe is a row of a sparse CSR matrix, with a column for each
+    ingredient, tag and cuisine it has. Rare features weigh more than
+    common ones (e.g. garlic), and rows are scaled to unit length, so
+    the dot product of two rows is their cosine similarity.
+
+    Attributes
+    ----------
+    recipe_ids : numpy.ndarray
+        id of the recipe in each row
+
+    matrix : scipy.sparse.csr_matrix
+        recipes x features, rows of unit length
+
+    fingerprint : str
+        state of the recipe table the index was built from
+    """
+    def __init__(self, recipe_ids: np.ndarray, matrix: sparse.csr_matrix, fingerprint: str):
+        self.recipe_ids = recipe_ids
+        self.matrix = matrix
+        self.fingerprint = fingerprint
+        self._rows = {id_: row for row, id_ in enumerate(recipe_ids.tolist())}
+
+    @classmethod
+    def build(cls, conn: sa.engine.Connectable) -> 'SimilarityIndex':
+        """
+        Build the index from every recipe in the database.
+        """
+        state = fingerprint(conn)
+        recipe = models.Recipe.__table__
+        recipe_ids = np.array([id_ for id_, in conn.execute(sa.select([recipe.c.id]).order_by(recipe.c.id))], dtype=np.int64)
+        features = {}
+        rows, columns, weights = [], [], []
+
+        for table, column, weight in SECTIONS:
+            for recipe_id, value_id in conn.execute(sa.select([table.c.recipe_id, table.c[column]])):
+                rows.append(recipe_id)
+                columns.append(features.setdefault((column, value_id), len(features)))
+                weights.append(weight)
+
+        shape = (len(recipe_ids), len(features))
+        rows = np.searchsorted(recipe_ids, np.array(rows, dtype=np.int64))
+        matrix = sparse.csr_matrix((np.array(weights, dtype=np.float32), (rows, columns)), shape=shape)
+        matrix.sum_duplicates()
+
+        # smoothed idf, like scikit-learn's
+        df = np.bincount(matrix.indices, minlength=shape[1])
+        idf = np.log((1 + shape[0]) / (1 + df)) + 1
+        matrix.data *= idf[matrix.indices].astype(np.float32)
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+
+        log.info(f'built a similarity index of {shape[0]} recipes and {shape[1]} features')
+        return cls(recipe_ids, matrix, state)
+
+    @classmethod
+    def cached(
+        cls,
+        engine: sa.engine.Engine,
+        path: Optional[pathlib.Path],
+        *,
+        index: 'SimilarityIndex'=None
+    ) -> 'SimilarityIndex':
+        """
+        Get an index of the database as it is now.
+
+        `index` is returned as is if no recipe changed since it was built,
+        else the one saved at `path`, else a new index is built and saved.
+        Without a `path`, nothing is read from or saved to disk.
+        """
+        state = fingerprint(engine)
+
+        if index is not None and index.fingerprint == state:
+            return index
+
+        if path is not None and path.exists():
+            try:
+                saved = cls.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                log.warning(f'ignoring unreadable similarity index at {path}: {e}')
+            else:
+                if saved.fingerprint == state:
+                    return saved
+
+        index = cls.build(engine)
+
+        if path is not None:
+            index.save(path)
+
+        return index
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> 'SimilarityIndex':
+        with np.load(path, allow_pickle=False) as saved:
+            matrix = sparse.csr_matrix(
+                (saved['data'], saved['indices'], saved['indptr']),
+                shape=tuple(saved['shape'])
+            )
+            return cls(saved['recipe_ids'], matrix, str(saved['fingerprint']))
+
+    def save(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staged = path.with_suffix('.tmp.npz')
+        np.savez(
+            staged,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            recipe_ids=self.recipe_ids,
+            fingerprint=np.array(self.fingerprint)
+        )
+        staged.replace(path)
+
+    def similar(self, recipe_id: int, *, n: int=10) -> List[Tuple[int, float]]:
+        """
+        Find the `n` recipes most like one.
+
+        Returns
+        -------
+        similar : [(int, float)]
+            id and cosine similarity of each recipe, most similar first,
+            recipes with nothing in common are left out
+        """
+        return self.top_k([recipe_id], n=n)[recipe_id]
+
+    def top_k(
+        self,
+        recipe_ids: Iterable[int],
+        *,
+        n: int=10,
+        batch: int=256
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Find the `n` recipes most like each of many.
+
+        Similarities are computed `batch` recipes at a time, against every
+        recipe, which takes batch x recipes x 4 bytes at once.
+
+        Returns
+        -------
+        similar : {int: [(int, float)]}
+            recipe id -> what similar would return for it
+        """
+        recipe_ids = list(recipe_ids)
+        found = {}
+
+        for start in range(0, len(recipe_ids), batch):
+            chunk = recipe_ids[start:start + batch]
+            rows = np.array([self._rows[id_] for id_ in chunk], dtype=np.int64)
+            scores = (self.matrix[rows] @ self.matrix.T).toarray()
+            scores[np.arange(len(rows)), rows] = 0
+            k = min(n, scores.shape[1] - 1)
+
+            if k <= 0:
+                found.update({id_: [] for id_ in chunk})
+                continue
+
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+            for i, id_ in enumerate(chunk):
+                order = best[i][np.argsort(-scores[i, best[i]], kind='stable')]
+                found[id_] = [
+                    (int(self.recipe_ids[j]), float(scores[i, j]))
+                    for j in order
+                    if scores[i, j] > 0
+                ]
+
+        return found
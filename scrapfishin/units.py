@@ -0,0 +1,218 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+import functools as ft
+import unicodedata
+import re
+
+
+# ¼, ½, ⅓, ..
+VULGAR_FRACTIONS = {
+    c: unicodedata.numeric(c)
+    for c in '¼½¾⅐⅑⅒⅓⅔⅕⅖⅗⅘⅙⅚⅛⅜⅝⅞'
+}
+
+_VULGAR = '[' + ''.join(VULGAR_FRACTIONS) + ']'
+_VALUE = (
+    r'(?:'
+    rf'\d+\s*{_VULGAR}|{_VULGAR}'          # 1½, ½
+    r'|\d+\s+\d+\s*/\s*\d+'                # 1 1/2
+    r'|\d+\s*/\s*\d+'                      # 1/2
+    r'|\d+(?:\.\d+)?|\.\d+'                # 1, 1.5, .5
+    r')'
+)
+_RANGE = r'\s*(?:-|–|—|to)\s*'
+
+QUANTITY = re.compile(rf'^\s*(?P<low>{_VALUE})(?:{_RANGE}(?P<high>{_VALUE}))?\s*$')
+LEADING_QUANTITY = re.compile(rf'^\s*(?P<quantity>{_VALUE}(?:{_RANGE}{_VALUE})?)(?![\d./])')
+
+
+# unit -> (canonical unit, how many of the canonical unit it is)
+#
+# A few packages are measured by weight, from what Hello Fresh ships..
+#
+#   1 can of tomato sauce = 1 box = 13.76 ounce
+#   1 sprig of <herb> = 0.25 ounce
+#   1 bunch of <herb> = 2.00 ounce
+#
+# Anything else (e.g. clove, unit, thumb) is its own canonical unit.
+#
+_UNITS = {
+    # volume, in teaspoons
+    'teaspoon': ('teaspoon', 1.0),
+    'tablespoon': ('teaspoon', 3.0),
+    'fluid ounce': ('teaspoon', 6.0),
+    'cup': ('teaspoon', 48.0),
+    'pint': ('teaspoon', 96.0),
+    'quart': ('teaspoon', 192.0),
+    'gallon': ('teaspoon', 768.0),
+    'milliliter': ('teaspoon', 0.202884),
+    'liter': ('teaspoon', 202.884),
+
+    # weight, in ounces
+    'ounce': ('ounce', 1.0),
+    'pound': ('ounce', 16.0),
+    'gram': ('ounce', 0.035274),
+    'kilogram': ('ounce', 35.274),
+
+    # packages, in ounces
+    'can': ('ounce', 13.76),
+    'box': ('ounce', 13.76),
+    'sprig': ('ounce', 0.25),
+    'bunch': ('ounce', 2.0)
+}
+
+# unit -> its plural, where that isn't just an "s" on the end
+_PLURALS = {
+    'box': 'boxes',
+    'bunch': 'bunches'
+}
+
+_ALIASES = {
+    'tsp': 'teaspoon',
+    'tbsp': 'tablespoon',
+    'tbs': 'tablespoon',
+    'fl oz': 'fluid ounce',
+    'fl. oz': 'fluid ounce',
+    'c': 'cup',
+    'pt': 'pint',
+    'qt': 'quart',
+    'gal': 'gallon',
+    'ml': 'milliliter',
+    'millilitre': 'milliliter',
+    'l': 'liter',
+    'litre': 'liter',
+    'oz': 'ounce',
+    'lb': 'pound',
+    'lbs': 'pound',
+    'g': 'gram',
+    'gr': 'gram',
+    'kg': 'kilogram'
+}
+
+
+def _conversions() -> Dict[str, Tuple[str, float]]:
+    table = {}
+
+    for name, conversion in _UNITS.items():
+        for spelling in [name, _PLURALS.get(name, f'{name}s')]:
+            table[spelling] = conversion
+
+    for alias, name in _ALIASES.items():
+        table[alias] = _UNITS[name]
+
+    return table
+
+
+# every spelling we know of -> (canonical unit, factor)
+CONVERSIONS = _conversions()
+
+
+class Normalized(NamedTuple):
+    amount: Optional[float]
+    canonical_amount: Optional[float]
+    canonical_unit: str
+
+
+def _value(text: str) -> float:
+    text = re.sub(r'\s*/\s*', '/', text.strip())
+
+    if text[-1] in VULGAR_FRACTIONS:
+        whole = text[:-1].strip()
+        return float(whole or 0) + VULGAR_FRACTIONS[text[-1]]
+
+    if '/' in text:
+        whole, _, fraction = text.rpartition(' ')
+        numerator, denominator = fraction.split('/')
+        return float(whole or 0) + int(numerator) / int(denominator)
+
+    return float(text)
+
+
+@ft.lru_cache(maxsize=4096)
+def parse_quantity(text: str) -> Optional[Tuple[float, float]]:
+    """
+    Parse an amount like "2", "1.5", "1 1/2", "1½" or "1-2".
+
+    Parameters
+    ----------
+    text : str
+        amount as written in a recipe
+
+    Returns
+    -------
+    quantity : (float, float) or None
+        lowest and highest amount, which are the same unless `text` is a
+        range, None if `text` isn't an amount
+    """
+    match = QUANTITY.match(text or '')
+
+    if match is None:
+        return None
+
+    try:
+        low = _value(match.group('low'))
+        high = low if match.group('high') is None else _value(match.group('high'))
+    except ZeroDivisionError:
+        return None
+
+    return low, max(low, high)
+
+
+def split_quantity(text: str) -> Tuple[str, str]:
+    """
+    Split the amount off the front of e.g. "1 1/2 cup", into ("1 1/2", "cup").
+
+    The amount is empty if `text` doesn't start with one.
+    """
+    match = LEADING_QUANTITY.match(text)
+
+    if match is None:
+        return '', text.strip()
+
+    return match.group('quantity').strip(), text[match.end():].strip()
+
+
+def _clean(unit: str) -> str:
+    unit = unit.lower().replace('(s)', '').strip().rstrip('.')
+    return ' '.join(unit.split())
+
+
+@ft.lru_cache(maxsize=1024)
+def canonical_unit(unit: str) -> Tuple[str, float]:
+    """
+    Find the unit `unit` converts to, and how many of it one `unit` is.
+
+    e.g. "Tbsp" -> ("teaspoon", 3.0), "clove" -> ("clove", 1.0)
+    """
+    unit = _clean(unit)
+    return CONVERSIONS.get(unit, (unit, 1.0))
+
+
+def normalize(amount: str, unit: str) -> Normalized:
+    """
+    Turn an amount of `unit` into a number of its canonical unit.
+
+    Ranges are normalized to their highest amount, since that's what you
+    have to buy.
+
+    Parameters
+    ----------
+    amount : str
+        amount as written in a recipe, e.g. "1½"
+
+    unit : str
+        unit of measurement as written in a recipe, e.g. "tbsp"
+
+    Returns
+    -------
+    normalized : Normalized
+        amount in `unit`, the same amount in the canonical unit, and the
+        canonical unit, the amounts are None if `amount` isn't one
+    """
+    quantity = parse_quantity(amount)
+    canonical, factor = canonical_unit(unit)
+
+    if quantity is None:
+        return Normalized(None, None, canonical)
+
+    value = quantity[1]
+    return Normalized(value, round(value * factor, 4), canonical)
@@ -0,0 +1,59 @@
+import tempfile
+import os
+
+from ward import test, fixture
+
+from scrapfishin.cache import PageCache
+
+
+@fixture
+def cache():
+    with tempfile.TemporaryDirectory() as root:
+        with PageCache(root, ttl=60, max_bytes=10_000) as c:
+            yield c
+
+
+@test('PageCache round-trips a page and its validators')
+def _(cache=cache):
+    cache.put('recipes/soup', '<html>soup</html>', etag='"abc"')
+    page = cache.get('recipes/soup')
+
+    assert page.html == '<html>soup</html>'
+    assert page.etag == '"abc"'
+    assert page.fresh
+    assert cache.get('recipes/stew') is None
+
+
+@test('PageCache keeps stale pages around for revalidation')
+def _(cache=cache):
+    cache.ttl = 0
+    cache.put('recipes/soup', '<html>soup</html>')
+    page = cache.get('recipes/soup')
+
+    assert page.html == '<html>soup</html>'
+    assert not page.fresh
+
+
+@test('PageCache stores identical pages once')
+def _(cache=cache):
+    a = cache.put('recipes/soup', '<html>soup</html>')
+    b = cache.put('recipes/soup-again', '<html>soup</html>')
+
+    assert a == b
+    assert len(list(cache._blobs.glob('*/*'))) == 1
+
+
+@test('PageCache evicts the least recently used pages past max_bytes')
+def _(cache=cache):
+    # random content doesn't compress much, so each page is about the same size
+    for n in range(3):
+        cache.put(f'recipes/{n}', os.urandom(2000).hex())
+
+    cache.max_bytes = cache.size() + 100
+    cache.get('recipes/0')
+    cache.put('recipes/3', os.urandom(2000).hex())
+
+    assert cache.size() <= cache.max_bytes
+    assert cache.get('recipes/0') is not None
+    assert cache.get('recipes/1') is None
+    assert cache.get('recipes/3') is not None
@@ -0,0 +1,59 @@
+from ward import test
+
+from scrapfishin.hello_fresh.consolidate import ParentIndex, consolidate, merge
+from scrapfishin.hello_fresh.unlisted_recipes import spices, tuscan_heat_spice
+
+
+def data(title, region, *foods):
+    return {
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'cuisines': [{'region': region}],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+            for food in foods
+        ]
+    }
+
+
+@test('merge folds together recipes which are not next to each other')
+def _():
+    merged = merge([
+        data('Pasta', 'italian', 'onion'),
+        data('Tacos', 'mexican', 'onion'),
+        data('Pasta', 'american', 'onion'),
+        data('PASTA', 'italian', 'onion')
+    ])
+
+    assert [(d['title'], d['cuisines']) for d in merged] == [
+        ('Pasta', [{'region': 'italian'}, {'region': 'american'}]),
+        ('Tacos', [{'region': 'mexican'}])
+    ]
+
+
+@test('consolidate links ingredients to parent recipes regardless of case')
+def _():
+    recipes = consolidate([
+        data('Pasta', 'italian', 'Tuscan Heat Spice', 'onion'),
+        data('Tuscan Heat Spice', 'italian', 'basil'),
+        data('Pasta', 'american', 'Tuscan Heat Spice', 'onion')
+    ])
+    pasta = recipes[-1]
+
+    assert len(recipes) == len(spices) + 1
+    assert pasta.title == 'Pasta'
+    assert {c.region for c in pasta.cuisines} == {'italian', 'american'}
+    assert [ia.ingredient.parent_recipe for ia in pasta.ingredient_amounts] == [tuscan_heat_spice, None]
+
+
+@test('a parent index grows to include any recipe')
+def _():
+    parents = ParentIndex()
+    parents.add(tuscan_heat_spice)
+
+    assert 'TUSCAN HEAT SPICE' in parents
+    assert parents.get('tuscan heat spice') is tuscan_heat_spice
+    assert parents.get('basil') is None
+    assert len(ParentIndex.unlisted()) == len(spices)
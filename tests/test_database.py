@@ -0,0 +1,80 @@
+from contextlib import closing
+import tempfile
+
+from ward import test, fixture, raises
+import sqlalchemy as sa
+
+from scrapfishin.database import Database, Base, get_or_create_many
+from scrapfishin.models import CrawlPage, Measurement
+
+
+@fixture
+def db():
+    db = Database('sqlite://')
+    Base.metadata.create_all(db.engine)
+    return db
+
+
+@test('get_or_create_many returns existing rows and creates the missing ones')
+def _(db=db):
+    with db.session() as s:
+        s.add(Measurement(unit='teaspoon'))
+
+    # Database.session swallows exceptions, assertion errors included, so
+    # these read through a plain session and check once it's closed
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        units = get_or_create_many(s, Measurement, [{'unit': 'teaspoon'}, {'unit': 'cup'}], key='unit')
+        ids = {unit: u.id for unit, u in units.items()}
+        count = s.query(Measurement).count()
+
+    assert set(ids) == {'teaspoon', 'cup'}
+    assert None not in ids.values()
+    assert count == 2
+
+
+@test('get_or_create_many never asks the database for a value twice in a session')
+def _(db=db):
+    statements = []
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        get_or_create_many(s, Measurement, [{'unit': 'teaspoon'}], key='unit')
+
+        @sa.event.listens_for(db.engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        units = get_or_create_many(s, Measurement, [{'unit': 'teaspoon'}], key='unit')
+        unit = units['teaspoon'].unit
+
+    assert not any('FROM measurement' in s for s in statements)
+    assert unit == 'teaspoon'
+
+
+@test('get_or_create_many raises rows which can never be created')
+def _(db=db):
+    with closing(sa.orm.Session(bind=db.engine)) as s, raises(sa.exc.IntegrityError):
+        get_or_create_many(s, CrawlPage, [{'slug': 'recipes/soup'}], key='slug')
+
+
+@test('get_or_create_many finds rows which were created while it was creating them')
+def _():
+    with tempfile.TemporaryDirectory() as root:
+        db = Database(f'sqlite:///{root}/race.db')
+        Base.metadata.create_all(db.engine)
+        other = sa.create_engine(f'sqlite:///{root}/race.db')
+
+        # another writer creates "teaspoon" right after it was looked up
+        @sa.event.listens_for(db.engine, 'after_cursor_execute', once=True)
+        def race(*args):
+            with other.begin() as conn:
+                conn.execute(Measurement.__table__.insert(), unit='teaspoon')
+
+        with closing(sa.orm.Session(bind=db.engine)) as s:
+            units = get_or_create_many(s, Measurement, [{'unit': 'teaspoon'}], key='unit')
+            unit = units['teaspoon'].unit
+            count = s.query(Measurement).count()
+
+        other.dispose()
+        db.engine.dispose()
+
+    assert (unit, count) == ('teaspoon', 1)
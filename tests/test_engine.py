@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from ward import test, raises
+
+from scrapfishin.engine import Engine, TokenBucket
+from scrapfishin.http import RetryableHTTPError
+
+
+@test('TokenBucket paces acquisitions at `rate` per second')
+async def _():
+    bucket = TokenBucket(20, burst=1)
+    start = time.monotonic()
+
+    for _ in range(5):
+        await bucket.acquire()
+
+    # the first token is free, the remaining four drip in at 1/20s each
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+@test('Engine retries throttled fetches and then succeeds')
+async def _():
+    calls = []
+
+    def fetch():
+        calls.append(time.monotonic())
+
+        if len(calls) < 3:
+            raise RetryableHTTPError('http://example.com', 429)
+
+        return 'ok'
+
+    async with Engine(rate=100, retries=3, backoff=0.01) as engine:
+        result = await engine.run(fetch, url='http://example.com')
+
+    assert result == 'ok'
+    assert len(calls) == 3
+
+
+@test('Engine gives up after `retries` and raises the last error')
+async def _():
+    def fetch():
+        raise RetryableHTTPError('http://example.com', 503)
+
+    async with Engine(rate=100, retries=1, backoff=0.01) as engine:
+        with raises(RetryableHTTPError) as exc:
+            await engine.run(fetch, url='http://example.com')
+
+    assert exc.raised.status == 503
+
+
+@test('Engine never runs more than `per_host` fetches against a host')
+async def _():
+    running, peak = 0, 0
+
+    def fetch():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        time.sleep(0.02)
+        running -= 1
+
+    async with Engine(rate=1000, burst=10, per_host=2, threads=8) as engine:
+        await engine.gather(engine.run(fetch, url='http://example.com') for _ in range(8))
+
+    assert peak == 2
+
+
+@test('Engine.gather cancels pending fetches when it is cancelled')
+async def _():
+    started = []
+
+    def fetch(i):
+        started.append(i)
+        time.sleep(0.05)
+
+    async with Engine(rate=10, per_host=1) as engine:
+        task = asyncio.ensure_future(
+            engine.gather(engine.run(fetch, i, url='http://example.com') for i in range(10))
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+        with raises(asyncio.CancelledError):
+            await task
+
+    assert len(started) < 10
@@ -0,0 +1,55 @@
+from ward import test, fixture, raises
+import sqlalchemy as sa
+
+from scrapfishin.database import Database, Base
+from scrapfishin.frontier import Frontier
+
+
+@fixture
+def frontier():
+    db = Database('sqlite://')
+    Base.metadata.create_all(db.engine)
+    return Frontier(db, 'Hello Fresh')
+
+
+@test('Frontier hands out each discovered page once, with all of its cuisines')
+def _(frontier=frontier):
+    frontier.discover({'recipes/soup': ['italian'], 'recipes/stew': ['irish']})
+    frontier.discover({'recipes/soup': ['french']})
+
+    todo = frontier.todo()
+
+    assert set(todo) == {'recipes/soup', 'recipes/stew'}
+    assert sorted(todo['recipes/soup']) == ['french', 'italian']
+
+
+@test('Frontier skips stored pages until they are due for a refresh')
+def _(frontier=frontier):
+    frontier.discover({'recipes/soup': ['italian'], 'recipes/stew': ['irish']})
+    frontier.parsed('recipes/soup', 'abc', 'Soup')
+    frontier.parsed('recipes/stew', 'def', 'Stew')
+    frontier.stored(['Soup'])
+
+    assert set(frontier.todo()) == {'recipes/stew'}
+    assert frontier.unchanged('recipes/soup', 'abc')
+    assert not frontier.unchanged('recipes/soup', 'xyz')
+    assert not frontier.unchanged('recipes/stew', 'def')
+
+
+@test('Frontier retries failed pages')
+def _(frontier=frontier):
+    frontier.discover({'recipes/soup': ['italian']})
+    frontier.failed('recipes/soup', AttributeError('no title'))
+
+    assert set(frontier.todo()) == {'recipes/soup'}
+
+
+@test('Frontier raises database errors instead of handing out nothing')
+def _():
+    frontier = Frontier(Database('sqlite://'), 'Hello Fresh')
+
+    with raises(sa.exc.OperationalError):
+        frontier.todo()
+
+    with raises(sa.exc.OperationalError):
+        frontier.discover({'recipes/soup': ['italian']})
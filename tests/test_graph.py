@@ -0,0 +1,118 @@
+from ward import test, fixture, raises
+
+from scrapfishin.graph import IngredientGraph, Line, collect
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap
+
+
+def recipe(title, *lines, parents={}):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'ingredient_amounts': [
+            {
+                'ingredient': {'food': food, 'parent_recipe': parents.get(food)},
+                'amount': amount,
+                'measurement': {'unit': unit}
+            }
+            for food, amount, unit in lines
+        ]
+    })
+
+
+# 12 teaspoons, 3 of them a blend of 2 teaspoons
+blend = recipe('Inner Blend', ('cumin', '1', 'tsp'), ('chili powder', '1', 'tsp'))
+spice = recipe(
+    'House Spice',
+    ('basil', '6', 'tsp'),
+    ('inner blend', '1', 'tbsp'),
+    ('garlic powder', '3', 'tsp'),
+    parents={'inner blend': blend}
+)
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe('Pasta', ('house spice', '1', 'tbsp'), ('onion', '1', 'unit'), parents={'house spice': spice}),
+        recipe('Pizza', ('house spice', '2', 'unit'), ('onion', '½', 'unit'), parents={'house spice': spice})
+    ])
+    return scrap
+
+
+@test('parent recipes expand into base ingredients, scaled by how much is used')
+def _(scrap=scrap):
+    recipes = scrap.prepare(ingredients=['onion'], n=2)
+
+    assert scrap.collect(recipes) == [
+        Line('house spice', 'teaspoon', 3.0),
+        Line('house spice', 'unit', 2.0),
+        Line('onion', 'unit', 1.5)
+    ]
+    # a quarter batch in Pasta, two batches in Pizza
+    assert scrap.collect(recipes, follow_parents=True) == [
+        Line('basil', 'teaspoon', 1.5 + 12),
+        Line('chili powder', 'teaspoon', 0.375 + 3),
+        Line('cumin', 'teaspoon', 0.375 + 3),
+        Line('garlic powder', 'teaspoon', 0.75 + 6),
+        Line('onion', 'unit', 1.5)
+    ]
+
+
+@test('scraped recipes expand through the parents they carry')
+def _():
+    scraped = recipe('Tacos', ('house spice', '1', 'unit'), parents={'house spice': spice})
+
+    assert collect([scraped], graph=IngredientGraph()) == [
+        Line('basil', 'teaspoon', 6.0),
+        Line('chili powder', 'teaspoon', 1.5),
+        Line('cumin', 'teaspoon', 1.5),
+        Line('garlic powder', 'teaspoon', 3.0)
+    ]
+
+
+@test('parents carried by scraped recipes stay out of the cached graph')
+def _(scrap=scrap):
+    scraped = recipe('Tacos', ('taco seasoning', '1', 'unit'), parents={'taco seasoning': blend})
+
+    assert scrap.collect([scraped], follow_parents=True) == [
+        Line('chili powder', 'teaspoon', 1.0),
+        Line('cumin', 'teaspoon', 1.0)
+    ]
+    assert 'taco seasoning' not in scrap._graph
+    assert IngredientGraph.cached(scrap.db.engine, graph=scrap._graph) is scrap._graph
+
+    graph = IngredientGraph.cached(scrap.db.engine)
+    graph.add(scraped)
+
+    assert IngredientGraph.cached(scrap.db.engine, graph=graph) is not graph
+
+
+@test('the graph is kept until recipes change, and rejects cycles')
+def _(scrap=scrap):
+    scrap.collect([], follow_parents=True)
+    graph = scrap._graph
+    graph.bases('house spice')
+    scrap.collect([], follow_parents=True)
+
+    assert scrap._graph is graph
+    assert 'house spice' in graph._bases
+
+    scrap.writer.write([recipe('Soup', ('onion', '1', 'unit'))])
+    scrap.collect([], follow_parents=True)
+
+    assert scrap._graph is not graph
+
+    cyclic = IngredientGraph({
+        'a': [Line('b', 'teaspoon', 1.0)],
+        'b': [Line('c', 'teaspoon', 1.0), Line('a', 'teaspoon', 1.0)],
+        'c': [Line('salt', 'teaspoon', 1.0)]
+    })
+
+    with raises(ValueError) as e:
+        cyclic.bases('A')
+
+    assert 'a -> b -> a' in str(e.raised)
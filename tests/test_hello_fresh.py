@@ -1,7 +1,37 @@
-from ward import test, fixture
+from contextlib import contextmanager
+from types import SimpleNamespace
+import asyncio
+import logging
+import pathlib
+import tempfile
+
+from ward import test, fixture, raises
 from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+
+from scrapfishin.hello_fresh.const import PROMO_POPUP, RECIPE_CARD
+from scrapfishin.hello_fresh.parser import extract_separated_tags
+from scrapfishin.hello_fresh import scraper
+from scrapfishin.hello_fresh.scraper import (
+    _drive, _recipe_data, _render_recipes, _stream, datatize_recipe, get_recipes, get_world_cuisines,
+    handle_promo_popup, stream
+)
+from scrapfishin.hello_fresh.unlisted_recipes import spices
+from scrapfishin.http import RetryableHTTPError, WaitTimings
+from scrapfishin.cache import PageCache
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap
+
+
+FILES = pathlib.Path(__file__).parent / 'files' / 'hello_fresh'
 
-from scrapfishin.scrapers.hello_fresh import extract_tags
+# slug -> recorded page
+CORPUS = {
+    'recipes': 'recipes.html',
+    'recipes/italian-cuisine': 'italian-cuisine.html',
+    'recipes/tuscan-sausage-spaghetti-5e1f0c2a7a2c3b1d': 'recipe.html',
+    'recipes/firecracker-meatballs-5b0f1c2d30006c2a1e4d5e12': 'recipe_meatballs.html'
+}
 
 
 @fixture
@@ -38,8 +68,351 @@ def tag():
     return BeautifulSoup(html, 'html.parser')
 
 
-@test('extract_tags returns at least an empty list')
-def _(tags_tag=tag):
-    t = extract_tags(tags_tag)
-    print(type(t))
+@test('extract_separated_tags returns at least an empty list')
+def _(soup=tag):
+    allergy_tag = soup.find('span', {'data-translation-id': 'recipe-detail.allergens'})
+    t = extract_separated_tags(allergy_tag, section='allergen')
     assert isinstance(t, list)
+    assert {a.strip() for a in t} == {'Wheat', 'Eggs', 'Milk'}
+    assert extract_separated_tags(None, section='allergen') == []
+
+
+class FakeBrowser:
+    """
+    An archive page which shows 10 more recipe cards per "LOAD MORE".
+    """
+    def __init__(self, *, cards=10, clicks=2, page_source='<html></html>'):
+        self.cards = cards
+        self.clicks = clicks
+        self.page_source = page_source
+        self.url = None
+
+    def get(self, url):
+        self.url = url
+
+    def find_elements_by_css_selector(self, selector):
+        # every page has loaded, and there's never a promo popup
+        return [] if selector == PROMO_POPUP else ['element'] * self.cards
+
+    def find_element_by_partial_link_text(self, text):
+        if not self.clicks:
+            raise NoSuchElementException(text)
+
+        return self
+
+    def click(self):
+        self.clicks -= 1
+        self.cards += 10
+
+
+class FakeSession:
+    """
+    Answers every request with the same page.
+    """
+    def __init__(self, text, status_code=200):
+        self.response = SimpleNamespace(status_code=status_code, text=text, headers={}, raise_for_status=lambda: None)
+        self.requests = []
+
+    def get(self, url, **kw):
+        self.requests.append(url)
+        return self.response
+
+
+class FakePool:
+    def __init__(self, driver):
+        self._driver = driver
+
+    @contextmanager
+    def driver(self):
+        yield self._driver
+
+
+@test('handle_promo_popup stops waiting as soon as the content shows up')
+def _():
+    timings = WaitTimings()
+    handle_promo_popup(FakeBrowser(), ready=RECIPE_CARD, timings=timings)
+    summary = timings.summary()
+
+    assert list(summary) == ['promo popup or content']
+    assert summary['promo popup or content']['timeouts'] == 0
+
+
+@test('handle_promo_popup waits for the content when neither shows up in time')
+def _():
+    timings = WaitTimings()
+    handle_promo_popup(FakeBrowser(cards=0), ready=RECIPE_CARD, timeout=0.05, timings=timings)
+    summary = timings.summary()
+
+    assert [summary[label]['timeouts'] for label in ['promo popup or content', 'content ready']] == [1, 1]
+
+
+@test('"LOAD MORE" is clicked until it is gone, waiting on the card count each time')
+def _():
+    driver = FakeBrowser(clicks=2)
+    timings = WaitTimings()
+    _render_recipes('recipes/italian-cuisine', pool=FakePool(driver), timings=timings)
+
+    assert driver.cards == 30
+    assert timings.summary()['load more']['count'] == 2
+    assert timings.summary()['load more']['timeouts'] == 0
+
+
+@fixture
+def cache():
+    # pages in a fresh cache are never fetched, so nothing touches the network
+    with tempfile.TemporaryDirectory() as root, PageCache(root) as cache:
+        for slug, name in CORPUS.items():
+            cache.put(slug, (FILES / name).read_text(encoding='utf-8'))
+
+        yield cache
+
+
+@test('get_world_cuisines finds every cuisine in the carousel')
+def _(cache=cache):
+    links = get_world_cuisines(cache=cache)
+    assert len(links) == 8
+    assert '/recipes/italian-cuisine' in links
+
+
+@test('get_recipes finds every recipe in an archive once')
+def _(cache=cache):
+    links = get_recipes('recipes/italian-cuisine', cache=cache)
+    assert len(links) == 24
+    assert all(link.startswith('/recipes/') for link in links)
+
+
+@test('datatize_recipe turns a recorded page into a valid Recipe')
+def _(cache=cache):
+    data = datatize_recipe('recipes/firecracker-meatballs-5b0f1c2d30006c2a1e4d5e12', cache=cache)
+    recipe = Recipe.parse_obj(data)
+    assert recipe.title == 'Firecracker Meatballs with Sesame Green Beans & Jasmine Rice'
+    assert recipe.prep_time == 35
+    assert len(recipe.ingredient_amounts) == 12
+
+
+@test('a plain HTTP page without the recipe markers is rendered in the browser instead')
+def _():
+    page = (FILES / 'recipe.html').read_text(encoding='utf-8')
+    driver = FakeBrowser(page_source=page)
+    session = FakeSession('<html>please enable javascript</html>')
+    data = datatize_recipe('recipes/tuscan-sausage', backend='http', session=session, pool=FakePool(driver))
+
+    assert len(session.requests) == 1
+    assert driver.url.endswith('/recipes/tuscan-sausage')
+    assert data['title'] == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+
+
+@test('a plain HTTP page with the recipe markers never starts the browser')
+def _():
+    page = (FILES / 'recipe.html').read_text(encoding='utf-8')
+    driver = FakeBrowser()
+    data = datatize_recipe('recipes/tuscan-sausage', session=FakeSession(page), pool=FakePool(driver))
+
+    assert driver.url is None
+    assert data['title'] == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+
+
+@test('a throttled page is rendered in the browser, unless the Engine is pacing the crawl')
+def _():
+    page = (FILES / 'recipe.html').read_text(encoding='utf-8')
+    driver = FakeBrowser(page_source=page)
+    session = FakeSession('slow down', status_code=429)
+    data = datatize_recipe('recipes/tuscan-sausage', session=session, pool=FakePool(driver))
+
+    assert driver.url.endswith('/recipes/tuscan-sausage')
+    assert data['title'] == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+
+    with raises(RetryableHTTPError):
+        datatize_recipe('recipes/tuscan-sausage', session=session, pool=FakePool(driver), paced=True)
+
+
+@fixture
+def site():
+    # every cuisine lists the same recipes, every recipe is the same page
+    archive = (FILES / 'italian-cuisine.html').read_text(encoding='utf-8')
+    recipe = (FILES / 'recipe.html').read_text(encoding='utf-8')
+
+    with tempfile.TemporaryDirectory() as root, PageCache(root) as cache:
+        cache.put('recipes', (FILES / 'recipes.html').read_text(encoding='utf-8'))
+
+        for link in get_world_cuisines(cache=cache):
+            cache.put(link[1:], archive)
+
+        for link in get_recipes('recipes/italian-cuisine', cache=cache):
+            cache.put(link[1:], recipe)
+
+        yield cache
+
+
+@test('parser processes produce the same recipes as parsing inline')
+def _(cache=site):
+    inline = list(_recipe_data(2, discovery='http', cache=cache))
+    processes = list(_recipe_data(2, discovery='http', cache=cache, parsers=2, backlog=3))
+
+    assert len(inline) == len(processes) == 24
+    assert sorted(len(r['cuisines']) for r in inline) == sorted(len(r['cuisines']) for r in processes)
+    assert {r['title'] for r in processes} == {'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'}
+
+
+@test('a stale page is read from the cache once, and revalidated')
+def _():
+    page = (FILES / 'recipe.html').read_text(encoding='utf-8')
+    reads = []
+
+    class CountingCache(PageCache):
+        def get(self, slug):
+            reads.append(slug)
+            return super().get(slug)
+
+    with tempfile.TemporaryDirectory() as root, CountingCache(root, ttl=0) as cache:
+        cache.put('recipes/tuscan-sausage', page, etag='"v1"')
+        data = datatize_recipe('recipes/tuscan-sausage', session=FakeSession('', status_code=304), cache=cache)
+
+    assert reads == ['recipes/tuscan-sausage']
+    assert data['title'] == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+
+
+@test('a paced crawl only keeps a few pages in flight at once')
+def _(cache=site):
+    loops = []
+    plan = scraper._plan
+
+    def planned(*args):
+        loops.append(asyncio.get_running_loop())
+        return plan(*args)
+
+    scraper._plan = planned
+
+    try:
+        in_flight = [len(asyncio.all_tasks(loops[0])) for _ in _recipe_data(2, discovery='http', cache=cache, rate=1000)]
+    finally:
+        scraper._plan = plan
+
+    # 24 pages, 2 scrapers
+    assert len(in_flight) == 24
+    assert max(in_flight) <= 2 * 2
+
+
+@test('a crawl closes the cache it made for itself, and only that one')
+def _(cache=site):
+    closed = []
+    opened = []
+    cache.close = lambda: closed.append(cache)
+    made = scraper.PageCache
+
+    try:
+        list(_recipe_data(2, discovery='http', cache=cache))
+        assert closed == []
+
+        scraper.PageCache = lambda: opened.append(cache) or cache
+        _recipe_data(2, discovery='http').close()
+        assert opened == []
+
+        list(_recipe_data(2, discovery='http'))
+        assert opened == closed == [cache]
+    finally:
+        scraper.PageCache = made
+        del cache.close
+
+
+def data(title, prep_time='30 minutes'):
+    return {
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': prep_time,
+        'difficulty': 'easy',
+        'cuisines': [{'region': 'italian'}],
+        'ingredient_amounts': [
+            {'ingredient': {'food': 'tuscan heat spice'}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+        ]
+    }
+
+
+@test('_stream yields each recipe as soon as it is scraped')
+def _():
+    pulled = []
+
+    def scraped():
+        for title in ['Soup', 'Stew']:
+            pulled.append(title)
+            yield data(title)
+
+    recipes = _stream(scraped())
+    unlisted = [next(recipes) for _ in spices]
+    soup = next(recipes)
+
+    assert unlisted == spices
+    assert (soup.title, pulled) == ('Soup', ['Soup'])
+    assert soup.ingredient_amounts[0].ingredient.parent_recipe.title == 'Tuscan Heat Spice'
+
+
+@test('_stream skips duplicate titles, and logs and skips invalid recipes')
+def _():
+    warnings = []
+    handler = logging.Handler(logging.WARNING)
+    handler.emit = warnings.append
+    logging.getLogger('scrapfishin').addHandler(handler)
+
+    try:
+        recipes = list(_stream(iter([data('Soup'), data('Stew', prep_time='soon'), data('Soup'), data('Stew')])))
+    finally:
+        logging.getLogger('scrapfishin').removeHandler(handler)
+
+    assert [r.title for r in recipes[len(spices):]] == ['Soup', 'Stew']
+    assert ['invalid recipe "Stew"' in w.getMessage() for w in warnings] == [True]
+
+
+@test('_stream and consolidate agree on which titles are the same recipe')
+def _():
+    scraped = [data('Soup'), data('SOUP'), data('Stew'), data('tuscan heat spice')]
+
+    streamed = [r.title for r in _stream(iter(scraped))]
+    consolidated = [r.title for r in scraper.consolidate(scraped)]
+
+    assert streamed == consolidated
+    assert streamed[len(spices):] == ['Soup', 'Stew']
+
+
+@test('_drive steps through an async iterator, and closes it when abandoned')
+def _():
+    closed = []
+
+    async def count():
+        try:
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield i
+        finally:
+            closed.append(True)
+
+    assert list(_drive(count())) == [0, 1, 2]
+
+    driven = _drive(count())
+    assert next(driven) == 0
+    driven.close()
+    assert closed == [True, True]
+
+
+@test('stream hands out every distinct recipe of a crawl once')
+def _(cache=site):
+    recipes = list(stream(2, discovery='http', cache=cache))
+
+    assert recipes[:len(spices)] == spices
+    assert [r.title for r in recipes[len(spices):]] == ['Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan']
+
+
+@test('Scrap.fish stores streamed recipes as they are handed out')
+def _(cache=site):
+    # on disk, in-memory SQLite is a different database in every scraper thread
+    with tempfile.TemporaryDirectory() as root:
+        scrap = Scrap(f'sqlite:///{root}/scrapfishin.db')
+        recipes = scrap.fish('Hello Fresh', stream=True, scrapers=2, discovery='http', cache=cache)
+        first = next(recipes)
+        stored_first = scrap.prepare(title=first.title)
+        rest = list(recipes)
+        stored = scrap.prepare(website='hello fresh', n=100)
+        scrap.db.engine.dispose()
+
+    assert [r.title for r in stored_first] == [first.title]
+    assert rest[-1].title == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+    assert {r.title for r in stored} == {r.title for r in [first, *rest]}
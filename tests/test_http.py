@@ -0,0 +1,193 @@
+import tempfile
+
+from ward import test, fixture, raises
+from selenium.common.exceptions import WebDriverException
+import requests
+
+from scrapfishin.http import (
+    USER_AGENT, ChromePool, RetryableHTTPError, WaitTimings, http_get, http_session, wait_until
+)
+from scrapfishin.cache import CachedPage, PageCache
+
+
+class FakeDriver:
+    def __init__(self):
+        self.pages_served = 0
+        self.crashed = False
+        self.quit_called = False
+
+    @property
+    def current_url(self):
+        if self.crashed:
+            raise WebDriverException('chrome not reachable')
+        return 'about:blank'
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakePool(ChromePool):
+    def _spawn(self):
+        driver = FakeDriver()
+
+        with self._lock:
+            self._drivers.add(driver)
+
+        return driver
+
+
+@fixture
+def pool():
+    with FakePool(2, recycle_after=3) as p:
+        yield p
+
+
+@test('ChromePool reuses an idle driver instead of starting a new one')
+def _(pool=pool):
+    with pool.driver() as first:
+        pass
+
+    with pool.driver() as second:
+        pass
+
+    assert first is second
+    assert len(pool._drivers) == 1
+
+
+@test('ChromePool recycles a driver after it serves `recycle_after` pages')
+def _(pool=pool):
+    for _ in range(3):
+        with pool.driver() as driver:
+            pass
+
+    assert driver.quit_called
+
+    with pool.driver() as replacement:
+        pass
+
+    assert replacement is not driver
+
+
+@test('ChromePool replaces drivers that crash or fail the health check')
+def _(pool=pool):
+    with raises(WebDriverException):
+        with pool.driver() as crashed:
+            raise WebDriverException('tab crashed')
+
+    assert crashed.quit_called
+
+    with pool.driver() as unhealthy:
+        pass
+
+    unhealthy.crashed = True
+
+    with pool.driver() as healthy:
+        pass
+
+    assert healthy is not unhealthy
+    assert unhealthy.quit_called
+
+
+@test('wait_until returns what the condition found, and records the wait')
+def _():
+    timings = WaitTimings()
+    polls = []
+
+    def third_time(driver):
+        polls.append(driver)
+        return 'ready' if len(polls) == 3 else False
+
+    assert wait_until(FakeDriver(), third_time, timeout=5, poll=0.01, label='ready', timings=timings) == 'ready'
+    assert timings.summary()['ready']['count'] == 1
+    assert timings.summary()['ready']['timeouts'] == 0
+
+
+@test('wait_until gives up quietly after the timeout')
+def _():
+    timings = WaitTimings()
+
+    assert wait_until(FakeDriver(), lambda d: False, timeout=0.05, poll=0.01, label='never', timings=timings) is None
+    assert timings.summary()['never']['timeouts'] == 1
+    assert timings.summary()['never']['total'] >= 0.05
+
+
+@test('WaitTimings sums up waits per label')
+def _():
+    timings = WaitTimings()
+    timings.record('popup', 1.0, satisfied=True)
+    timings.record('popup', 3.0, satisfied=False)
+    timings.record('load more', 0.5, satisfied=True)
+
+    assert timings.summary() == {
+        'popup': {'count': 2, 'timeouts': 1, 'total': 4.0, 'mean': 2.0, 'max': 3.0},
+        'load more': {'count': 1, 'timeouts': 0, 'total': 0.5, 'mean': 0.5, 'max': 0.5}
+    }
+
+    timings.clear()
+    assert timings.summary() == {}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+class FakeSession:
+    """
+    Answers every request with the next of `responses`, and keeps the requests.
+    """
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, **kw):
+        self.requests.append((url, kw))
+        return self.responses.pop(0)
+
+
+@test('http_get returns pages which have every marker, and None otherwise')
+def _():
+    session = FakeSession(FakeResponse(text='<h1 id="title">Soup</h1>'), FakeResponse(text='<p>bot check</p>'))
+
+    assert http_get('https://example.com/soup', session=session, markers=['id="title"']) == '<h1 id="title">Soup</h1>'
+    assert http_get('https://example.com/soup', session=session, markers=['id="title"']) is None
+    assert http_get('https://example.com/soup', session=FakeSession(FakeResponse(404))) is None
+
+    with raises(RetryableHTTPError) as e:
+        http_get('https://example.com/soup', session=FakeSession(FakeResponse(429, headers={'Retry-After': '3'})))
+
+    assert e.raised.retry_after == 3
+
+
+@test('http_get revalidates cached pages and serves a 304 from the cache')
+def _():
+    with tempfile.TemporaryDirectory() as root, PageCache(root, ttl=0) as cache:
+        session = FakeSession(FakeResponse(text='soup', headers={'ETag': '"v1"'}), FakeResponse(304))
+
+        assert http_get('https://example.com/soup', session=session, cache=cache, key='soup') == 'soup'
+        assert http_get('https://example.com/soup', session=session, cache=cache, key='soup') == 'soup'
+        assert session.requests[1][1]['headers'] == {'If-None-Match': '"v1"'}
+
+
+@test('http_get serves a 304 from a page it was handed, without a cache')
+def _():
+    cached = CachedPage('soup', 'digest', 'soup', 0.0, '"v1"', None, False)
+    session = FakeSession(FakeResponse(304))
+
+    assert http_get('https://example.com/soup', session=session, cached=cached) == 'soup'
+    assert session.requests[0][1]['headers'] == {'If-None-Match': '"v1"'}
+
+
+@test('http_session keeps as many connections alive as it is shared by')
+def _():
+    with http_session(7) as session:
+        adapter = session.get_adapter('https://www.hellofresh.com')
+
+        assert adapter._pool_maxsize == 7
+        assert session.headers['User-Agent'] == USER_AGENT
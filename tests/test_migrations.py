@@ -0,0 +1,79 @@
+from contextlib import closing
+
+from ward import test, fixture, each
+import sqlalchemy as sa
+
+from scrapfishin.migrations import migrate
+from scrapfishin.database import Database
+from scrapfishin import models
+
+
+# the tables as an older scrapfishin created them
+LEGACY = [
+    'CREATE TABLE recipe (id INTEGER PRIMARY KEY, title VARCHAR UNIQUE, prep_time INTEGER, difficulty VARCHAR, '
+    'source VARCHAR, glamor_shot_url VARCHAR, instructions_url VARCHAR)',
+    'CREATE TABLE measurement (id INTEGER PRIMARY KEY, unit VARCHAR UNIQUE)',
+    'CREATE TABLE ingredient (id INTEGER PRIMARY KEY, food VARCHAR UNIQUE, parent_recipe_id INTEGER REFERENCES recipe (id))',
+    'CREATE TABLE recipe_ingredient_amount (recipe_id INTEGER REFERENCES recipe (id) ON DELETE CASCADE, '
+    'ingredient_id INTEGER REFERENCES ingredient (id) ON DELETE CASCADE, '
+    'measurement_id INTEGER REFERENCES measurement (id) ON DELETE CASCADE, amount NUMERIC(10, 2), '
+    'PRIMARY KEY (recipe_id, ingredient_id))',
+    'CREATE TABLE cuisine (id INTEGER PRIMARY KEY, region VARCHAR UNIQUE)',
+    'CREATE TABLE recipe_cuisine (recipe_id INTEGER REFERENCES recipe (id) ON DELETE CASCADE, '
+    'cuisine_id INTEGER REFERENCES cuisine (id) ON DELETE CASCADE, PRIMARY KEY (recipe_id, cuisine_id))',
+    "INSERT INTO recipe (id, title, source) VALUES (1, 'Soup', 'Hello Fresh')",
+    "INSERT INTO measurement (id, unit) VALUES (1, 'tablespoon')",
+    "INSERT INTO ingredient (id, food) VALUES (1, 'cumin')",
+    'INSERT INTO recipe_ingredient_amount VALUES (1, 1, 1, 2)'
+]
+
+
+@fixture
+def legacy():
+    db = Database('sqlite://')
+
+    for statement in LEGACY:
+        db.engine.execute(statement)
+
+    return db
+
+
+def plan(db, statement):
+    return ' '.join(row[-1] for row in db.engine.execute(f'EXPLAIN QUERY PLAN {statement}'))
+
+
+@test('migrate brings an old database up to date, and then leaves it alone')
+def _(db=legacy):
+    changes = migrate(db.engine)
+
+    assert 'added column recipe.shuffle' in changes
+    assert 'added column recipe_ingredient_amount.canonical_amount' in changes
+    assert 'added index ix_recipe_cuisine_cuisine_id' in changes
+    assert migrate(db.engine) == []
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        recipe = s.query(models.Recipe).one()
+        amount = s.query(models.RecipeIngredientAmount).one()
+
+        assert 0 <= recipe.shuffle < 1
+        assert (amount.canonical_amount, amount.canonical_measurement.unit) == (6.0, 'teaspoon')
+
+
+@test('the planner looks up {table} by {column} through {index}')
+def _(
+    db=legacy,
+    table=each('recipe_ingredient_amount', 'recipe_allergy', 'recipe_cuisine', 'recipe_tag', 'recipe_utensil', 'ingredient'),
+    column=each('ingredient_id', 'allergy_id', 'cuisine_id', 'tag_id', 'utensil_id', 'parent_recipe_id'),
+    index=each(
+        'ix_recipe_ingredient_amount_ingredient_id',
+        'ix_recipe_allergy_allergy_id',
+        'ix_recipe_cuisine_cuisine_id',
+        'ix_recipe_tag_tag_id',
+        'ix_recipe_utensil_utensil_id',
+        'ix_ingredient_parent_recipe_id'
+    )
+):
+    migrate(db.engine)
+    selected = 'id' if table == 'ingredient' else 'recipe_id'
+
+    assert f'USING COVERING INDEX {index} ' in plan(db, f'SELECT {selected} FROM {table} WHERE {column} = 1')
@@ -0,0 +1,65 @@
+from ward import test, fixture
+
+from scrapfishin.pantry import PantryIndex
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap
+
+
+def recipe(title, *foods, allergies=()):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'allergies': [{'allergen': a} for a in allergies],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+            for food in foods
+        ]
+    })
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe('Soup', 'garlic', 'onion', 'stock'),
+        recipe('Stir Fry', 'garlic', 'shallot', 'rice', 'soy sauce', allergies=['soy']),
+        recipe('Toast', 'bread', 'butter'),
+        recipe('Salad', 'lettuce', 'onion')
+    ])
+    return scrap
+
+
+@test('cookable ranks recipes by how much of them is in the pantry')
+def _(scrap=scrap):
+    ranked = scrap.cookable(['Garlic', 'onion', 'stock', 'rice', 'flour'])
+
+    assert [(r.title, r.have, r.need, r.missing) for r in ranked] == [
+        ('Soup', 3, 3, ()),
+        ('Salad', 1, 2, ('lettuce',)),
+        ('Stir Fry', 2, 4, ('shallot', 'soy sauce'))
+    ]
+
+
+@test('cookable substitutes ingredients and leaves out allergens')
+def _(scrap=scrap):
+    ranked = scrap.cookable(['garlic', 'onion', 'rice'], substitutions={'shallot': ['onion']})
+    stir_fry = next(r for r in ranked if r.title == 'Stir Fry')
+
+    assert (stir_fry.have, stir_fry.missing, stir_fry.substituted) == (3, ('soy sauce',), ('shallot',))
+    assert 'Stir Fry' not in [r.title for r in scrap.cookable(['garlic', 'rice'], allergens=['Soy'])]
+
+
+@test('the index follows recipes as they are stored and stored again')
+def _(scrap=scrap):
+    scrap.cookable(['bread'])
+    scrap._persist([recipe('Toast', 'bread', 'jam'), recipe('Porridge', 'oats', 'jam')])
+
+    index = PantryIndex.load(scrap.db.engine)
+
+    for pantry in [['jam'], ['butter'], ['bread', 'oats']]:
+        assert scrap.cookable(pantry) == index.cookable(pantry)
+
+    assert [(r.title, r.missing) for r in scrap.cookable(['jam'])] == [('Toast', ('bread',)), ('Porridge', ('oats',))]
+    assert scrap.cookable(['butter']) == []
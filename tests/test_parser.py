@@ -0,0 +1,75 @@
+import pathlib
+import re
+
+from ward import test, fixture, raises
+
+from scrapfishin.hello_fresh.parser import parse_recipe
+
+
+FILES = pathlib.Path(__file__).parent / 'files' / 'hello_fresh'
+
+
+def _comparable(data: dict) -> dict:
+    # tags, allergies and utensils come out of a set, so their order is arbitrary
+    return {
+        k: sorted(v, key=repr) if k in ('tags', 'allergies', 'utensils') else v
+        for k, v in data.items()
+    }
+
+
+@fixture
+def recipe_page():
+    return (FILES / 'recipe.html').read_text(encoding='utf-8')
+
+
+@test('lxml and soup parsers produce the same recipe data')
+def _(html=recipe_page):
+    soup = parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', parser='soup')
+    lxml = parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', parser='lxml')
+
+    assert _comparable(lxml) == _comparable(soup)
+    assert lxml['title'] == 'Tuscan Sausage Spaghetti with Roasted Tomatoes & Parmesan'
+    assert len(lxml['ingredient_amounts']) == 6
+    assert lxml['nutrition']['calories'] == '780 kcal'
+
+
+@test('lxml parser stops walking a section which never ends')
+def _(html=recipe_page):
+    # without the marker which ends the Ingredients section, the walk runs
+    # on into the rest of the page but must not fall off the end of it
+    html = html.replace('Not included in your delivery', 'Pantry')
+    data = parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', parser='lxml')
+
+    assert {'food': 'Olive Oil'} in [ia['ingredient'] for ia in data['ingredient_amounts']]
+
+
+@test('parse_recipe rejects unknown parsers')
+def _(html=recipe_page):
+    with raises(ValueError):
+        parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', parser='html5lib')
+
+
+@fixture
+def structured_page():
+    return (FILES / 'recipe_structured.html').read_text(encoding='utf-8')
+
+
+@test('embedded page state produces the same recipe data as the DOM')
+def _(html=structured_page):
+    dom = parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', structured=False)
+
+    # with the rendered recipe gone, only the embedded data is left to read
+    main = re.compile(r'<main.*</main>', re.S)
+    data = parse_recipe(main.sub('', html), 'recipes/tuscan-sausage-spaghetti')
+
+    assert _comparable(data) == _comparable(dom)
+
+
+@test('JSON-LD is used where it can be, the DOM fills in the rest')
+def _(html=structured_page):
+    dom = parse_recipe(html, 'recipes/tuscan-sausage-spaghetti', structured=False)
+
+    hydration = re.compile(r'<script id="__NEXT_DATA__".*?</script>', re.S)
+    data = parse_recipe(hydration.sub('', html), 'recipes/tuscan-sausage-spaghetti')
+
+    assert _comparable(data) == _comparable(dom)
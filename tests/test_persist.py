@@ -0,0 +1,90 @@
+from contextlib import closing
+
+from ward import test, fixture
+import sqlalchemy as sa
+
+from scrapfishin.database import Database, Base
+from scrapfishin.persist import RecipeWriter
+from scrapfishin.schema import Recipe
+from scrapfishin.hello_fresh.unlisted_recipes import tuscan_heat_spice
+from scrapfishin import models
+
+
+@fixture
+def db():
+    db = Database('sqlite://')
+    Base.metadata.create_all(db.engine)
+    return db
+
+
+def recipe(title, **kw):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'tags': [{'descriptor': 'veggie'}],
+        'cuisines': [{'region': 'italian'}],
+        'ingredient_amounts': [
+            {'ingredient': {'food': 'garlic powder'}, 'amount': '1', 'measurement': {'unit': 'teaspoon'}},
+            {
+                'ingredient': {'food': 'tuscan heat spice', 'parent_recipe': tuscan_heat_spice},
+                'amount': '1',
+                'measurement': {'unit': 'tablespoon'}
+            }
+        ],
+        **kw
+    })
+
+
+@test('RecipeWriter stores recipes, lookups, bridges and parent recipes')
+def _(db=db):
+    ids = RecipeWriter(db.engine).write([recipe('Soup'), recipe('Stew')])
+
+    # Database.session swallows exceptions, so everything is read through a
+    # plain session and checked once it's closed
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        counts = [s.query(model).count() for model in (models.Recipe, models.Tag, models.RecipeTag)]
+        soup = s.query(models.Recipe).get(ids['Soup'])
+        foods = {
+            ia.ingredient.food: (ia.ingredient.parent_recipe_id, ia.amount, ia.measurement.unit)
+            for ia in soup.ingredient_amounts
+        }
+
+    assert set(ids) == {'Soup', 'Stew'}
+    # the parent spice recipe brings along its "spice mix" tag
+    assert counts == [3, 2, 3]
+    assert foods['tuscan heat spice'][0] is not None
+    assert foods['garlic powder'][1:] == (1.0, 'teaspoon')
+
+
+@test('RecipeWriter rewrites existing recipes instead of duplicating them')
+def _(db=db):
+    writer = RecipeWriter(db.engine)
+    writer.write([recipe('Soup')])
+    writer.write([recipe('Soup', tags=[{'descriptor': 'spicy'}], prep_time='45 minutes')])
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        soup = s.query(models.Recipe).filter_by(title='Soup').one()
+        prep_time, tags = soup.prep_time, [t.descriptor for t in soup.tags]
+        amounts = s.query(models.RecipeIngredientAmount).filter_by(recipe_id=soup.id).count()
+
+    assert prep_time == 45
+    assert tags == ['spicy']
+    assert amounts == 2
+
+
+@test('RecipeWriter resolves known lookup values without querying for them')
+def _(db=db):
+    writer = RecipeWriter(db.engine)
+    writer.write([recipe('Soup')])
+    statements = []
+
+    @sa.event.listens_for(db.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    writer.write([recipe('Stew')])
+
+    assert not any(s.startswith('SELECT') and 'FROM tag' in s for s in statements)
+    assert not any(s.startswith('SELECT') and 'FROM measurement' in s for s in statements)
@@ -0,0 +1,72 @@
+from contextlib import closing
+from random import Random
+
+from ward import test, fixture
+import sqlalchemy as sa
+
+from scrapfishin.planner import Candidates, plan, plan_menu
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap, models
+
+
+def recipe(title, *ingredients, prep_time=30, allergies=(), cuisines=()):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': prep_time,
+        'difficulty': 'easy',
+        'allergies': [{'allergen': a} for a in allergies],
+        'cuisines': [{'region': c} for c in cuisines],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': amount, 'measurement': {'unit': unit}}
+            for amount, unit, food in ingredients
+        ]
+    })
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe('Chicken Tacos', ('0.5', 'unit', 'onion'), ('1', 'unit', 'lime'), ('10', 'ounce', 'chicken'), ('6', 'unit', 'tortillas'), cuisines=['mexican']),
+        recipe('Chicken Salad', ('0.5', 'unit', 'onion'), ('1', 'unit', 'lime'), ('10', 'ounce', 'chicken'), ('4', 'ounce', 'lettuce'), cuisines=['mexican']),
+        recipe('Shrimp Tacos', ('1', 'unit', 'lime'), ('10', 'ounce', 'shrimp'), ('6', 'unit', 'tortillas'), allergies=['shellfish'], cuisines=['mexican']),
+        recipe('Beef Stew', ('1', 'unit', 'carrot'), ('1', 'pound', 'beef'), ('0.33', 'can', 'tomato paste'), ('1', 'unit', 'potato'), prep_time=120),
+        recipe('Risotto', ('1', 'cup', 'arborio rice'), ('4', 'ounce', 'parmesan'), ('1', 'unit', 'shallot'), ('8', 'ounce', 'mushrooms'))
+    ])
+    return scrap
+
+
+@test('plan picks the recipes which share the most, finishing half an onion')
+def _(scrap=scrap):
+    assert sorted(r.title for r in scrap.plan(2)) == ['Chicken Salad', 'Chicken Tacos']
+
+
+@test('plan honours allergens, cuisine and prep time')
+def _(scrap=scrap):
+    titles = {r.title for r in scrap.plan(3, allergens=['shellfish'], max_prep_time=60)}
+
+    assert titles == {'Chicken Salad', 'Chicken Tacos', 'Risotto'}
+    assert {r.title for r in scrap.plan(3, cuisine='mexican', prep_time_budget=60)} <= {'Chicken Salad', 'Chicken Tacos', 'Shrimp Tacos'}
+    assert len(scrap.plan(3, cuisine='mexican', prep_time_budget=60)) == 2
+
+
+@test('a menu costs its grocery lines plus what is left of countable things')
+def _(scrap=scrap):
+    with closing(sa.orm.Session(bind=scrap.db.engine)) as s:
+        menu = plan_menu(s, 2, rng=Random(0), allergens=['shellfish'])
+        candidates = Candidates.load(s, cuisine='mexican')
+        titles = dict(s.query(models.Recipe.id, models.Recipe.title))
+
+    # onion, lime, chicken, tortillas and lettuce, and nothing left over
+    assert (menu.ingredients, menu.leftover, menu.prep_time) == (5, 0.0, 60)
+
+    # seeded, so the random first recipes are always the same
+    one = plan(candidates, 1, rng=Random(0))
+    five = plan(candidates, 5, rng=Random(0))
+
+    assert [titles[id_] for id_ in one.recipe_ids] == ['Shrimp Tacos']
+    assert one.leftover == 0.0
+    assert len(five.recipe_ids) == 3
+    assert [titles[id_] for id_ in five.recipe_ids] == ['Chicken Salad', 'Chicken Tacos', 'Shrimp Tacos']
+    assert five.leftover == 0.0
@@ -0,0 +1,160 @@
+from contextlib import closing
+from random import Random
+
+from ward import test, fixture
+import sqlalchemy as sa
+
+from scrapfishin.database import Database, Base
+from scrapfishin.persist import RecipeWriter
+from scrapfishin.schema import Recipe
+from scrapfishin import models, queries
+
+
+def recipe(title, *ingredients, source='Hello Fresh', cuisines=()):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': source,
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'cuisines': [{'region': c} for c in cuisines],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': amount, 'measurement': {'unit': unit}}
+            for amount, unit, food in ingredients
+        ]
+    })
+
+
+@fixture
+def db():
+    db = Database('sqlite://')
+    Base.metadata.create_all(db.engine)
+    ids = RecipeWriter(db.engine).write([
+        recipe('Soup', ('2', 'clove', 'garlic'), ('1', 'unit', 'onion'), ('1', 'teaspoon', 'cumin')),
+        recipe('Stew', ('3', 'clove', 'garlic'), ('1', 'tablespoon', 'cumin'), ('2', 'unit', 'onion'))
+    ])
+    return db, ids
+
+
+@test('grocery_items sums amounts per ingredient and unit in one query')
+def _(fixture=db):
+    db, ids = fixture
+    statements = []
+
+    @sa.event.listens_for(db.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        items = queries.grocery_items(s, ids.values())
+
+    assert len(statements) == 1
+    assert [(i.food, i.unit, i.amount, i.recipes) for i in items] == [
+        ('cumin', 'tablespoon', 1.0, 1),
+        ('cumin', 'teaspoon', 1.0, 1),
+        ('garlic', 'clove', 5.0, 2),
+        ('onion', 'unit', 3.0, 2)
+    ]
+
+
+@test('grocery_items counts a recipe as many times as it is listed')
+def _(fixture=db):
+    db, ids = fixture
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        items = queries.grocery_items(s, [ids['Soup'], ids['Soup'], ids['Stew']])
+
+    assert {(i.food, i.unit): i.amount for i in items}[('onion', 'unit')] == 4.0
+
+
+@test('grocery_items sums amounts in their canonical unit')
+def _(fixture=db):
+    db, ids = fixture
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        items = queries.grocery_items(s, ids.values(), canonical=True)
+
+    assert [(i.food, i.unit, i.amount) for i in items] == [
+        ('cumin', 'teaspoon', 4.0),
+        ('garlic', 'clove', 5.0),
+        ('onion', 'unit', 3.0)
+    ]
+
+
+@test('grocery_list formats the totals of recipes as a page')
+def _(fixture=db):
+    db, ids = fixture
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        recipes = s.query(models.Recipe).filter(models.Recipe.id.in_(ids.values())).all()
+        page = queries.grocery_list(s, recipes)
+
+    assert page.splitlines() == [
+        '1.0 tablespoon of cumin',
+        '1.0 teaspoon of cumin',
+        '5.0 clove of garlic',
+        '3.0 unit of onion'
+    ]
+
+
+@fixture
+def corpus():
+    db = Database('sqlite://')
+    Base.metadata.create_all(db.engine)
+    RecipeWriter(db.engine).write([
+        recipe(
+            f'Dish {i}',
+            ('1', 'clove', 'garlic'),
+            ('1', 'unit', 'onion' if i % 2 else 'leek'),
+            source='Hello Fresh' if i % 3 else 'Blue Apron',
+            cuisines=['Italian' if i % 4 else 'Thai']
+        )
+        for i in range(60)
+    ])
+    return db
+
+
+@test('sample_recipes never sorts the whole table by random()')
+def _(db=corpus):
+    statements = []
+
+    @sa.event.listens_for(db.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        recipes = queries.sample_recipes(s, n=10)
+
+    assert len({r.id for r in recipes}) == 10
+    assert not any('random()' in statement for statement in statements)
+
+
+@test('sample_recipes only returns recipes matching every filter')
+def _(db=corpus):
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        recipes = queries.sample_recipes(s, n=100, cuisine='italian', ingredients=['Onion', 'garlic'], source='Hello Fresh')
+        expected = {f'Dish {i}' for i in range(60) if i % 4 and i % 2 and i % 3}
+
+        assert {r.title for r in recipes} == expected
+        assert [r.title for r in queries.sample_recipes(s, title='Dish 7')] == ['Dish 7']
+
+
+@test('sample_recipes wraps around the shuffled order, and reshuffle moves it')
+def _(db=corpus):
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        before = {r.title: r.shuffle for r in s.query(models.Recipe)}
+        recipes = queries.sample_recipes(s, n=5, rng=Random(0), cuisine='thai')
+
+        # the caller decides whether it sticks
+        queries.reshuffle(s)
+        s.rollback()
+        assert {r.title: r.shuffle for r in s.query(models.Recipe)} == before
+
+        queries.reshuffle(s)
+        s.commit()
+
+    with closing(sa.orm.Session(bind=db.engine)) as s:
+        after = {r.title: r.shuffle for r in s.query(models.Recipe)}
+
+    assert len(recipes) == 5
+    assert all(0 <= v < 1 for v in after.values())
+    assert before != after
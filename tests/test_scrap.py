@@ -0,0 +1,62 @@
+from ward import test, fixture
+import sqlalchemy as sa
+
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap
+
+
+def recipe(title, cuisine, *foods):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'cuisines': [{'region': cuisine}],
+        'tags': [{'descriptor': 'quick'}],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+            for food in foods
+        ]
+    })
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe(f'Dish {i}', 'italian' if i % 2 else 'thai', 'garlic', 'onion' if i % 3 else 'leek')
+        for i in range(30)
+    ])
+    return scrap
+
+
+@test('prepare loads recipes and their relationships in three queries')
+def _(scrap=scrap):
+    statements = []
+
+    @sa.event.listens_for(scrap.db.engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for n in [1, 15]:
+        statements.clear()
+        recipes = scrap.prepare(cuisine='Italian', ingredients=['onion'], n=n)
+        queried = len(statements)
+
+        assert 1 <= len(recipes) <= n
+        assert queried == 3
+
+        for r in recipes:
+            assert [c.region for c in r.cuisines] == ['italian']
+            assert [t.descriptor for t in r.tags] == ['quick']
+            assert {ia.ingredient.food for ia in r.ingredient_amounts} == {'garlic', 'onion'}
+            assert {ia.measurement.unit for ia in r.ingredient_amounts} == {'unit'}
+
+        # nothing was lazy loaded
+        assert len(statements) == queried
+
+
+@test('prepare picks a recipe by title and website')
+def _(scrap=scrap):
+    assert [r.title for r in scrap.prepare(title='Dish 4', website='hello fresh')] == ['Dish 4']
+    assert scrap.prepare(title='Dish 4', cuisine='italian') == []
@@ -0,0 +1,96 @@
+from contextlib import closing
+
+from ward import test, fixture
+import sqlalchemy as sa
+
+from scrapfishin.migrations import migrate
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap, models, search
+
+
+def recipe(title, *foods, tags=(), cuisines=()):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'tags': [{'descriptor': t} for t in tags],
+        'cuisines': [{'region': c} for c in cuisines],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+            for food in foods
+        ]
+    })
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe('Garlic Butter Shrimp', 'shrimp', 'butter', 'garlic', tags=['quick']),
+        recipe('Tomato Soup', 'tomatoes', 'garlic', 'stock', cuisines=['italian']),
+        recipe('Pad Thai', 'rice noodles', 'peanuts', 'shrimp', cuisines=['thai'], tags=['spicy']),
+        recipe('Toast', 'bread', 'butter')
+    ])
+    return scrap
+
+
+@test('search ranks title matches above ingredient matches')
+def _(scrap=scrap):
+    assert [r.title for r in scrap.search('garlic')] == ['Garlic Butter Shrimp', 'Tomato Soup']
+    assert [r.title for r in scrap.search('Shrimp, THAI!')] == ['Pad Thai']
+    assert [r.title for r in scrap.search('tomato italian')] == ['Tomato Soup']
+    assert [r.cuisines[0].region for r in scrap.search('spicy')] == ['thai']
+    assert scrap.search('"') == []
+
+
+@test('search follows recipes as they are rewritten, renamed and deleted')
+def _(scrap=scrap):
+    scrap.writer.write([recipe('Toast', 'bread', 'jam')])
+
+    with closing(sa.orm.Session(bind=scrap.db.engine)) as s:
+        s.query(models.Recipe).filter_by(title='Tomato Soup').one().title = 'Gazpacho'
+        s.delete(s.query(models.Recipe).filter_by(title='Pad Thai').one())
+        s.commit()
+
+    assert [r.title for r in scrap.search('jam')] == ['Toast']
+    assert scrap.search('butter toast') == []
+    assert [r.title for r in scrap.search('gazpacho')] == ['Gazpacho']
+    assert [r.title for r in scrap.search('shrimp')] == ['Garlic Butter Shrimp']
+
+
+@test('migrate indexes recipes which were stored before search existed')
+def _(scrap=scrap):
+    scrap.db.engine.execute('DELETE FROM recipe_search')
+
+    assert scrap.search('garlic') == []
+    assert migrate(scrap.db.engine) == ['indexed 4 recipes for search']
+    assert [r.title for r in scrap.search('garlic')] == ['Garlic Butter Shrimp', 'Tomato Soup']
+
+    with scrap.db.engine.connect() as conn:
+        assert search.unindexed(conn) == []
+
+
+@test('search finds recipes written through a Session, and follows their relationships')
+def _(scrap=scrap):
+    with closing(sa.orm.Session(bind=scrap.db.engine)) as s:
+        s.add(models.Recipe(title='Pesto Pasta', source='Hello Fresh', prep_time=20, difficulty='easy'))
+        s.commit()
+
+    assert [r.title for r in scrap.search('pesto')] == ['Pesto Pasta']
+    assert scrap.search('basil') == []
+
+    with closing(sa.orm.Session(bind=scrap.db.engine)) as s:
+        pasta = s.query(models.Recipe).filter_by(title='Pesto Pasta').one()
+        pasta.cuisines.append(s.query(models.Cuisine).filter_by(region='italian').one())
+        s.add(models.RecipeIngredientAmount(recipe=pasta, ingredient=models.Ingredient(food='basil'), amount=1))
+        s.commit()
+
+    assert [r.title for r in scrap.search('basil italian')] == ['Pesto Pasta']
+
+    with closing(sa.orm.Session(bind=scrap.db.engine)) as s:
+        pasta = s.query(models.Recipe).filter_by(title='Pesto Pasta').one()
+        s.delete(pasta.ingredient_amounts[0])
+        s.commit()
+
+    assert scrap.search('basil') == []
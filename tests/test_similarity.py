@@ -0,0 +1,91 @@
+import tempfile
+import pathlib
+
+from ward import test, fixture
+
+from scrapfishin.similarity import SimilarityIndex
+from scrapfishin.schema import Recipe
+from scrapfishin import Scrap
+
+
+def recipe(title, *foods, tags=(), cuisines=()):
+    return Recipe.parse_obj({
+        'title': title,
+        'source': 'Hello Fresh',
+        'prep_time': '30 minutes',
+        'difficulty': 'easy',
+        'tags': [{'descriptor': t} for t in tags],
+        'cuisines': [{'region': c} for c in cuisines],
+        'ingredient_amounts': [
+            {'ingredient': {'food': food}, 'amount': '1', 'measurement': {'unit': 'unit'}}
+            for food in foods
+        ]
+    })
+
+
+@fixture
+def scrap():
+    scrap = Scrap('sqlite://')
+    scrap.writer.write([
+        recipe('Carbonara', 'spaghetti', 'pancetta', 'egg', 'parmesan', 'garlic', cuisines=['italian']),
+        recipe('Cacio e Pepe', 'spaghetti', 'pecorino', 'parmesan', 'pepper', cuisines=['italian']),
+        recipe('Aglio e Olio', 'spaghetti', 'garlic', 'olive oil', 'chili flakes', cuisines=['italian']),
+        recipe('Fried Rice', 'rice', 'egg', 'garlic', 'soy sauce', cuisines=['chinese'], tags=['quick']),
+        recipe('Fruit Salad', 'apple', 'banana')
+    ])
+    return scrap
+
+
+@fixture
+def cache_path():
+    with tempfile.TemporaryDirectory() as root:
+        yield pathlib.Path(root) / 'similarity.npz'
+
+
+@test('similar ranks recipes by what they share, leaving out those which share nothing')
+def _(scrap=scrap):
+    titles = [r.title for r in scrap.similar('Carbonara', n=10)]
+
+    assert titles[:2] == ['Cacio e Pepe', 'Aglio e Olio']
+    assert titles[-1] == 'Fried Rice'
+    assert 'Fruit Salad' not in titles
+    assert [r.title for r in scrap.similar('Carbonara', n=1)] == ['Cacio e Pepe']
+    assert scrap.similar('Fruit Salad') == []
+
+
+@test('top_k in batches agrees with one recipe at a time')
+def _(scrap=scrap):
+    index = SimilarityIndex.build(scrap.db.engine)
+    ids = index.recipe_ids.tolist()
+
+    assert index.top_k(ids, n=3, batch=2) == {id_: index.similar(id_, n=3) for id_ in ids}
+
+
+@test('the index is saved to disk, and rebuilt once recipes change')
+def _(scrap=scrap, path=cache_path):
+    built = SimilarityIndex.cached(scrap.db.engine, path)
+    saved = SimilarityIndex.cached(scrap.db.engine, path)
+
+    assert saved is not built
+    assert saved.fingerprint == built.fingerprint
+    assert (saved.matrix != built.matrix).nnz == 0
+    assert SimilarityIndex.cached(scrap.db.engine, path, index=saved) is saved
+
+    scrap.writer.write([recipe('Fruit Salad', 'apple', 'banana', 'egg')])
+    rebuilt = SimilarityIndex.cached(scrap.db.engine, path, index=saved)
+
+    assert rebuilt.fingerprint != saved.fingerprint
+    assert SimilarityIndex.load(path).fingerprint == rebuilt.fingerprint
+
+
+@test('in-memory databases keep their index off disk, and files get one each')
+def _():
+    assert Scrap('sqlite://')._similarity_path() is None
+    assert Scrap('sqlite:///:memory:')._similarity_path() is None
+
+    with tempfile.TemporaryDirectory() as root:
+        one = Scrap(f'sqlite:///{root}/one.db')._similarity_path()
+        two = Scrap(f'sqlite:///{root}/two.db')._similarity_path()
+
+    assert one != two
+    assert one.parent == two.parent == pathlib.Path(tempfile.gettempdir()) / 'scrapfishin'
@@ -0,0 +1,47 @@
+from ward import test, each
+
+from scrapfishin import units
+
+
+@test('parse_quantity reads {text!r} as {expected}')
+def _(
+    text=each('2', '1.5', '.5', '1/2', '1 1/2', '½', '1½', '1 ¾', '1-2', '1 to 2', '2–3', ' 3 '),
+    expected=each((2, 2), (1.5, 1.5), (.5, .5), (.5, .5), (1.5, 1.5), (.5, .5), (1.5, 1.5), (1.75, 1.75), (1, 2), (1, 2), (2, 3), (3, 3))
+):
+    assert units.parse_quantity(text) == expected
+
+
+@test('parse_quantity refuses {text!r}')
+def _(text=each('cumin 0.5', 'thyme 3', '', 'a pinch', '1/0')):
+    assert units.parse_quantity(text) is None
+
+
+@test('split_quantity splits {text!r} into {expected}')
+def _(
+    text=each('1 1/2 cup', '2 clove', '½ unit', '1-2 tbsp', '6 ounce Spaghetti', '2', 'to taste'),
+    expected=each(('1 1/2', 'cup'), ('2', 'clove'), ('½', 'unit'), ('1-2', 'tbsp'), ('6', 'ounce Spaghetti'), ('2', ''), ('', 'to taste'))
+):
+    assert units.split_quantity(text) == expected
+
+
+@test('normalize converts {amount} {unit} to {expected}')
+def _(
+    amount=each('1', '1½', '2', '1', '1', '3', '1-2'),
+    unit=each('tablespoon', 'Cups', 'lbs', 'can', 'bunch', 'clove', 'tsp'),
+    expected=each(
+        (1.0, 3.0, 'teaspoon'),
+        (1.5, 72.0, 'teaspoon'),
+        (2.0, 32.0, 'ounce'),
+        (1.0, 13.76, 'ounce'),
+        (1.0, 2.0, 'ounce'),
+        (3.0, 3.0, 'clove'),
+        (2.0, 2.0, 'teaspoon')
+    )
+):
+    assert units.normalize(amount, unit) == expected
+
+
+@test('units are known by their real plurals, and no made up ones')
+def _():
+    assert {'cups', 'fluid ounces', 'grams', 'boxes', 'bunches'} <= set(units.CONVERSIONS)
+    assert not {'cupes', 'fluid ouncees', 'gramses', 'boxs', 'bunchs'} & set(units.CONVERSIONS)